@@ -2,6 +2,7 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides Django it serves the leaderboard server-sent events stream.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +14,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импортируем после настройки Django, так как поток таблицы лидеров работает с моделями
+from high_tech_cross.leaderboard_stream import LeaderboardStreamApplication  # noqa: E402
+from high_tech_cross.services import AttemptLogWriter, LoginCache  # noqa: E402
+
+application = LeaderboardStreamApplication(django_application)
+# Журнал попыток пишется, а кэш логинов команд прогревается в фоне в каждом процессе сервера
+AttemptLogWriter.start()
+LoginCache.start()
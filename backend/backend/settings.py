@@ -97,6 +97,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Кэш в памяти процесса. Закэшированные данные (например, таблица лидеров) привязаны к версиям, которые хранятся
+# в базе данных, поэтому каждому процессу достаточно своего кэша.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Журнал попыток пишется, а кэш логинов команд прогревается в фоне в каждом процессе сервера
+from high_tech_cross.services import AttemptLogWriter, LoginCache  # noqa: E402
+
+AttemptLogWriter.start()
+LoginCache.start()
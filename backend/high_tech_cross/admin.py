@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.http import HttpResponseRedirect
 from django_better_admin_arrayfield.admin.mixins import DynamicArrayMixin
 
@@ -46,7 +46,14 @@ class CompetitionModelAdmin(admin.ModelAdmin, DynamicArrayMixin):
             if obj.initialized:
                 self.message_user(request, "Соревнование уже было инициализировано")
                 return HttpResponseRedirect(".")
-            CompetitionInit.initialize_competition(obj)
+            overlaps = CompetitionInit.initialize_competition(obj)
             self.message_user(request, "Соревнование успешно инициализировано")
+            if overlaps:
+                self.message_user(
+                    request,
+                    "Команды соревнования в это же время участвуют в соревнованиях: "
+                    + ", ".join(str(overlap) for overlap in overlaps),
+                    level=messages.WARNING
+                )
             return HttpResponseRedirect(".")
         return super().response_change(request, obj)
@@ -1,11 +1,17 @@
 from contextvars import ContextVar
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Модели сами используют контекст приложения
+    from .models.competition import CompetitionWindow
 
 
 class ApplicationContext:
     """
-    Контекст приложения, в котором мы передаем team_id и competition_id из middleware в обработчики запросов view
+    Контекст приложения, в котором мы передаем team_id и competition_id из middleware в обработчики запросов view,
+    а также расписание соревнования из токена
     """
 
     team_id: ContextVar[Optional[str]] = ContextVar('team_id', default=None)
     competition_id: ContextVar[Optional[str]] = ContextVar('competition_id', default=None)
+    competition_window: ContextVar[Optional['CompetitionWindow']] = ContextVar('competition_window', default=None)
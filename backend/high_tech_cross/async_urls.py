@@ -0,0 +1,20 @@
+from django.urls import include, path
+
+from . import urls
+from .views import AsyncCompetitionView, AsyncExerciseView, AsyncLeaderboardView
+
+# Под ASGI запросы к api разрешаются по этому URLconf (см. JWTCheckMiddleware): обработчики чтения асинхронные,
+# остальные те же, что и в urls
+async_urlpatterns = [
+    path('competition', AsyncCompetitionView.as_view()),
+    path('exercise_manager/all_exercises', AsyncExerciseView.as_view()),
+    path('exercise_manager/exercise/<str:exercise_id>', AsyncExerciseView.as_view()),
+    path('leaderboard', AsyncLeaderboardView.as_view()),
+]
+async_routes = {str(pattern.pattern) for pattern in async_urlpatterns}
+
+urlpatterns = [
+    path('api/', include(
+        async_urlpatterns + [pattern for pattern in urls.urlpatterns if str(pattern.pattern) not in async_routes]
+    )),
+]
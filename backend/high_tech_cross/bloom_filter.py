@@ -0,0 +1,43 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Фильтр Блума: отвечает, что строки точно нет среди добавленных, или что она, возможно, есть.
+    Ложных отрицательных ответов не бывает, доля ложных положительных при заполнении до capacity - около error_rate.
+    Удалять строки из фильтра нельзя, поэтому при переполнении его нужно строить заново.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Двойное хеширование: k позиций из двух независимых 64-битных хешей
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + number * second) % self.size for number in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        Ожидаемая доля ложных положительных ответов при текущем заполнении.
+        """
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
@@ -1 +1,46 @@
+import os
+import tempfile
+
 JWT_SECRET_KEY = 'SUPER SECRET KEY NOT FOR PRODUCTION'
+
+# Канал Postgres LISTEN/NOTIFY, в который отправляются идентификаторы соревнований с изменившейся таблицей лидеров
+LEADERBOARD_NOTIFY_CHANNEL = 'leaderboard'
+# Раз в сколько секунд поток таблицы лидеров отправляет клиенту комментарий, чтобы соединение не закрылось
+LEADERBOARD_STREAM_HEARTBEAT = 15
+# Сколько событий может накопиться для одного клиента потока таблицы лидеров,
+# прежде чем ему будет отправлена таблица лидеров целиком
+LEADERBOARD_STREAM_QUEUE_SIZE = 32
+# Каждая какая версия таблицы лидеров сохраняется опорным снимком со всеми записями, а не только изменениями
+LEADERBOARD_KEYFRAME_INTERVAL = 50
+# Сколько секунд данные соревнования хранятся в кэше процесса (на случай изменения соревнования в другом процессе)
+COMPETITION_CACHE_TIMEOUT = 60
+# Сколько последних ответов на попытки решения хранится в памяти процесса перед таблицей ResponseCache
+RESPONSE_CACHE_SIZE = 1024
+# На сколько request_id рассчитан фильтр Блума перед таблицей ResponseCache и допустимая доля ложных срабатываний
+RESPONSE_FILTER_CAPACITY = 100000
+RESPONSE_FILTER_ERROR_RATE = 0.01
+# Ограничение частоты попыток и подсказок (количество/период, количество - это и допустимый всплеск запросов):
+# на команду в целом и на каждое задание команды
+THROTTLE_TEAM_RATE = '120/min'
+THROTTLE_EXERCISE_RATE = '30/min'
+# Файл с корзинами маркеров, общий для всех процессов хоста, и количество корзин в нем
+THROTTLE_STATE_PATH = os.path.join(tempfile.gettempdir(), 'high_tech_cross_throttle')
+THROTTLE_SLOTS = 65536
+# Журнал попыток: раз в сколько секунд фоновый поток записывает накопленные события, сколько событий пишется
+# одним запросом и сколько может накопиться в очереди, прежде чем новые события начнут отбрасываться
+ATTEMPT_LOG_FLUSH_INTERVAL = 1
+ATTEMPT_LOG_BATCH_SIZE = 500
+ATTEMPT_LOG_QUEUE_SIZE = 100000
+# Раз в сколько секунд кэш логинов и паролей команд прогревается заново и за сколько секунд до начала соревнования
+# его команды загружаются в кэш. Столько же удаленная команда или старый пароль действуют в других процессах.
+LOGIN_CACHE_TIMEOUT = 30
+LOGIN_WARMUP_BEFORE_START = 15 * 60
+# За сколько секунд до начала соревнования токен конверта можно обменять на обычный токен
+ENVELOPE_VALID_BEFORE_START = 60 * 60
+# Сколько проверенных jwt токенов хранится в памяти процесса и раз в сколько обращений к этому кэшу
+# его счетчики пишутся в лог
+JWT_CACHE_SIZE = 10000
+JWT_CACHE_REPORT_INTERVAL = 10000
+# Импорт команд: сколько паролей хешируется одной задачей пула процессов и сколько команд вставляется одним запросом
+TEAM_IMPORT_HASH_CHUNK_SIZE = 250
+TEAM_IMPORT_BATCH_SIZE = 1000
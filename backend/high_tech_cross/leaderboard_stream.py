@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+
+from http import HTTPStatus
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg2
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection as db_connection, connections
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from .config import LEADERBOARD_NOTIFY_CHANNEL, LEADERBOARD_STREAM_HEARTBEAT, LEADERBOARD_STREAM_QUEUE_SIZE
+from .middleware import TokenError, decode_authorization
+from .models.competition import CompetitionStatus
+from .services import CompetitionCache, Leaderboard
+from .views import LeaderboardView
+
+logger = logging.getLogger(__name__)
+
+
+def diff_records(old_records: List[dict], new_records: List[dict]) -> dict:
+    """
+    Построчная разница между двумя состояниями таблицы лидеров.
+    Строки сопоставляются по team_id. В разницу попадают только изменившиеся строки, в том числе те,
+    у которых изменилось лишь место из-за изменения результатов другой команды.
+    :param old_records:
+    :param new_records:
+    :return: dict с изменившимися строками records и идентификаторами пропавших команд removed
+    """
+    old_records = {record['team_id']: record for record in old_records}
+    team_ids = set()
+    changed_records = []
+    for record in new_records:
+        team_ids.add(record['team_id'])
+        if old_records.get(record['team_id']) != record:
+            changed_records.append(record)
+    removed = [team_id for team_id in old_records if team_id not in team_ids]
+    return {'records': changed_records, 'removed': removed}
+
+
+def _close_old_connections():
+    # Поток работает вне цикла запроса Django, поэтому за устаревшими соединениями следим сами.
+    # Внутри транзакции (например, в тестах) соединение закрывать нельзя.
+    if not db_connection.in_atomic_block:
+        close_old_connections()
+
+
+def _get_leaderboard_state(competition_id: str) -> Tuple[Optional[int], Optional[dict]]:
+    _close_old_connections()
+    leaderboard_version = Leaderboard.get_version(competition_id)
+    if not leaderboard_version:
+        return None, None
+    return leaderboard_version.version, Leaderboard.get_table(leaderboard_version)
+
+
+def _check_competition(competition_id: str) -> Optional[Tuple[int, str]]:
+    """
+    Те же проверки соревнования, что и в LeaderboardView.
+    :param competition_id:
+    :return: None или код и сообщение ошибки
+    """
+    _close_old_connections()
+    leaderboard_version = Leaderboard.get_version(competition_id)
+    if not leaderboard_version:
+        if not CompetitionCache.get_competition(competition_id):
+            return HTTPStatus.NOT_FOUND, 'Соревнование не найдено'
+        return HTTPStatus.FORBIDDEN, LeaderboardView.not_started_message
+    if leaderboard_version.competition.status == CompetitionStatus.NOT_STARTED:
+        return HTTPStatus.FORBIDDEN, LeaderboardView.not_started_message
+
+
+class LeaderboardStreamHub:
+    """
+    Раздача изменений таблицы лидеров подписчикам в рамках одного процесса.
+
+    Об изменении таблицы лидеров хаб узнает через LISTEN/NOTIFY Postgres: уведомление отправляется в транзакции
+    изменения задания и доставляется только после ее коммита, в каком бы процессе она ни выполнялась.
+    Разница вычисляется один раз на изменение и раскладывается в очереди всех подписчиков соревнования.
+    Соединение для LISTEN открыто, только пока есть хотя бы один подписчик.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._states: Dict[str, Tuple[int, dict]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._connection = None
+
+    async def subscribe(self, competition_id: str) -> Tuple[asyncio.Queue, dict]:
+        """
+        Подписка на изменения таблицы лидеров соревнования.
+        :param competition_id:
+        :return: очередь событий подписчика и текущая таблица лидеров
+        """
+        if self._connection is None:
+            await self._listen()
+        queue = asyncio.Queue(maxsize=LEADERBOARD_STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(competition_id, set()).add(queue)
+        await self.publish(competition_id)
+        version, table = self._states[competition_id]
+        return queue, {'version': version, **table}
+
+    def unsubscribe(self, competition_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(competition_id, set())
+        subscribers.discard(queue)
+        if not subscribers:
+            self._subscribers.pop(competition_id, None)
+            self._states.pop(competition_id, None)
+            self._locks.pop(competition_id, None)
+        if not self._subscribers:
+            self._unlisten()
+
+    async def publish(self, competition_id: str):
+        """
+        Перечитывает таблицу лидеров соревнования и рассылает подписчикам изменившиеся строки.
+        Если версия таблицы лидеров не изменилась, ничего не делает.
+        :param competition_id:
+        :return:
+        """
+        if competition_id not in self._subscribers:
+            return
+        lock = self._locks.setdefault(competition_id, asyncio.Lock())
+        async with lock:
+            version, table = await sync_to_async(_get_leaderboard_state)(competition_id)
+            state = self._states.get(competition_id)
+            if table is None or (state and state[0] == version):
+                return
+            self._states[competition_id] = (version, table)
+            if not state:
+                return
+
+            event = {
+                'version': version,
+                'row_count': table['meta']['row_count'],
+                **diff_records(state[1]['records'], table['records']),
+                'highlights': table['highlights'],
+            }
+            for queue in self._subscribers.get(competition_id, set()):
+                if queue.full():
+                    # Клиент не успевает читать события - отправим ему таблицу целиком
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(('snapshot', {'version': version, **table}))
+                else:
+                    queue.put_nowait(('diff', event))
+
+    async def _listen(self):
+        def connect():
+            connection = psycopg2.connect(**connections['default'].get_connection_params())
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {LEADERBOARD_NOTIFY_CHANNEL}')
+            return connection
+
+        connection = await sync_to_async(connect, thread_sensitive=False)()
+        if self._connection is not None:
+            connection.close()
+            return
+        asyncio.get_running_loop().add_reader(connection.fileno(), self._on_notify)
+        self._connection = connection
+
+    def _unlisten(self):
+        if self._connection is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._connection.fileno())
+        self._connection.close()
+        self._connection = None
+
+    def _on_notify(self):
+        try:
+            self._connection.poll()
+        except psycopg2.Error:
+            logger.exception('Соединение для получения изменений таблицы лидеров потеряно')
+            self._unlisten()
+            return
+        competition_ids = set()
+        while self._connection.notifies:
+            competition_ids.add(self._connection.notifies.pop(0).payload)
+        for competition_id in competition_ids:
+            asyncio.ensure_future(self.publish(competition_id))
+
+
+class LeaderboardStreamApplication:
+    """
+    ASGI приложение, которое обслуживает поток изменений таблицы лидеров в формате server-sent events,
+    а все остальные запросы передает в Django.
+
+    Сразу после подключения клиент получает событие snapshot с таблицей лидеров целиком,
+    а затем события diff только с изменившимися строками.
+    """
+    path = '/api/leaderboard/stream'
+
+    def __init__(self, application, hub: LeaderboardStreamHub = None):
+        self.application = application
+        self.hub = hub or LeaderboardStreamHub()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await self.stream(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    @staticmethod
+    async def _send_json(send, data: dict, status: int):
+        body = json.dumps(data).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _send_event(send, event: str, data: dict):
+        data = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        await send({
+            'type': 'http.response.body',
+            'body': f'event: {event}\ndata: {data}\n\n'.encode(),
+            'more_body': True,
+        })
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def stream(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            return await self._send_json(send, {'detail': f'Method "{scope["method"]}" not allowed.'},
+                                         HTTPStatus.METHOD_NOT_ALLOWED)
+        headers = dict(scope['headers'])
+        authorization = headers.get(b'authorization')
+        try:
+            token_data = decode_authorization(authorization.decode('latin1') if authorization else None)
+        except TokenError as error:
+            return await self._send_json(send, {'detail': error.detail}, HTTPStatus.FORBIDDEN)
+
+        competition_id = token_data['competition_id']
+        error = await sync_to_async(_check_competition)(competition_id)
+        if error:
+            status, detail = error
+            return await self._send_json(send, {'detail': detail}, status)
+
+        queue, snapshot = await self.hub.subscribe(competition_id)
+        disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': HTTPStatus.OK,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')],
+            })
+            await self._send_event(send, 'snapshot', snapshot)
+            while True:
+                event = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {event, disconnect}, timeout=LEADERBOARD_STREAM_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED
+                )
+                if event not in done:
+                    event.cancel()
+                if disconnect in done:
+                    break
+                if event in done:
+                    await self._send_event(send, *event.result())
+                else:
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+        finally:
+            disconnect.cancel()
+            self.hub.unsubscribe(competition_id, queue)
@@ -0,0 +1,149 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+import uuid
+
+from datetime import timedelta
+from typing import List
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from ...models import Competition, TaskDescription, Team
+from ...services import Authorization, CompetitionInit
+
+
+class Command(BaseCommand):
+    """
+    Сравнение пропускной способности обработчиков чтения под WSGI и ASGI при одинаковом количестве обработчиков:
+    под WSGI запросы выполняют --concurrency потоков (как gunicorn с --threads), под ASGI - столько же
+    одновременных задач в одном цикле событий (как один процесс uvicorn).
+    Запросы передаются напрямую в приложения из backend/wsgi.py и backend/asgi.py, без сети и HTTP сервера.
+    Создает временные команды, задания и идущее соревнование и удаляет их после замера.
+    """
+    help = 'Сравнивает количество запросов в секунду к api под WSGI и ASGI'
+    paths = ['/api/competition', '/api/exercise_manager/all_exercises', '/api/leaderboard']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Сколько запросов отправить к каждому адресу')
+        parser.add_argument('--concurrency', type=int, default=20, help='Сколько запросов выполняется одновременно')
+        parser.add_argument('--teams', type=int, default=50, help='Сколько команд участвует в соревновании')
+
+    @staticmethod
+    def run_wsgi(application, path: str, tokens: List[str], concurrency: int) -> float:
+        """
+        :return: запросов в секунду
+        """
+        barrier = threading.Barrier(concurrency + 1)
+        errors = []
+
+        def run(thread_tokens: List[str]):
+            barrier.wait()
+            try:
+                for token in thread_tokens:
+                    statuses = []
+                    environ = {
+                        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                        'HTTP_AUTHORIZATION': token, 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+                        'wsgi.url_scheme': 'http',
+                    }
+                    response = application(environ, lambda status, headers: statuses.append(status))
+                    b''.join(response)
+                    response.close()
+                    if not statuses[0].startswith('200'):
+                        errors.append(statuses[0])
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=run, args=(tokens[number::concurrency],)) for number in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started_at = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        duration = time.perf_counter() - started_at
+        assert not errors, f'{path}: {errors[0]}'
+        return len(tokens) / duration
+
+    @staticmethod
+    def run_asgi(application, path: str, tokens: List[str], concurrency: int) -> float:
+        """
+        :return: запросов в секунду
+        """
+        errors = []
+
+        async def request(token: str):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+                'headers': [(b'host', b'localhost'), (b'authorization', token.encode())],
+                'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+
+            async def receive() -> dict:
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message: dict):
+                if message['type'] == 'http.response.start' and message['status'] != 200:
+                    errors.append(message['status'])
+
+            await application(scope, receive, send)
+
+        async def run(task_tokens: List[str]):
+            for token in task_tokens:
+                await request(token)
+
+        async def run_all() -> float:
+            started_at = time.perf_counter()
+            await asyncio.gather(*(run(tokens[number::concurrency]) for number in range(concurrency)))
+            return time.perf_counter() - started_at
+
+        duration = asyncio.run(run_all())
+        assert not errors, f'{path}: {errors[0]}'
+        return len(tokens) / duration
+
+    def handle(self, **options):
+        # Приложения импортируются здесь, так как при импорте они запускают журнал попыток
+        from backend.asgi import application as asgi_application
+        from backend.wsgi import application as wsgi_application
+
+        prefix = f'bench_{uuid.uuid4().hex[:8]}_'
+        teams = Team.objects.bulk_create([
+            Team(login=f'{prefix}{number}', name=f'{prefix}{number}', password=prefix)
+            for number in range(options['teams'])
+        ])
+        tasks = TaskDescription.objects.bulk_create([
+            TaskDescription(name=f'{prefix}{number}', coordinates=['0', '0'], description=prefix, answer=prefix,
+                            hints=[prefix])
+            for number in range(10)
+        ])
+        competition = Competition.objects.create(name=prefix, start_time=timezone.now() - timedelta(minutes=1))
+        try:
+            competition.teams.add(*teams)
+            competition.tasks.add(*tasks)
+            CompetitionInit.initialize_competition(competition)
+            team_tokens = [
+                f'Bearer {Authorization.issue_token(str(team.id), str(competition.id))["auth_token"]}' for team in teams
+            ]
+            tokens = [team_tokens[number % len(team_tokens)] for number in range(options['requests'])]
+            concurrency = min(options['concurrency'], len(tokens))
+
+            for path in self.paths:
+                # Прогрев: кэши процесса, соединения с базой данных
+                self.run_wsgi(wsgi_application, path, tokens[:concurrency], concurrency)
+                self.run_asgi(asgi_application, path, tokens[:concurrency], concurrency)
+                wsgi_rps = self.run_wsgi(wsgi_application, path, tokens, concurrency)
+                asgi_rps = self.run_asgi(asgi_application, path, tokens, concurrency)
+                self.stdout.write(
+                    f'{path}: WSGI {wsgi_rps:.0f} запросов/с, ASGI {asgi_rps:.0f} запросов/с '
+                    f'({asgi_rps / wsgi_rps:.2f}x), одновременно {concurrency}'
+                )
+        finally:
+            competition.delete()
+            Team.objects.filter(login__startswith=prefix).delete()
+            TaskDescription.objects.filter(name__startswith=prefix).delete()
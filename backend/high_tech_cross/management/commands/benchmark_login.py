@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+import uuid
+
+from datetime import timedelta
+from typing import List
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from ...models import Competition, Team
+from ...services import Authorization, CompetitionInit, CompetitionSchedule, LoginCache
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочная проверка авторизации в начале соревнования: все команды авторизуются одновременно.
+    Создает временные команды и соревнование, которое начнется через минуту, и удаляет их после замера.
+    Замер выполняется дважды: с пустым кэшем (первая авторизация прогревает его) и с прогретым.
+    """
+    help = 'Замеряет время авторизации команд, которые авторизуются одновременно'
+    password = 'benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=500, help='Сколько команд авторизуется')
+        parser.add_argument('--threads', type=int, default=50,
+                            help='Сколько потоков выполняют авторизацию (каждому нужно свое соединение с базой)')
+
+    def run_logins(self, logins: List[str], threads: int) -> List[float]:
+        """
+        Потоки заранее открывают соединения с базой данных и начинают авторизацию одновременно.
+        :param logins:
+        :param threads:
+        :return: время каждой авторизации в секундах
+        """
+        durations = []
+        barrier = threading.Barrier(threads)
+
+        def run(thread_logins: List[str]):
+            connection.ensure_connection()
+            barrier.wait()
+            try:
+                for login in thread_logins:
+                    started_at = time.perf_counter()
+                    assert Authorization.authorize(login=login, password=self.password)
+                    durations.append(time.perf_counter() - started_at)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=run, args=(logins[number::threads],)) for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return durations
+
+    def report(self, title: str, durations: List[float]):
+        percentiles = statistics.quantiles(durations, n=100)
+        self.stdout.write(
+            f'{title}: авторизаций {len(durations)}, p50 {percentiles[49] * 1000:.2f} мс, '
+            f'p99 {percentiles[98] * 1000:.2f} мс, максимум {max(durations) * 1000:.2f} мс'
+        )
+
+    def handle(self, **options):
+        prefix = f'bench_{uuid.uuid4().hex[:8]}_'
+        password = make_password(self.password)
+        teams = Team.objects.bulk_create([
+            Team(login=f'{prefix}{number}', name=f'{prefix}{number}', password=password)
+            for number in range(options['teams'])
+        ])
+        competition = Competition.objects.create(name=prefix, start_time=timezone.now() + timedelta(minutes=1))
+        try:
+            competition.teams.add(*teams)
+            CompetitionInit.initialize_competition(competition)
+            logins = [team.login for team in teams]
+            threads = min(options['threads'], len(logins))
+
+            LoginCache.clear()
+            CompetitionSchedule.invalidate()
+            self.report('Пустой кэш', self.run_logins(logins, threads))
+            self.report('Прогретый кэш', self.run_logins(logins, threads))
+        finally:
+            competition.delete()
+            Team.objects.filter(login__startswith=prefix).delete()
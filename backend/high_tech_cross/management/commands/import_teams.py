@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from ...models import Competition
+from ...services import TeamImport
+
+
+class Command(BaseCommand):
+    """
+    Массовое создание команд из CSV (заголовок login,name,password) или JSON (список объектов) файла.
+    Команды с уже существующими логинами пропускаются, поэтому команду можно запускать повторно.
+    """
+    help = 'Создает команды из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с командами')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Сколько процессов хешируют пароли')
+        parser.add_argument('--competition', help='Соревнование, в которое нужно добавить команды файла')
+
+    def handle(self, **options):
+        path = options['path']
+        file_format = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        competition = None
+        if options['competition']:
+            competition = Competition.objects.filter(pk=options['competition']).first()
+            if not competition:
+                raise CommandError(f'Соревнование {options["competition"]} не найдено')
+            if competition.initialized:
+                # Как и в админке, после инициализации соревнования его команды не меняются
+                raise CommandError('Соревнование уже инициализировано, добавлять в него команды нельзя')
+
+        started_at = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as file:
+            try:
+                rows = TeamImport.read(file, file_format)
+            except ValidationError as error:
+                raise CommandError(f'Ошибка в файле {path}: {error.detail}')
+        created, skipped = TeamImport.import_teams(rows, workers=options['workers'], competition=competition)
+        self.stdout.write(
+            f'Создано команд: {created}, пропущено (логин уже существует): {skipped}, '
+            f'за {time.perf_counter() - started_at:.2f} с'
+        )
@@ -1,11 +1,12 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from django.utils import timezone
 from datetime import timedelta
 
 from ...application_context import ApplicationContext
 from ...models import Competition, Exercise
-from ...services import CompetitionInit
+from ...services import CompetitionInit, ExerciseSync, Leaderboard
 
 
 class Command(BaseCommand):
@@ -15,13 +16,19 @@ class Command(BaseCommand):
     """
     @staticmethod
     def solve_exercise(exercise: Exercise, answer: str):
-        exercise.attempt(answer)
-        exercise.save()
+        with transaction.atomic():
+            exercise.version = ExerciseSync.next_version(competition=exercise.competition, team_id=exercise.team_id)
+            exercise.attempt(answer)
+            exercise.save()
+            Leaderboard.refresh_team_record(competition=exercise.competition, team_id=exercise.team_id)
         
     @staticmethod
     def pick_hint(exercise: Exercise, hint_number: int):
-        exercise.pick_hint(hint_number=hint_number)
-        exercise.save()
+        with transaction.atomic():
+            exercise.version = ExerciseSync.next_version(competition=exercise.competition, team_id=exercise.team_id)
+            exercise.pick_hint(hint_number=hint_number)
+            exercise.save()
+            Leaderboard.refresh_team_record(competition=exercise.competition, team_id=exercise.team_id)
 
     def handle(self, **options):
         competition = Competition.objects.get(pk="c67c6b5c-ed3e-41ba-9f2e-d0a6fa4c7cf2")
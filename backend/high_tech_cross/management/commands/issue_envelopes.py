@@ -0,0 +1,38 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Competition
+from ...services import Authorization
+
+
+class Command(BaseCommand):
+    """
+    Выпускает токены конвертов для всех команд соревнования (см. Authorization.issue_envelope_token).
+    Результат - CSV (название команды, логин, токен конверта), из которого печатаются конверты,
+    например, с QR-кодом токена. На старте команды обменивают токен на обычный токен без проверки пароля.
+    Токены действуют только до окончания соревнования, при переносе соревнования их нужно выпустить заново.
+    """
+    help = 'Выпускает токены конвертов для команд соревнования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('competition_id', help='Идентификатор соревнования')
+        parser.add_argument('--output', help='Файл CSV, по умолчанию - стандартный вывод')
+
+    def handle(self, **options):
+        competition = Competition.objects.filter(pk=options['competition_id']).first()
+        if not competition:
+            raise CommandError(f'Соревнование {options["competition_id"]} не найдено')
+
+        teams = competition.teams.order_by('name').values_list('id', 'name', 'login')
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else self.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(['name', 'login', 'envelope_token'])
+            for team_id, name, login in teams:
+                writer.writerow([name, login, Authorization.issue_envelope_token(team_id, competition)])
+        finally:
+            if output is not self.stdout:
+                output.close()
+        if options['output']:
+            self.stdout.write(f'Выпущено токенов конвертов: {len(teams)}, файл {options["output"]}')
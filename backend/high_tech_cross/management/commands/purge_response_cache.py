@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ...services import IdempotencyStore
+
+
+class Command(BaseCommand):
+    """
+    Удаление сохраненных ответов на попытки решения заданий закончившихся соревнований.
+    Можно запускать по расписанию.
+    """
+    help = 'Удаляет сохраненные ответы на попытки решения заданий закончившихся соревнований'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Сколько записей удалять за один запрос')
+
+    def handle(self, **options):
+        deleted = IdempotencyStore.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(f'Удалено записей: {deleted}')
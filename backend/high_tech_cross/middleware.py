@@ -1,47 +1,194 @@
+import hashlib
+import logging
+import threading
+import time
+
 import jwt
 
+from collections import OrderedDict
 from http import HTTPStatus
+from typing import Optional
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
 
 from .application_context import ApplicationContext
-from .config import JWT_SECRET_KEY
+from .config import JWT_CACHE_REPORT_INTERVAL, JWT_CACHE_SIZE, JWT_SECRET_KEY
+from .models.competition import CompetitionWindow
+
+logger = logging.getLogger(__name__)
+
+
+class TokenError(Exception):
+    """
+    Ошибка проверки токена, detail - сообщение, которое отдается клиенту.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class VerifiedTokenCache:
+    """
+    Ограниченный LRU кэш уже проверенных токенов: дайджест токена -> данные токена.
+    Телефоны команды присылают один и тот же токен все соревнование, поэтому повторный токен не проверяется
+    заново, а берется из кэша, пока не истечет срок его действия (exp).
+    Раз в JWT_CACHE_REPORT_INTERVAL обращений счетчики кэша пишутся в лог.
+    """
+    _entries: 'OrderedDict[bytes, dict]' = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    @classmethod
+    def get(cls, token: str) -> Optional[dict]:
+        """
+        :param token:
+        :return: данные токена или None, если токена нет в кэше
+        """
+        key = cls._key(token)
+        with cls._lock:
+            token_data = cls._entries.get(key)
+            if token_data is not None and token_data['exp'] <= time.time():
+                # Истекший токен проверяем заново, чтобы клиент получил ту же ошибку, что и без кэша
+                del cls._entries[key]
+                cls._stats['expirations'] += 1
+                token_data = None
+            if token_data is None:
+                cls._stats['misses'] += 1
+            else:
+                cls._entries.move_to_end(key)
+                cls._stats['hits'] += 1
+            lookups = cls._stats['hits'] + cls._stats['misses']
+        if lookups % JWT_CACHE_REPORT_INTERVAL == 0:
+            logger.info('Кэш проверенных токенов: %s', cls.get_stats())
+        return token_data
+
+    @classmethod
+    def put(cls, token: str, token_data: dict):
+        # Токены без срока действия не кэшируем
+        if not isinstance(token_data.get('exp'), (int, float)):
+            return
+        with cls._lock:
+            cls._entries[cls._key(token)] = token_data
+            while len(cls._entries) > JWT_CACHE_SIZE:
+                cls._entries.popitem(last=False)
+                cls._stats['evictions'] += 1
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        stats = dict(cls._stats, size=len(cls._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+
+def decode_authorization(authorization: Optional[str]) -> dict:
+    """
+    Проверяет значение заголовка Authorization и возвращает данные jwt токена.
+    Используется не только в JWTCheckMiddleware, но и в потоке таблицы лидеров, который обслуживается в обход Django.
+    :param authorization: значение заголовка Authorization
+    :return: данные токена, их нельзя изменять (см. VerifiedTokenCache)
+    """
+    if not authorization:
+        raise TokenError('Token not found')
+    token_data = authorization.split(' ')
+    if len(token_data) != 2 or token_data[0] != 'Bearer':
+        raise TokenError('Invalid token')
+    token = token_data[1]
+    token_data = VerifiedTokenCache.get(token)
+    if token_data is not None:
+        return token_data
+    try:
+        token_data = jwt.decode(token, JWT_SECRET_KEY)
+    except jwt.ExpiredSignatureError:
+        raise TokenError('Token expired')
+    except jwt.InvalidTokenError:
+        raise TokenError('Invalid token')
+    if 'scope' in token_data:
+        # Токен конверта (см. Authorization) нужно сначала обменять на обычный токен
+        raise TokenError('Invalid token')
+    VerifiedTokenCache.put(token, token_data)
+    return token_data
 
 
 class JWTCheckMiddleware:
+    """
+    Под ASGI middleware работает асинхронно, а запросы к api разрешаются по async_urls, где обработчики чтения
+    асинхронные. ApplicationContext хранится в ContextVar, поэтому у каждого запроса (задачи asyncio) он свой,
+    а синхронным обработчикам передается вместе с контекстом (sync_to_async копирует контекст в поток).
+    """
+    sync_capable = True
+    async_capable = True
+    # Токен проверяется у всех запросов к api, кроме перечисленных
+    api_prefix = '/api/'
+    public_paths = frozenset({'/api/authorize', '/api/authorize/envelope'})
+    async_urlconf = 'high_tech_cross.async_urls'
+
     def __init__(self, get_response):
         self.get_response = get_response
         # One-time configuration and initialization.
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Code to be executed for each request before the view (and later middleware) are called.
+        error_response = self.setup_context(request)
+        if error_response:
+            return error_response
+
+        response = self.get_response(request)
+
+        # Code to be executed for each request/response after the view is called.
+        self.clear_context()
+        return response
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.api_prefix):
+            request.urlconf = self.async_urlconf
+        error_response = self.setup_context(request)
+        if error_response:
+            return error_response
 
-        # Проверка токена осталась здесь, несмотря на то что DRF позволяет использовать authentication_classes для
-        # каждого обработчика. Однако, я хотел, чтобы ApplicationContext устанавливался как можно раньше
+        response = await self.get_response(request)
 
-        if '/api' in request.path and request.path != '/api/authorize':
-            token = request.headers.get('Authorization')
-            if not token:
-                return JsonResponse(data={'detail': 'Token not found'}, status=HTTPStatus.FORBIDDEN)
+        self.clear_context()
+        return response
+
+    def setup_context(self, request) -> Optional[JsonResponse]:
+        """
+        Проверка токена осталась здесь, несмотря на то что DRF позволяет использовать authentication_classes для
+        каждого обработчика. Однако, я хотел, чтобы ApplicationContext устанавливался как можно раньше
+        :param request:
+        :return: ответ с ошибкой, если токен не прошел проверку
+        """
+        path = request.path
+        if path.startswith(self.api_prefix) and path not in self.public_paths:
             try:
-                token_data = token.split(' ')
-                if token_data[0] != 'Bearer':
-                    return JsonResponse(data={'detail': 'Invalid token'}, status=HTTPStatus.FORBIDDEN)
-                token_data = jwt.decode(token_data[1], JWT_SECRET_KEY)
-            except jwt.ExpiredSignatureError:
-                return JsonResponse(data={'detail': 'Token expired'}, status=HTTPStatus.FORBIDDEN)
-            except jwt.InvalidTokenError:
-                return JsonResponse(data={'detail': 'Invalid token'}, status=HTTPStatus.FORBIDDEN)
+                token_data = decode_authorization(request.headers.get('Authorization'))
+            except TokenError as error:
+                return JsonResponse(data={'detail': error.detail}, status=HTTPStatus.FORBIDDEN)
 
             # setup ApplicationContext.
             ApplicationContext.team_id.set(token_data['team_id'])
             ApplicationContext.competition_id.set(token_data['competition_id'])
+            ApplicationContext.competition_window.set(CompetitionWindow.from_claims(token_data))
 
-        response = self.get_response(request)
-
-        # Code to be executed for each request/response after the view is called.
-        # Clear ApplicationContext.
+    @staticmethod
+    def clear_context():
         ApplicationContext.team_id.set(None)
         ApplicationContext.competition_id.set(None)
-
-        return response
+        ApplicationContext.competition_window.set(None)
@@ -0,0 +1,74 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:40
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django_better_admin_arrayfield.models.fields
+import uuid
+
+
+def fill_leaderboard_records(apps, schema_editor):
+    """
+    Заполняем записи таблицы лидеров для уже инициализированных соревнований.
+    """
+    from high_tech_cross.models.rule import Rule
+
+    Competition = apps.get_model('high_tech_cross', 'Competition')
+    Exercise = apps.get_model('high_tech_cross', 'Exercise')
+    LeaderboardRecord = apps.get_model('high_tech_cross', 'LeaderboardRecord')
+
+    for competition in Competition.objects.filter(initialized=True):
+        links = Competition.tasks.through.objects.filter(competition=competition).order_by('id')
+        task_ids = [link.taskdescription_id for link in links]
+        records = []
+        for team in competition.teams.all():
+            exercises = Exercise.objects.filter(competition=competition, team=team)
+            completed_at_results = {exercise.task_description_id: exercise.completed_at for exercise in exercises}
+            penalty_time = sum(
+                (
+                    Rule.hint_penalty * len(exercise.used_hints or []) +
+                    Rule.wrong_attempt_penalty * exercise.wrong_attempts
+                    for exercise in exercises
+                ),
+                datetime.timedelta(0)
+            )
+            records.append(LeaderboardRecord(
+                competition=competition,
+                team=team,
+                team_name=team.name,
+                completed_exercises_count=sum(1 for exercise in exercises if exercise.completed_at),
+                penalty_time=penalty_time,
+                completed_at_results=[completed_at_results.get(task_id) for task_id in task_ids]
+            ))
+        LeaderboardRecord.objects.bulk_create(records)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRecord',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('completed_exercises_count', models.IntegerField(default=0)),
+                ('penalty_time', models.DurationField(default=datetime.timedelta(0))),
+                ('completed_at_results', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.DateTimeField(null=True), default=list, size=None)),
+                ('team_name', models.CharField(max_length=30)),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='high_tech_cross.competition')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='high_tech_cross.team')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardrecord',
+            index=models.Index(fields=['competition', '-completed_exercises_count', 'penalty_time', 'team_name'], name='leaderboard_order_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardrecord',
+            constraint=models.UniqueConstraint(fields=('competition', 'team'), name='leaderboard_record_unique'),
+        ),
+        migrations.RunPython(fill_leaderboard_records, migrations.RunPython.noop),
+    ]
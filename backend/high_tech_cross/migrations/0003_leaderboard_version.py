@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_leaderboard_versions(apps, schema_editor):
+    Competition = apps.get_model('high_tech_cross', 'Competition')
+    LeaderboardVersion = apps.get_model('high_tech_cross', 'LeaderboardVersion')
+    LeaderboardVersion.objects.bulk_create([
+        LeaderboardVersion(competition=competition) for competition in Competition.objects.filter(initialized=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0002_leaderboard_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardVersion',
+            fields=[
+                ('competition', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='high_tech_cross.competition')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_leaderboard_versions, migrations.RunPython.noop),
+    ]
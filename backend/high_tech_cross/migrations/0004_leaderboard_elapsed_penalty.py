@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from high_tech_cross.models.rule import Rule
+
+
+# Пересчитываем записи таблицы лидеров: штрафное время теперь считается только по сданным заданиям и включает
+# время от начала соревнования до сдачи задания, а результаты заданий упорядочены по порядку добавления заданий
+# в соревнование.
+REFRESH_RECORDS_SQL = '''
+WITH results AS (
+    SELECT
+        exercise.competition_id,
+        exercise.team_id,
+        COUNT(exercise.completed_at) AS completed_exercises_count,
+        SUM(
+            CASE WHEN exercise.completed_at IS NOT NULL THEN
+                exercise.wrong_attempts * %(wrong_attempt_penalty)s +
+                COALESCE(cardinality(exercise.used_hints), 0) * %(hint_penalty)s +
+                date_trunc('second', exercise.completed_at - competition.start_time)
+            ELSE interval '0' END
+        ) AS penalty_time,
+        array_agg(exercise.completed_at ORDER BY tasks.id) AS completed_at_results
+    FROM high_tech_cross_exercise exercise
+    JOIN high_tech_cross_competition_tasks tasks
+        ON tasks.competition_id = exercise.competition_id AND tasks.taskdescription_id = exercise.task_description_id
+    JOIN high_tech_cross_competition competition ON competition.id = exercise.competition_id
+    GROUP BY exercise.competition_id, exercise.team_id
+)
+UPDATE high_tech_cross_leaderboardrecord record
+SET
+    completed_exercises_count = results.completed_exercises_count,
+    penalty_time = results.penalty_time,
+    completed_at_results = results.completed_at_results
+FROM results
+WHERE record.competition_id = results.competition_id AND record.team_id = results.team_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0003_leaderboard_version'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [(REFRESH_RECORDS_SQL, {
+                'wrong_attempt_penalty': Rule.wrong_attempt_penalty,
+                'hint_penalty': Rule.hint_penalty,
+            })],
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def fill_leaderboard_keyframes(apps, schema_editor):
+    LeaderboardRecord = apps.get_model('high_tech_cross', 'LeaderboardRecord')
+    LeaderboardSnapshot = apps.get_model('high_tech_cross', 'LeaderboardSnapshot')
+    LeaderboardVersion = apps.get_model('high_tech_cross', 'LeaderboardVersion')
+    for leaderboard_version in LeaderboardVersion.objects.all():
+        records = LeaderboardRecord.objects.filter(competition=leaderboard_version.competition_id)
+        LeaderboardSnapshot.objects.create(
+            competition_id=leaderboard_version.competition_id,
+            version=leaderboard_version.version,
+            is_keyframe=True,
+            records=[
+                [
+                    str(record.team_id),
+                    record.team_name,
+                    record.completed_exercises_count,
+                    int(record.penalty_time.total_seconds()),
+                    [
+                        completed_at.isoformat() if completed_at else None
+                        for completed_at in record.completed_at_results
+                    ],
+                ] for record in records
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0004_leaderboard_elapsed_penalty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_keyframe', models.BooleanField(default=False)),
+                ('records', models.JSONField(default=list)),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='high_tech_cross.competition')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardsnapshot',
+            index=models.Index(fields=['competition', 'created_at'], name='leaderboard_snapshot_idx'),
+        ),
+        migrations.RunPython(fill_leaderboard_keyframes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0005_leaderboard_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='leaderboardrecord',
+            name='exercises_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
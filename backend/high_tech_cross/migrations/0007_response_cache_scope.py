@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    """
+    Старые записи ResponseCache не привязаны к соревнованию и команде, а повторять запросы к прошедшим
+    соревнованиям уже некому, поэтому таблица создается заново.
+    """
+
+    dependencies = [
+        ('high_tech_cross', '0006_exercise_version'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ResponseCache',
+        ),
+        migrations.CreateModel(
+            name='ResponseCache',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('request_id', models.UUIDField()),
+                ('response', models.JSONField()),
+                ('expires_at', models.DateTimeField()),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='high_tech_cross.competition')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='high_tech_cross.team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='responsecache',
+            constraint=models.UniqueConstraint(fields=('competition', 'team', 'request_id'), name='response_cache_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='responsecache',
+            index=models.Index(fields=['expires_at'], name='response_cache_expires_idx'),
+        ),
+    ]
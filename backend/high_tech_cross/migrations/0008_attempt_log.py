@@ -0,0 +1,35 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('high_tech_cross', '0007_response_cache_scope'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('request_id', models.UUIDField(null=True)),
+                ('answer', models.TextField(null=True)),
+                ('success', models.BooleanField(null=True)),
+                ('hint_number', models.IntegerField(null=True)),
+                ('competition', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='high_tech_cross.competition')),
+                ('exercise', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='high_tech_cross.exercise')),
+                ('team', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='high_tech_cross.team')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attemptlog',
+            index=models.Index(fields=['competition', 'created_at'], name='attempt_log_competition_idx'),
+        ),
+    ]
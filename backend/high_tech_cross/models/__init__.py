@@ -4,3 +4,7 @@ from .competition import Competition
 from .rule import Rule
 from .exercise import Exercise
 from .response_cache import ResponseCache
+from .leaderboard_record import LeaderboardRecord
+from .leaderboard_version import LeaderboardVersion
+from .leaderboard_snapshot import LeaderboardSnapshot
+from .attempt_log import AttemptLog
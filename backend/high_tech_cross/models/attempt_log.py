@@ -0,0 +1,37 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+from . import Team, Competition, Exercise
+
+
+class AttemptLogKind:
+    ATTEMPT = 'attempt'
+    HINT = 'hint'
+
+
+class AttemptLog(models.Model):
+    """
+    Журнал попыток решения и выданных подсказок для анализа соревнования после его окончания.
+
+    Журнал только пополняется и пишется пачками в фоне (см. AttemptLogWriter), поэтому внешние ключи не проверяются
+    базой данных: запись не должна ждать блокировок связанных строк и не должна падать, если соревнование
+    уже удалили.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    competition = models.ForeignKey(Competition, on_delete=models.DO_NOTHING, db_constraint=False)
+    team = models.ForeignKey(Team, on_delete=models.DO_NOTHING, db_constraint=False)
+    exercise = models.ForeignKey(Exercise, on_delete=models.DO_NOTHING, db_constraint=False)
+    kind = models.CharField(max_length=16)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Для попытки - ответ команды и результат проверки, для подсказки - ее номер
+    request_id = models.UUIDField(null=True)
+    answer = models.TextField(null=True)
+    success = models.BooleanField(null=True)
+    hint_number = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['competition', 'created_at'], name='attempt_log_competition_idx'),
+        ]
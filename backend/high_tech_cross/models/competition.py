@@ -1,6 +1,7 @@
 import uuid
 
 from datetime import timedelta, datetime
+from typing import List, NamedTuple, Optional
 
 from django.utils import timezone
 from django.db import models
@@ -15,30 +16,56 @@ class CompetitionStatus:
     COMPLETED = 'Завершено'
 
 
-class CompetitionManager(models.Manager):
-    def get_nearest_competition_id(self, current_time: datetime, team_id: str) -> str:
+class CompetitionWindow(NamedTuple):
+    """
+    Расписание соревнования, по которому вычисляется его статус: начало и конец (unix time) и признак инициализации.
+    Передается в jwt токене, чтобы отказывать в запросах к не начатому или закончившемуся соревнованию
+    без обращения к базе данных.
+    """
+    start: int
+    end: int
+    initialized: bool
+
+    @classmethod
+    def from_schedule(cls, start_time: datetime, initialized: bool) -> 'CompetitionWindow':
+        return cls(
+            start=int(start_time.timestamp()),
+            end=int((start_time + Rule.competition_duration).timestamp()),
+            initialized=initialized
+        )
+
+    @classmethod
+    def from_claims(cls, token_data: dict) -> Optional['CompetitionWindow']:
         """
-        Находим ближайшее к времени date соревнование.
-        :param current_time:
-        :param team_id:
-        :return:
+        :param token_data:
+        :return: None, если в токене нет расписания соревнования
         """
-
-        # Неприятная ситуация может произойти, если администратор наделает соревнований с промежутком менее времени
-        # длительности соревнования, указанного в правиле Rule (То есть ситуация, в которой новое соревнование
-        # начинается до того, как закончилось предыдущее, но эта команда участвует в обоих).
-
-        # Это нужно ограничивать на этапе инициализации соревнования initialize_competition, но на данном
-        # этапе реализации считаем, что администратор поступил нехорошо.
-
-        competition = self.filter(teams=team_id, initialized=True, start_time__lte=current_time).order_by(
-            '-start_time').first()
-        # Если соревнование оказалось уже завершенным, ищем грядущее соревнование.
-        if not competition or competition.status != CompetitionStatus.IN_PROGRESS:
-            not_started = self.filter(teams=team_id, start_time__gt=current_time).order_by('-start_time').first()
-            if not_started:
-                competition = not_started
-        return str(competition.id) if competition else None
+        try:
+            return cls(
+                start=token_data['competition_start'],
+                end=token_data['competition_end'],
+                initialized=token_data['competition_initialized']
+            )
+        except KeyError:
+            return None
+
+    def to_claims(self) -> dict:
+        return {
+            'competition_start': self.start,
+            'competition_end': self.end,
+            'competition_initialized': self.initialized,
+        }
+
+    def get_status(self, now: datetime) -> str:
+        """
+        То же, что и Competition.status, но по расписанию.
+        """
+        timestamp = now.timestamp()
+        if not self.initialized or timestamp < self.start:
+            return CompetitionStatus.NOT_STARTED
+        if timestamp < self.end:
+            return CompetitionStatus.IN_PROGRESS
+        return CompetitionStatus.COMPLETED
 
 
 class Competition(models.Model):
@@ -59,8 +86,6 @@ class Competition(models.Model):
     # Определяет - были ли инициализированы объекты прогресса исполнения заданий и таблица лидеров
     initialized = models.BooleanField(default=False)
 
-    objects = CompetitionManager()
-
     class Meta:
         ordering = ['-start_time']
         indexes = [
@@ -70,6 +95,15 @@ class Competition(models.Model):
     def __str__(self):
         return self.name if self.name else str(self.id)
 
+    def get_ordered_tasks(self) -> List[TaskDescription]:
+        """
+        Задания соревнования в порядке их добавления в соревнование.
+        Этот порядок определяет порядок столбцов с результатами заданий в таблице лидеров.
+        :return: список описаний заданий
+        """
+        links = Competition.tasks.through.objects.filter(competition=self).select_related('taskdescription')
+        return [link.taskdescription for link in links.order_by('id')]
+
     @property
     def status(self) -> str:
         """
@@ -102,6 +136,10 @@ class Competition(models.Model):
         countdown = self.start_time - timezone.now()
         return zero_delta if countdown < zero_delta else countdown
 
+    @property
+    def window(self) -> CompetitionWindow:
+        return CompetitionWindow.from_schedule(self.start_time, self.initialized)
+
     @property
     def end_time(self) -> datetime:
         return self.start_time + Rule.competition_duration
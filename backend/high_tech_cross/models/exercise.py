@@ -34,6 +34,8 @@ class Exercise(models.Model):
     used_hints = ArrayField(base_field=models.IntegerField(), size=3, null=True, default=list)
     wrong_attempts = models.IntegerField(default=0)
     completed_at = models.DateTimeField(default=None, null=True)
+    # Версия, в которой исполнение задания менялось последний раз (см. ExerciseSync)
+    version = models.BigIntegerField(default=0)
 
     # Связи исполнения задания с командой, соревнованием и самим описанием задания
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
@@ -0,0 +1,39 @@
+import uuid
+
+from datetime import timedelta
+
+from django.db import models
+from django_better_admin_arrayfield.models.fields import ArrayField
+
+from . import Team, Competition
+
+
+class LeaderboardRecord(models.Model):
+    """
+    Запись таблицы лидеров - результаты команды в рамках соревнования.
+    Создается при инициализации соревнования и пересчитывается в той же транзакции, что и изменение исполнения задания.
+    Таким образом таблица лидеров читается одним запросом по индексу, без агрегации по всем исполнениям заданий.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    completed_exercises_count = models.IntegerField(default=0)
+    penalty_time = models.DurationField(default=timedelta(0))
+    # Время сдачи каждого из заданий в порядке заданий соревнования (None - задание не сдано)
+    completed_at_results = ArrayField(base_field=models.DateTimeField(null=True), default=list)
+
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    # Дублируем название команды, чтобы сортировка таблицы лидеров обходилась без join
+    team_name = models.CharField(max_length=30)
+    # Последняя выданная версия исполнений заданий команды (см. ExerciseSync)
+    exercises_version = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['competition', 'team'], name='leaderboard_record_unique'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['competition', '-completed_exercises_count', 'penalty_time', 'team_name'],
+                name='leaderboard_order_idx'
+            ),
+        ]
@@ -0,0 +1,30 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+from . import Competition
+
+
+class LeaderboardSnapshot(models.Model):
+    """
+    Снимок таблицы лидеров соревнования для просмотра истории изменения результатов.
+
+    Опорный снимок (is_keyframe) хранит записи всех команд, обычный снимок - только записи, изменившиеся
+    в версии таблицы лидеров version. Состояние на любой момент восстанавливается из ближайшего предшествующего
+    опорного снимка и следующих за ним изменений, без пересчета исполнений заданий.
+
+    Записи хранятся компактно, списками [team_id, team_name, completed_exercises_count, penalty_seconds,
+    completed_at_results].
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE)
+    version = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    is_keyframe = models.BooleanField(default=False)
+    records = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['competition', 'created_at'], name='leaderboard_snapshot_idx'),
+        ]
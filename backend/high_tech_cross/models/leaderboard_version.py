@@ -0,0 +1,13 @@
+from django.db import models
+
+from . import Competition
+
+
+class LeaderboardVersion(models.Model):
+    """
+    Версия таблицы лидеров соревнования.
+    Увеличивается при каждом изменении исполнения задания соревнования, поэтому по ней можно кэшировать
+    построенную таблицу лидеров и отвечать клиентам 304, если с прошлого запроса ничего не изменилось.
+    """
+    competition = models.OneToOneField(Competition, on_delete=models.CASCADE, primary_key=True)
+    version = models.BigIntegerField(default=0)
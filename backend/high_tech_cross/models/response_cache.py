@@ -1,10 +1,29 @@
+import uuid
+
 from django.db import models
 
+from . import Team, Competition
+
 
 class ResponseCache(models.Model):
     """
     Запись успешной обработки запроса с попыткой решения задания.
     Необходима для надежности в случаях обрыва интернет соединения.
+
+    Ключ - request_id в рамках соревнования и команды, хранится полный ответ, который получит клиент при повторе
+    запроса. После окончания соревнования (expires_at) запись не нужна и удаляется командой purge_response_cache.
     """
-    request_id = models.UUIDField(primary_key=True, editable=False)
-    success = models.BooleanField()
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    competition = models.ForeignKey(Competition, on_delete=models.CASCADE)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    request_id = models.UUIDField()
+    response = models.JSONField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['competition', 'team', 'request_id'], name='response_cache_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='response_cache_expires_idx'),
+        ]
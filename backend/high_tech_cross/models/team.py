@@ -25,7 +25,23 @@ class Team(models.Model):
     def __str__(self):
         return self.name if self.name else str(self.id)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        team = super().from_db(db, field_names, values)
+        # запоминаем хеш пароля из базы, чтобы при сохранении хешировать пароль, только если он изменился
+        if 'password' in field_names:
+            team._saved_password = team.password
+        return team
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or 'password' in fields:
+            self._saved_password = self.password
+
     def save(self, *args, **kwargs):
-        # сохраняем пароль в зашифрованном виде
-        self.password = make_password(self.password)
+        # сохраняем пароль в зашифрованном виде; уже захешированный пароль из базы (например, при сохранении
+        # в админке без смены пароля) повторно не хешируем
+        if 'password' not in self.get_deferred_fields() and self.password != getattr(self, '_saved_password', None):
+            self.password = make_password(self.password)
         super().save(*args, **kwargs)
+        self._saved_password = self.password
@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Колоночный формат таблицы лидеров: заголовки столбцов передаются один раз в meta.column_headers,
+    а каждая запись - массивом значений в порядке столбцов.
+    Клиент запрашивает его заголовком Accept (или параметром ?format=columnar).
+    """
+    media_type = 'application/vnd.high-tech-cross.columnar+json'
+    format = 'columnar'
@@ -1,3 +1,5 @@
 from .exercise_serializer import ExerciseSerializer
 from .competition_serializer import CompetitionSerializer
-from .team_serializer import TeamSerializer
+from .team_serializer import TeamImportValidation, TeamSerializer
+from .leaderboard_serializer import LeaderboardWindowValidation
+from .envelope_serializer import EnvelopeValidation
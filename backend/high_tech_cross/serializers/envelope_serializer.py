@@ -0,0 +1,8 @@
+from rest_framework import serializers
+
+
+class EnvelopeValidation(serializers.Serializer):
+    """
+    Токен конверта, который обменивается на обычный токен.
+    """
+    envelope_token = serializers.CharField()
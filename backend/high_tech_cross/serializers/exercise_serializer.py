@@ -7,15 +7,23 @@ from ..models import Exercise
 
 class ExerciseHintValidation(serializers.Serializer):
     exercise_id = serializers.CharField()
-    number = serializers.IntegerField()
+    number = serializers.IntegerField(min_value=0)
 
 
 class ExerciseSolveValidation(serializers.Serializer):
-    request_id = serializers.CharField()
+    request_id = serializers.UUIDField()
     exercise_id = serializers.CharField()
     answer = serializers.CharField()
 
 
+class ExerciseChangesValidation(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+
+
+class ExerciseSolveBatchValidation(serializers.Serializer):
+    answers = ExerciseSolveValidation(many=True, allow_empty=False)
+
+
 class ExerciseSerializer(serializers.ModelSerializer):
     id = serializers.CharField()
     status = serializers.CharField()
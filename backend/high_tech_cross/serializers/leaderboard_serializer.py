@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+
+class LeaderboardWindowValidation(serializers.Serializer):
+    """
+    Параметры выборки части таблицы лидеров.
+    around - количество строк выше и ниже строки команды, которая делает запрос (имеет приоритет над остальными);
+    after - идентификатор команды, после строки которой нужно начать выборку (вместо offset);
+    offset - номер строки, с которой нужно начать выборку;
+    limit - максимальное количество строк;
+    at - момент времени, на который нужно показать таблицу лидеров (по умолчанию - текущая таблица).
+    """
+    limit = serializers.IntegerField(min_value=1, required=False)
+    offset = serializers.IntegerField(min_value=0, default=0)
+    after = serializers.UUIDField(required=False)
+    around = serializers.IntegerField(min_value=0, required=False)
+    at = serializers.DateTimeField(required=False)
@@ -9,3 +9,12 @@ class TeamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = ('login', 'password')
+
+
+class TeamImportValidation(serializers.Serializer):
+    """
+    Команда из файла импорта (см. TeamImport), пароль передается как есть.
+    """
+    login = serializers.CharField(max_length=30)
+    name = serializers.CharField(max_length=30)
+    password = serializers.CharField()
@@ -1,3 +1,13 @@
+from .attempt_log_writer import AttemptLogWriter
 from .authorization import Authorization
+from .competition_cache import CompetitionCache
 from .competition_init import CompetitionInit
+from .competition_schedule import CompetitionSchedule
+from .exercise_attempt import ExerciseAttempt
+from .exercise_hint import ExerciseHint
+from .exercise_sync import ExerciseSync
+from .idempotency import IdempotencyStore
 from .leaderboard import Leaderboard
+from .leaderboard_history import LeaderboardHistory
+from .login_cache import LoginCache
+from .team_import import TeamImport
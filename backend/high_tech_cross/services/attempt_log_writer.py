@@ -0,0 +1,145 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from typing import List, Optional
+
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from ..config import ATTEMPT_LOG_BATCH_SIZE, ATTEMPT_LOG_FLUSH_INTERVAL, ATTEMPT_LOG_QUEUE_SIZE
+from ..models import AttemptLog
+from ..models.attempt_log import AttemptLogKind
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptLogWriter:
+    """
+    Запись журнала попыток без задержки ответа клиенту.
+
+    Обработчик запроса только кладет событие в очередь процесса, а фоновый поток раз в ATTEMPT_LOG_FLUSH_INTERVAL
+    секунд забирает все накопленные события и сохраняет их через bulk_create пачками по ATTEMPT_LOG_BATCH_SIZE.
+    При завершении процесса очередь дописывается до конца.
+
+    Поток запускается вызовом start (см. backend/wsgi.py, backend/asgi.py). Если приложение загружено до fork
+    (например, gunicorn --preload), дочерний процесс получает пустую очередь, а свой поток запускает
+    при первом событии. Без start события копятся в очереди до ATTEMPT_LOG_QUEUE_SIZE и записываются только
+    явным вызовом flush.
+    При завершении процесса через os._exit atexit не вызывается, и события последних ATTEMPT_LOG_FLUSH_INTERVAL
+    секунд теряются.
+    """
+    _queue = queue.Queue(maxsize=ATTEMPT_LOG_QUEUE_SIZE)
+    _flush_lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stop: Optional[threading.Event] = None
+    _pid = None
+    dropped = 0
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # События родителя записывает родитель, а очередь и блокировка могли быть захвачены его потоками
+        cls._queue = queue.Queue(maxsize=ATTEMPT_LOG_QUEUE_SIZE)
+        cls._flush_lock = threading.Lock()
+
+    @classmethod
+    def _put(cls, event: AttemptLog):
+        # Запись была запущена в родительском процессе до fork - запускаем свой поток
+        if cls._pid is not None and cls._pid != os.getpid():
+            cls.start()
+        try:
+            cls._queue.put_nowait(event)
+        except queue.Full:
+            cls.dropped += 1
+            logger.warning('Очередь журнала попыток переполнена, отброшено событий: %s', cls.dropped)
+
+    @classmethod
+    def record_attempt(cls, competition_id: str, team_id: str, exercise_id: str, request_id: str, answer: str,
+                       success: bool):
+        cls._put(AttemptLog(
+            competition_id=competition_id,
+            team_id=team_id,
+            exercise_id=exercise_id,
+            kind=AttemptLogKind.ATTEMPT,
+            created_at=timezone.now(),
+            request_id=request_id,
+            answer=answer,
+            success=success,
+        ))
+
+    @classmethod
+    def record_hint(cls, competition_id: str, team_id: str, exercise_id: str, hint_number: int):
+        cls._put(AttemptLog(
+            competition_id=competition_id,
+            team_id=team_id,
+            exercise_id=exercise_id,
+            kind=AttemptLogKind.HINT,
+            created_at=timezone.now(),
+            hint_number=hint_number,
+        ))
+
+    @classmethod
+    def _take(cls) -> List[AttemptLog]:
+        events = []
+        while len(events) < ATTEMPT_LOG_BATCH_SIZE:
+            try:
+                events.append(cls._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    @classmethod
+    def flush(cls) -> int:
+        """
+        Сохраняет все события, накопленные в очереди к моменту вызова.
+        :return: количество сохраненных событий
+        """
+        saved = 0
+        with cls._flush_lock:
+            events = cls._take()
+            while events:
+                try:
+                    AttemptLog.objects.bulk_create(events)
+                    saved += len(events)
+                except DatabaseError:
+                    logger.exception('Не удалось сохранить %s событий журнала попыток', len(events))
+                events = cls._take() if len(events) == ATTEMPT_LOG_BATCH_SIZE else []
+        return saved
+
+    @classmethod
+    def _run(cls, stop: threading.Event):
+        while not stop.wait(ATTEMPT_LOG_FLUSH_INTERVAL):
+            if not cls._queue.empty():
+                cls.flush()
+                # Соединение потока не должно оставаться открытым между записями
+                connection.close()
+
+    @classmethod
+    def start(cls):
+        """
+        Запускает фоновую запись журнала в текущем процессе. Повторный вызов ничего не делает.
+        :return:
+        """
+        if cls._pid == os.getpid():
+            return
+        cls._pid = os.getpid()
+        cls._stop = threading.Event()
+        cls._thread = threading.Thread(target=cls._run, args=(cls._stop,), name='attempt-log-writer', daemon=True)
+        cls._thread.start()
+        atexit.register(cls.drain)
+
+    @classmethod
+    def drain(cls):
+        """
+        Останавливает фоновый поток и дописывает оставшиеся события.
+        :return:
+        """
+        if cls._thread and cls._pid == os.getpid():
+            cls._stop.set()
+            cls._thread.join()
+        cls.flush()
+
+
+os.register_at_fork(after_in_child=AttemptLogWriter._after_fork_in_child)
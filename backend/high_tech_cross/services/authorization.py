@@ -5,39 +5,100 @@ from typing import Optional
 from django.contrib.auth.hashers import check_password
 from django.utils import timezone
 
-from ..config import JWT_SECRET_KEY
-from ..models import Team, Rule, Competition
+from ..config import ENVELOPE_VALID_BEFORE_START, JWT_SECRET_KEY
+from ..models import Competition, Rule
+from .competition_schedule import CompetitionSchedule
+from .login_cache import LoginCache
 
 
 class Authorization:
     """
     Stateless служба авторизации в систему HighTechCross.
     Оперирует логикой по авторизации (а в будущем регистрацией, сменой пароля и т.д.)
+
+    Кроме логина и пароля команда может авторизоваться по токену конверта: токен заранее выпускается
+    для команды и соревнования (см. команду issue_envelopes) и обменивается на обычный токен без проверки пароля.
+    Токен конверта подписан тем же ключом, но отличается claim scope, поэтому вместо обычного токена не принимается.
     """
+    envelope_scope = 'envelope'
 
     @staticmethod
     def authorize(login: str, password: str) -> Optional[dict]:
         """
         Инкапсулирует логику поиска команды и проверки пароля.
-        Для простоты храним пароль в незашифрованном виде.
+        Команда и ее соревнование берутся из памяти процесса (см. LoginCache и CompetitionSchedule).
         :param login: логин команды
         :param password: пароль команды
         :return: None или dict с auth_token, team_id и competition_id
         """
-        team = Team.objects.get_by_login(login=login)
+        team = LoginCache.get_team(login=login)
 
         if not team or not check_password(password.lower(), team.password):
             return
 
+        competition_id = CompetitionSchedule.get_nearest_competition_id(team_id=team.team_id, at=timezone.now())
+        return Authorization.issue_token(team_id=team.team_id, competition_id=competition_id)
+
+    @staticmethod
+    def issue_envelope_token(team_id: str, competition: Competition) -> str:
+        """
+        :param team_id:
+        :param competition:
+        :return: токен конверта команды, действует с ENVELOPE_VALID_BEFORE_START секунд до начала соревнования
+            до его окончания. При переносе соревнования конверты нужно выпустить заново.
+        """
+        window = competition.window
+        payload = {
+            'iat': timezone.now(),
+            'nbf': window.start - ENVELOPE_VALID_BEFORE_START,
+            'exp': window.end,
+            'scope': Authorization.envelope_scope,
+            'team_id': str(team_id),
+            'competition_id': str(competition.id)
+        }
+        return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256').decode()
+
+    @staticmethod
+    def exchange_envelope_token(envelope_token: str) -> Optional[dict]:
+        """
+        Обменивает токен конверта на обычный токен. Проверяется только подпись, срок действия токена, участие
+        команды в соревновании и то, что соревнование еще не закончилось (по CompetitionSchedule),
+        без обращения к базе данных и проверки пароля.
+        :param envelope_token:
+        :return: None или то же, что и authorize
+        """
+        try:
+            token_data = jwt.decode(envelope_token, JWT_SECRET_KEY)
+        except jwt.InvalidTokenError:
+            return
+        if token_data.get('scope') != Authorization.envelope_scope:
+            return
+        team_id, competition_id = token_data.get('team_id'), token_data.get('competition_id')
+        if not CompetitionSchedule.has_team(competition_id=competition_id, team_id=team_id):
+            return
+        window = CompetitionSchedule.get_window(competition_id)
+        # Не инициализированное соревнование по статусу не заканчивается, поэтому сравниваем с концом по расписанию
+        if not window or window.end <= timezone.now().timestamp():
+            return
+        return Authorization.issue_token(team_id=team_id, competition_id=competition_id)
+
+    @staticmethod
+    def issue_token(team_id: str, competition_id: Optional[str]) -> dict:
+        """
+        :param team_id:
+        :param competition_id:
+        :return: dict с auth_token, team_id и competition_id
+        """
         current_time = timezone.now()
-        team_id = str(team.id)
-        competition_id = Competition.objects.get_nearest_competition_id(current_time=current_time, team_id=team_id)
         payload = {
             'exp': current_time + Rule.competition_duration,
             'iat': current_time,
             'team_id': team_id,
             'competition_id': competition_id
         }
+        window = CompetitionSchedule.get_window(competition_id) if competition_id else None
+        if window:
+            payload.update(window.to_claims())
         token = jwt.encode(
             payload,
             JWT_SECRET_KEY,
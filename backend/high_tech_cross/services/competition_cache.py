@@ -0,0 +1,156 @@
+import time
+
+from typing import Callable, Dict, List, Optional
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ..config import COMPETITION_CACHE_TIMEOUT
+from ..models import Competition, TaskDescription
+from ..models.competition import CompetitionWindow
+
+
+class CompetitionCache:
+    """
+    Кэш данных соревнования в памяти процесса: само соревнование (время начала, признак инициализации),
+    задания в порядке столбцов таблицы лидеров и заголовки столбцов таблицы лидеров.
+    Во время соревнования эти данные не меняются, а нужны почти каждому запросу.
+
+    Кэш сбрасывается при любом сохранении или удалении соревнования и изменении его заданий
+    (в том числе в админке и при инициализации соревнования). Записи живут не дольше
+    COMPETITION_CACHE_TIMEOUT секунд, чтобы изменения, сделанные в другом процессе, тоже были видны.
+    Закэшированные объекты общие для всех запросов процесса, изменять их нельзя.
+    """
+    _entries: Dict[str, dict] = {}
+
+    @classmethod
+    def _get_entry(cls, competition_id: str) -> Optional[dict]:
+        entry = cls._get_fresh_entry(competition_id)
+        if entry is None:
+            entry = cls._store(competition_id, Competition.objects.filter(pk=competition_id).first())
+        return entry
+
+    @classmethod
+    def _get_fresh_entry(cls, competition_id: str) -> Optional[dict]:
+        entry = cls._entries.get(str(competition_id))
+        if entry is None or entry['expires_at'] < time.monotonic():
+            return None
+        return entry
+
+    @classmethod
+    def _store(cls, competition_id: str, competition: Optional[Competition]) -> Optional[dict]:
+        key = str(competition_id)
+        if not competition:
+            # Отсутствие соревнования не кэшируем - оно может появиться в любой момент
+            cls._entries.pop(key, None)
+            return None
+        entry = {'competition': competition, 'expires_at': time.monotonic() + COMPETITION_CACHE_TIMEOUT}
+        cls._entries[key] = entry
+        return entry
+
+    @classmethod
+    def _get_value(cls, competition: Competition, name: str, build: Callable):
+        entry = cls._get_entry(competition.id)
+        if entry is None:
+            return build()
+        if name not in entry:
+            entry[name] = build()
+        return entry[name]
+
+    @classmethod
+    def get_competition(cls, competition_id: Optional[str]) -> Optional[Competition]:
+        """
+        :param competition_id:
+        :return: None, если соревнование не найдено
+        """
+        if not competition_id:
+            return None
+        entry = cls._get_entry(competition_id)
+        return entry['competition'] if entry else None
+
+    @classmethod
+    async def aget_competition(cls, competition_id: Optional[str]) -> Optional[Competition]:
+        """
+        То же, что и get_competition, но соревнование загружается асинхронным ORM.
+        """
+        if not competition_id:
+            return None
+        entry = cls._get_fresh_entry(competition_id)
+        if entry is None:
+            entry = cls._store(competition_id, await Competition.objects.filter(pk=competition_id).afirst())
+        return entry['competition'] if entry else None
+
+    @classmethod
+    def get_window_status(cls, competition_id: Optional[str], window: Optional[CompetitionWindow]) -> Optional[str]:
+        """
+        Статус соревнования по расписанию из токена, без обращения к базе данных.
+        Расписанию из токена верим, только если оно совпадает с расписанием закэшированного соревнования:
+        кэш сбрасывается при изменении соревнования, так что после изменения расписания токены, выданные раньше,
+        проверяются полностью, пока команда не авторизуется заново. Изменение в другом процессе становится
+        видно, когда запись устареет (не позже COMPETITION_CACHE_TIMEOUT секунд).
+        :param competition_id:
+        :param window:
+        :return: None, если статус по токену определить нельзя
+        """
+        if not competition_id or not window:
+            return None
+        # Устаревшую запись не обновляем: запрос пройдет полную проверку, которая ее обновит
+        entry = cls._get_fresh_entry(competition_id)
+        if not entry or entry['competition'].window != window:
+            return None
+        return window.get_status(timezone.now())
+
+    @classmethod
+    def get_ordered_tasks(cls, competition: Competition) -> List[TaskDescription]:
+        return cls._get_value(competition, 'tasks', competition.get_ordered_tasks)
+
+    @classmethod
+    def get_task(cls, competition: Competition, task_id: str) -> Optional[TaskDescription]:
+        """
+        Описание задания соревнования из кэша.
+        :param competition:
+        :param task_id:
+        :return: None, если в соревновании нет такого задания
+        """
+        tasks = cls._get_value(
+            competition, 'tasks_by_id', lambda: {str(task.id): task for task in cls.get_ordered_tasks(competition)}
+        )
+        return tasks.get(str(task_id))
+
+    @classmethod
+    def get_column_headers(cls, competition: Competition, build: Callable[[Competition], List[dict]]) -> List[dict]:
+        """
+        :param competition:
+        :param build: построение заголовков столбцов таблицы лидеров, если их еще нет в кэше
+        :return:
+        """
+        return cls._get_value(competition, 'column_headers', lambda: build(competition))
+
+    @classmethod
+    def invalidate(cls, competition_id: str):
+        cls._entries.pop(str(competition_id), None)
+
+    @classmethod
+    def clear(cls):
+        cls._entries.clear()
+
+
+@receiver(post_save, sender=Competition)
+@receiver(post_delete, sender=Competition)
+def _invalidate_competition(sender, instance: Competition, **kwargs):
+    CompetitionCache.invalidate(instance.id)
+
+
+@receiver(m2m_changed, sender=Competition.tasks.through)
+def _invalidate_competition_relations(sender, instance, action: str, reverse: bool, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        CompetitionCache.invalidate(instance.id)
+    elif pk_set:
+        for competition_id in pk_set:
+            CompetitionCache.invalidate(competition_id)
+    else:
+        # post_clear со стороны задания - затронутые соревнования уже неизвестны
+        CompetitionCache.clear()
@@ -1,6 +1,15 @@
+import logging
+
+from typing import List
+
 from django.db import transaction
 
-from ..models import Competition, Exercise
+from ..models import Competition, Exercise, LeaderboardRecord, LeaderboardVersion
+from .competition_schedule import CompetitionSchedule
+from .leaderboard_history import LeaderboardHistory
+from .login_cache import LoginCache
+
+logger = logging.getLogger(__name__)
 
 
 class CompetitionInit:
@@ -10,16 +19,19 @@ class CompetitionInit:
     """
 
     @classmethod
-    def initialize_competition(cls, competition: Competition):
+    def initialize_competition(cls, competition: Competition) -> List[Competition]:
         """
         Создает необходимые для функционирования соревнования сущности:
         - Исполнения заданий для каждой из команд в соревновании
-        - Записи таблицы лидеров
+        - Записи таблицы лидеров и ее начальный снимок
+
+        Соревнование инициализируется, даже если его команды в это же время участвуют в других соревнованиях:
+        такие соревнования возвращаются, чтобы администратор мог исправить расписание.
         :param competition:
-        :return:
+        :return: соревнования, которые идут одновременно с competition и в которых участвуют его команды
         """
         if competition.initialized:
-            return
+            return []
 
         teams = competition.teams.all()
         tasks = competition.tasks.all()
@@ -32,3 +44,24 @@ class CompetitionInit:
             for team in teams:
                 for task in tasks:
                     Exercise.objects.create(team=team, competition=competition, task_description=task)
+
+            LeaderboardRecord.objects.bulk_create([
+                LeaderboardRecord(
+                    competition=competition,
+                    team=team,
+                    team_name=team.name,
+                    completed_at_results=[None] * len(tasks)
+                ) for team in teams
+            ])
+            leaderboard_version = LeaderboardVersion.objects.create(competition=competition)
+            LeaderboardHistory.capture_keyframe(competition, leaderboard_version.version)
+
+        # Команды соревнования скоро начнут авторизовываться
+        LoginCache.warm()
+        overlaps = list(Competition.objects.filter(id__in=CompetitionSchedule.find_overlaps(competition)))
+        if overlaps:
+            logger.warning(
+                'Соревнование %s пересекается по времени с соревнованиями своих команд: %s',
+                competition, ', '.join(str(overlap) for overlap in overlaps)
+            )
+        return overlaps
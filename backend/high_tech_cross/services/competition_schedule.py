@@ -0,0 +1,166 @@
+import threading
+import time
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ..config import COMPETITION_CACHE_TIMEOUT
+from ..models import Competition, Rule, Team
+from ..models.competition import CompetitionWindow
+
+
+class TeamSchedule:
+    """
+    Соревнования одной команды, упорядоченные по времени начала. Все соревнования длятся Rule.competition_duration,
+    поэтому соревнование задается временем начала, а поиск по времени - это бинарный поиск по спискам начал.
+    Отдельно хранятся только инициализированные соревнования: начаться могут только они.
+    """
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.competition_ids: List[str] = []
+        self.initialized_starts: List[datetime] = []
+        self.initialized_ids: List[str] = []
+
+    def add(self, start_time: datetime, competition_id: str, initialized: bool):
+        """
+        Соревнования должны добавляться в порядке времени начала.
+        """
+        self.starts.append(start_time)
+        self.competition_ids.append(competition_id)
+        if initialized:
+            self.initialized_starts.append(start_time)
+            self.initialized_ids.append(competition_id)
+
+    def get_nearest_competition_id(self, at: datetime) -> Optional[str]:
+        """
+        Текущее соревнование команды, а если оно уже закончилось или его нет - ближайшее из будущих.
+        Если будущих соревнований нет, остается последнее закончившееся.
+        :param at:
+        :return:
+        """
+        index = bisect_right(self.initialized_starts, at) - 1
+        current_id = self.initialized_ids[index] if index >= 0 else None
+        if current_id and self.initialized_starts[index] + Rule.competition_duration > at:
+            return current_id
+        index = bisect_right(self.starts, at)
+        if index < len(self.starts):
+            return self.competition_ids[index]
+        return current_id
+
+    def find_overlaps(self, competition_id: str, start_time: datetime) -> List[str]:
+        """
+        :param competition_id:
+        :param start_time:
+        :return: соревнования команды, которые идут одновременно с соревнованием, начинающимся в start_time
+        """
+        duration = Rule.competition_duration
+        start = bisect_right(self.starts, start_time - duration)
+        end = bisect_left(self.starts, start_time + duration)
+        return [other_id for other_id in self.competition_ids[start:end] if other_id != competition_id]
+
+
+class CompetitionSchedule:
+    """
+    Индекс соревнований каждой команды в памяти процесса, по которому при авторизации находится соревнование команды
+    без запросов к базе данных, а при инициализации соревнования - пересекающиеся с ним соревнования его команд.
+
+    Заодно индекс хранит расписания соревнований (см. CompetitionWindow), которые передаются в токене.
+
+    Индекс строится одним запросом и сбрасывается при любом сохранении или удалении соревнования и изменении
+    его команд. Как и CompetitionCache, индекс живет не дольше COMPETITION_CACHE_TIMEOUT секунд, чтобы изменения,
+    сделанные в другом процессе, тоже были видны.
+    """
+    _index: Optional[Tuple[Dict[str, TeamSchedule], Dict[str, List[str]], Dict[str, CompetitionWindow]]] = None
+    _expires_at = 0.0
+    _generation = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _build() -> Tuple[Dict[str, TeamSchedule], Dict[str, List[str]], Dict[str, CompetitionWindow]]:
+        links = Competition.teams.through.objects.order_by('competition__start_time').values_list(
+            'team_id', 'competition_id', 'competition__start_time', 'competition__initialized'
+        )
+        teams, competition_teams, windows = defaultdict(TeamSchedule), defaultdict(list), {}
+        for team_id, competition_id, start_time, initialized in links:
+            teams[str(team_id)].add(start_time, str(competition_id), initialized)
+            competition_teams[str(competition_id)].append(str(team_id))
+            windows[str(competition_id)] = CompetitionWindow.from_schedule(start_time, initialized)
+        return dict(teams), dict(competition_teams), windows
+
+    @classmethod
+    def _get_index(cls) -> Tuple[Dict[str, TeamSchedule], Dict[str, List[str]], Dict[str, CompetitionWindow]]:
+        """
+        :return: расписания команд, команды каждого соревнования и расписания соревнований
+        """
+        index = cls._index
+        if index is not None and cls._expires_at >= time.monotonic():
+            return index
+        generation = cls._generation
+        index = cls._build()
+        with cls._lock:
+            # Если индекс сбросили во время построения, построенный индекс мог устареть - не сохраняем его
+            if generation == cls._generation:
+                cls._index, cls._expires_at = index, time.monotonic() + COMPETITION_CACHE_TIMEOUT
+        return index
+
+    @classmethod
+    def warm(cls):
+        cls._get_index()
+
+    @classmethod
+    def get_nearest_competition_id(cls, team_id: str, at: datetime) -> Optional[str]:
+        """
+        См. TeamSchedule.get_nearest_competition_id.
+        :param team_id:
+        :param at:
+        :return: None, если команда не участвует ни в одном соревновании
+        """
+        schedule = cls._get_index()[0].get(str(team_id))
+        return schedule.get_nearest_competition_id(at) if schedule else None
+
+    @classmethod
+    def has_team(cls, competition_id: str, team_id: str) -> bool:
+        return str(team_id) in cls._get_index()[1].get(str(competition_id), [])
+
+    @classmethod
+    def get_window(cls, competition_id: str) -> Optional[CompetitionWindow]:
+        return cls._get_index()[2].get(str(competition_id))
+
+    @classmethod
+    def find_overlaps(cls, competition: Competition) -> List[str]:
+        """
+        :param competition:
+        :return: соревнования, в которых участвует хотя бы одна команда соревнования competition
+            и которые идут одновременно с ним
+        """
+        competition_id = str(competition.id)
+        teams, competition_teams, _ = cls._get_index()
+        overlaps = set()
+        for team_id in competition_teams.get(competition_id, []):
+            overlaps.update(teams[team_id].find_overlaps(competition_id, competition.start_time))
+        return sorted(overlaps)
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._index = None
+            cls._generation += 1
+
+
+@receiver(post_save, sender=Competition)
+@receiver(post_delete, sender=Competition)
+@receiver(post_delete, sender=Team)
+def _invalidate_schedule(sender, **kwargs):
+    CompetitionSchedule.invalidate()
+
+
+@receiver(m2m_changed, sender=Competition.teams.through)
+def _invalidate_schedule_relations(sender, action: str, **kwargs):
+    if action.startswith('post_'):
+        CompetitionSchedule.invalidate()
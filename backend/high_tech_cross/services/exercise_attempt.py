@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.db import connection
+
+from ..models import Competition, Exercise, ResponseCache, Rule, TaskDescription
+
+
+EXERCISE_FIELDS = Exercise._meta.concrete_fields
+TASK_FIELDS = TaskDescription._meta.concrete_fields
+
+# Условие "соревнование идет" для запросов, в которых таблица соревнований участвует под псевдонимом competition
+COMPETITION_IN_PROGRESS_CONDITION = '''competition.initialized
+        AND competition.start_time <= %(now)s
+        AND competition.start_time + %(competition_duration)s > %(now)s'''
+
+# Попытка ответа одним запросом: исполнение задания меняется, только если оно не сдано, соревнование идет, а запрос
+# с таким request_id еще не обрабатывался. Ответ сравнивается с правильным в самой базе, счетчик неверных попыток
+# увеличивается без чтения его в приложение. Возвращается исполнение задания вместе с описанием - для снепшота в ответе.
+SOLVE_EXERCISE_SQL = f'''
+WITH attempt AS (
+    UPDATE {Exercise._meta.db_table} exercise
+    SET
+        wrong_attempts = exercise.wrong_attempts + CASE WHEN task.answer = %(answer)s THEN 0 ELSE 1 END,
+        completed_at = CASE WHEN task.answer = %(answer)s THEN %(now)s END,
+        version = %(version)s
+    FROM {TaskDescription._meta.db_table} task, {Competition._meta.db_table} competition
+    WHERE exercise.id = %(exercise_id)s
+        AND exercise.team_id = %(team_id)s
+        AND exercise.competition_id = %(competition_id)s
+        AND exercise.completed_at IS NULL
+        AND task.id = exercise.task_description_id
+        AND competition.id = exercise.competition_id
+        AND {COMPETITION_IN_PROGRESS_CONDITION}
+        AND NOT EXISTS (
+            SELECT 1 FROM {ResponseCache._meta.db_table} response_cache
+            WHERE response_cache.competition_id = %(competition_id)s
+                AND response_cache.team_id = %(team_id)s
+                AND response_cache.request_id = %(request_id)s
+        )
+    RETURNING {', '.join(f'exercise.{field.column}' for field in EXERCISE_FIELDS)},
+        {', '.join(f'task.{field.column}' for field in TASK_FIELDS)}
+)
+SELECT * FROM attempt
+'''
+
+
+class ExerciseAttempt:
+    """
+    Проверка ответа на задание без чтения и перезаписи исполнения задания в приложении:
+    две попытки с разных телефонов одной команды не затирают друг друга, а вся проверка занимает один запрос.
+    """
+
+    @staticmethod
+    def solve(competition: Competition, team_id: str, exercise_id: str, request_id: str, answer: str,
+              version: int, now: datetime) -> Optional[Tuple[bool, Exercise]]:
+        """
+        Должна вызываться в транзакции, ответ сохраняется в той же транзакции через IdempotencyStore.
+        :param competition:
+        :param team_id:
+        :param exercise_id:
+        :param request_id:
+        :param answer:
+        :param version: версия исполнения задания (см. ExerciseSync)
+        :param now: время попытки
+        :return: правильность ответа и исполнение задания после попытки или None, если попытка не засчитана:
+        задание не найдено или уже сдано, соревнование не идет, или запрос с request_id уже обработан
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(SOLVE_EXERCISE_SQL, {
+                'exercise_id': exercise_id,
+                'team_id': team_id,
+                'competition_id': competition.id,
+                'request_id': request_id,
+                'answer': answer,
+                'version': version,
+                'now': now,
+                'competition_duration': Rule.competition_duration,
+            })
+            row = cursor.fetchone()
+        if not row:
+            return None
+
+        exercise = Exercise.from_db(
+            connection.alias, [field.attname for field in EXERCISE_FIELDS], row[:len(EXERCISE_FIELDS)]
+        )
+        exercise.task_description = TaskDescription.from_db(
+            connection.alias, [field.attname for field in TASK_FIELDS], row[len(EXERCISE_FIELDS):]
+        )
+        exercise.competition = competition
+        return exercise.completed_at is not None, exercise
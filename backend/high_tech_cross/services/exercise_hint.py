@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Optional
+
+from django.db import connection
+
+from ..models import Competition, Exercise, Rule, TaskDescription
+from .competition_cache import CompetitionCache
+from .exercise_attempt import COMPETITION_IN_PROGRESS_CONDITION
+
+
+EXERCISE_FIELDS = Exercise._meta.concrete_fields
+
+# Подсказка добавляется к использованным одним запросом и только если ее там еще нет, задание не сдано,
+# подсказка с таким номером существует, а соревнование идет.
+PICK_HINT_SQL = f'''
+UPDATE {Exercise._meta.db_table} exercise
+SET
+    used_hints = array_append(exercise.used_hints, %(number)s),
+    version = %(version)s
+FROM {TaskDescription._meta.db_table} task, {Competition._meta.db_table} competition
+WHERE exercise.id = %(exercise_id)s
+    AND exercise.team_id = %(team_id)s
+    AND exercise.competition_id = %(competition_id)s
+    AND exercise.completed_at IS NULL
+    AND NOT %(number)s = ANY(COALESCE(exercise.used_hints, '{{}}'))
+    AND task.id = exercise.task_description_id
+    AND %(number)s >= 0 AND %(number)s < cardinality(task.hints)
+    AND competition.id = exercise.competition_id
+    AND {COMPETITION_IN_PROGRESS_CONDITION}
+RETURNING {', '.join(f'exercise.{field.column}' for field in EXERCISE_FIELDS)}
+'''
+
+
+class ExerciseHint:
+    """
+    Выдача подсказки без чтения и перезаписи исполнения задания в приложении:
+    подсказки, взятые одновременно с разных телефонов команды, не затирают друг друга.
+    Текст подсказки и описание задания для снепшота берутся из CompetitionCache.
+    """
+
+    @staticmethod
+    def pick(competition: Competition, team_id: str, exercise_id: str, number: int, version: int,
+             now: datetime) -> Optional[Exercise]:
+        """
+        Должна вызываться в транзакции.
+        :param competition:
+        :param team_id:
+        :param exercise_id:
+        :param number: номер подсказки
+        :param version: версия исполнения задания (см. ExerciseSync)
+        :param now: время запроса подсказки
+        :return: исполнение задания после выдачи подсказки или None, если подсказка не добавлена:
+        задание не найдено или уже сдано, подсказки нет или она уже выдана, соревнование не идет
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(PICK_HINT_SQL, {
+                'exercise_id': exercise_id,
+                'team_id': team_id,
+                'competition_id': competition.id,
+                'number': number,
+                'version': version,
+                'now': now,
+                'competition_duration': Rule.competition_duration,
+            })
+            row = cursor.fetchone()
+        if not row:
+            return None
+
+        exercise = Exercise.from_db(connection.alias, [field.attname for field in EXERCISE_FIELDS], row)
+        exercise.competition = competition
+        task_description = CompetitionCache.get_task(competition, exercise.task_description_id)
+        if task_description:
+            exercise.task_description = task_description
+        return exercise
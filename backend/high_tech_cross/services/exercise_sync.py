@@ -0,0 +1,78 @@
+from django.db import connection
+
+from ..models import Competition, LeaderboardRecord
+from ..models.competition import CompetitionStatus
+
+
+NEXT_EXERCISES_VERSION_SQL = f'''
+UPDATE {LeaderboardRecord._meta.db_table}
+SET exercises_version = exercises_version + 1
+WHERE competition_id = %s AND team_id = %s
+RETURNING exercises_version
+'''
+
+
+class ExerciseSync:
+    """
+    Версии состояния исполнений заданий команды, по которым клиент забирает только изменившиеся задания.
+
+    Счетчик версий команды хранится в ее записи таблицы лидеров: эта запись и так блокируется при каждом изменении
+    исполнения задания, поэтому версии выдаются строго по очереди коммитов. Версии могут идти с пропусками.
+
+    Клиенту отдается не сама версия, а метка синхронизации: версия вместе со статусом соревнования.
+    С окончанием соревнования меняются все задания (например, подсказки становятся недоступны),
+    хотя сами исполнения заданий не менялись.
+    """
+
+    @staticmethod
+    def next_version(competition: Competition, team_id: str) -> int:
+        """
+        Блокирует запись команды до конца транзакции и возвращает новую версию для изменяемых исполнений заданий.
+        Должна вызываться в транзакции изменения до сохранения исполнений заданий,
+        чтобы блокировки всегда брались в одном и том же порядке.
+        :param competition:
+        :param team_id:
+        :return:
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(NEXT_EXERCISES_VERSION_SQL, [competition.id, team_id])
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def _get_version_query(competition: Competition, team_id: str):
+        return LeaderboardRecord.objects.filter(competition=competition, team=team_id).values_list(
+            'exercises_version', flat=True
+        )
+
+    @staticmethod
+    def get_version(competition: Competition, team_id: str) -> int:
+        return ExerciseSync._get_version_query(competition, team_id).first() or 0
+
+    @staticmethod
+    async def aget_version(competition: Competition, team_id: str) -> int:
+        return await ExerciseSync._get_version_query(competition, team_id).afirst() or 0
+
+    @staticmethod
+    def get_token(version: int, status: str) -> int:
+        """
+        Метка синхронизации: версия исполнений заданий в старших битах, признак окончания соревнования в младшем.
+        :param version: версия исполнений заданий команды
+        :param status: статус соревнования
+        :return:
+        """
+        return version * 2 + (status == CompetitionStatus.COMPLETED)
+
+    @staticmethod
+    def get_since_version(token: int, version: int, status: str) -> int:
+        """
+        Версия, после которой клиенту нужно отдать изменившиеся исполнения заданий.
+        :param token: метка синхронизации, которая уже есть у клиента
+        :param version: текущая версия исполнений заданий команды
+        :param status: текущий статус соревнования
+        :return: -1, если клиенту нужно отдать все задания: статус соревнования с тех пор изменился
+            или метка из будущего (например, из другого соревнования)
+        """
+        since, completed = divmod(token, 2)
+        if since > version or completed != (status == CompetitionStatus.COMPLETED):
+            return -1
+        return since
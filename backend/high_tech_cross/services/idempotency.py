@@ -0,0 +1,224 @@
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..bloom_filter import BloomFilter
+from ..config import RESPONSE_CACHE_SIZE, RESPONSE_FILTER_CAPACITY, RESPONSE_FILTER_ERROR_RATE
+from ..models import Competition, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """
+    Сохраненные ответы на попытки решения заданий, чтобы повтор запроса после обрыва соединения получил
+    тот же ответ, а попытка не засчиталась дважды.
+
+    Перед таблицей ResponseCache стоит ограниченный LRU кэш в памяти процесса. В него попадают только ответы
+    закоммиченных транзакций, поэтому он никогда не расходится с таблицей.
+
+    Почти каждый request_id новый, поэтому перед запросом к таблице request_id проверяются фильтром Блума,
+    который строится по таблице при первом обращении и пополняется при сохранении ответов этим процессом.
+    Об ответах, сохраненных другими процессами, фильтр не знает, поэтому там, где ошибка недопустима,
+    его нужно отключать (use_filter=False) перед отказом в попытке, а при IntegrityError на сохранении -
+    повторять без фильтра.
+    """
+    _entries: 'OrderedDict[Tuple[str, str, str], Tuple[object, dict]]' = OrderedDict()
+    _lock = threading.Lock()
+    _filter: Optional[BloomFilter] = None
+    _building_filter: Optional[BloomFilter] = None
+    _filter_stats = {'checks': 0, 'skipped': 0, 'false_positives': 0}
+
+    @staticmethod
+    def _key(competition: Competition, team_id: str, request_id: str) -> Tuple[str, str, str]:
+        return str(competition.id), str(team_id), str(request_id)
+
+    @classmethod
+    def _remember(cls, key: Tuple[str, str, str], expires_at, response: dict):
+        with cls._lock:
+            cls._entries[key] = (expires_at, response)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > RESPONSE_CACHE_SIZE:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def _recall(cls, key: Tuple[str, str, str]) -> Optional[dict]:
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if not entry:
+                return None
+            expires_at, response = entry
+            if expires_at <= timezone.now():
+                del cls._entries[key]
+                return None
+            cls._entries.move_to_end(key)
+            return response
+
+    @staticmethod
+    def _filter_key(competition_id, team_id, request_id) -> str:
+        return f'{competition_id}:{team_id}:{request_id}'
+
+    @classmethod
+    def _add_to_filter(cls, keys: Iterable[str]):
+        with cls._lock:
+            for bloom_filter in {cls._filter, cls._building_filter} - {None}:
+                for key in keys:
+                    bloom_filter.add(key)
+
+    @classmethod
+    def _get_filter(cls) -> Optional[BloomFilter]:
+        """
+        Фильтр Блума по сохраненным ответам. Переполненный фильтр строится заново (истекшие записи в него не попадут).
+        Емкость фильтра - не меньше удвоенного количества действующих ответов, чтобы новый фильтр не оказался
+        переполненным сразу после построения.
+        :return: None, пока фильтр строится
+        """
+        with cls._lock:
+            if cls._filter and cls._filter.count < cls._filter.capacity:
+                return cls._filter
+            if cls._building_filter:
+                return None
+
+        records = ResponseCache.objects.filter(expires_at__gt=timezone.now())
+        capacity = max(RESPONSE_FILTER_CAPACITY, 2 * records.count())
+        with cls._lock:
+            if cls._building_filter:
+                return None
+            # Ответы, сохраненные во время построения, попадут в фильтр через _add_to_filter
+            cls._building_filter = BloomFilter(capacity=capacity, error_rate=RESPONSE_FILTER_ERROR_RATE)
+
+        try:
+            records = records.values_list('competition_id', 'team_id', 'request_id')
+            cls._add_to_filter([cls._filter_key(*record) for record in records.iterator()])
+        finally:
+            with cls._lock:
+                cls._filter, cls._building_filter = cls._building_filter, None
+        logger.info('Фильтр сохраненных ответов построен: %s', cls.get_filter_stats())
+        return cls._filter
+
+    @classmethod
+    def get_filter_stats(cls) -> dict:
+        """
+        Метрики фильтра Блума: заполнение, занимаемая память, ожидаемая и наблюдаемая доля ложных срабатываний
+        (наблюдаемая - доля request_id, которых нет в таблице, но фильтр не смог это подтвердить).
+        :return:
+        """
+        bloom_filter = cls._filter
+        with cls._lock:
+            stats = dict(cls._filter_stats)
+        absent = stats['skipped'] + stats['false_positives']
+        stats['observed_false_positive_rate'] = stats['false_positives'] / absent if absent else 0.0
+        if bloom_filter:
+            stats.update({
+                'count': bloom_filter.count,
+                'capacity': bloom_filter.capacity,
+                'memory_bytes': bloom_filter.memory_bytes,
+                'hash_count': bloom_filter.hash_count,
+                'expected_false_positive_rate': bloom_filter.false_positive_rate,
+            })
+        return stats
+
+    @classmethod
+    def get_many(cls, competition: Competition, team_id: str, request_ids: Iterable[str],
+                 use_filter: bool = True) -> Dict[str, dict]:
+        """
+        :param competition:
+        :param team_id:
+        :param request_ids:
+        :param use_filter: не ходить в таблицу за request_id, которых точно нет в фильтре Блума
+        :return: сохраненные ответы по request_id
+        """
+        responses, missing = {}, []
+        for request_id in request_ids:
+            response = cls._recall(cls._key(competition, team_id, request_id))
+            if response is None:
+                missing.append(request_id)
+            else:
+                responses[request_id] = response
+
+        bloom_filter = cls._get_filter() if use_filter and missing else None
+        if bloom_filter:
+            checked = len(missing)
+            missing = [
+                request_id for request_id in missing
+                if cls._filter_key(competition.id, team_id, request_id) in bloom_filter
+            ]
+            with cls._lock:
+                cls._filter_stats['checks'] += checked
+                cls._filter_stats['skipped'] += checked - len(missing)
+        if not missing:
+            return responses
+
+        records = ResponseCache.objects.filter(
+            competition=competition, team=team_id, request_id__in=missing, expires_at__gt=timezone.now()
+        ).values_list('request_id', 'response', 'expires_at')
+        stored = {str(request_id): (response, expires_at) for request_id, response, expires_at in records}
+        for request_id in missing:
+            if str(request_id) in stored:
+                response, expires_at = stored[str(request_id)]
+                cls._remember(cls._key(competition, team_id, request_id), expires_at, response)
+                responses[request_id] = response
+        if bloom_filter:
+            with cls._lock:
+                cls._filter_stats['false_positives'] += len(missing) - len(stored)
+        return responses
+
+    @classmethod
+    def get(cls, competition: Competition, team_id: str, request_id: str, use_filter: bool = True) -> Optional[dict]:
+        return cls.get_many(competition, team_id, [request_id], use_filter=use_filter).get(request_id)
+
+    @classmethod
+    def save_many(cls, competition: Competition, team_id: str, responses: Dict[str, dict]):
+        """
+        Сохраняет ответы до окончания соревнования. Должна вызываться в транзакции попытки решения:
+        если этот request_id уже сохранен параллельным запросом, будет IntegrityError.
+        :param competition:
+        :param team_id:
+        :param responses: ответы по request_id
+        :return:
+        """
+        expires_at = competition.end_time
+        ResponseCache.objects.bulk_create([
+            ResponseCache(
+                competition=competition, team_id=team_id, request_id=request_id, response=response,
+                expires_at=expires_at
+            ) for request_id, response in responses.items()
+        ])
+
+        def remember():
+            for request_id, response in responses.items():
+                cls._remember(cls._key(competition, team_id, request_id), expires_at, response)
+            cls._add_to_filter([cls._filter_key(competition.id, team_id, request_id) for request_id in responses])
+
+        transaction.on_commit(remember)
+
+    @classmethod
+    def save(cls, competition: Competition, team_id: str, request_id: str, response: dict):
+        cls.save_many(competition, team_id, {request_id: response})
+
+    @staticmethod
+    def purge_expired(batch_size: int) -> int:
+        """
+        Удаляет записи закончившихся соревнований пачками по batch_size, чтобы не держать долгих блокировок.
+        :param batch_size:
+        :return: количество удаленных записей
+        """
+        deleted = 0
+        now = timezone.now()
+        while True:
+            ids = list(ResponseCache.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += ResponseCache.objects.filter(id__in=ids).delete()[0]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._filter = None
+            cls._filter_stats = {'checks': 0, 'skipped': 0, 'false_positives': 0}
@@ -1,15 +1,78 @@
-from typing import List
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Union
 
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.db import models
-from django.db.models.aggregates import Count, Sum
-from django.db.models.expressions import F
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.expressions import F, Window
+from django.db.models.functions import Rank
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
-from ..application_context import ApplicationContext
-from ..models import Competition, Rule
+from rest_framework.exceptions import NotFound
+
+from ..config import LEADERBOARD_NOTIFY_CHANNEL
+from ..models import Competition, Exercise, LeaderboardRecord, LeaderboardVersion, Rule, Team
+from .competition_cache import CompetitionCache
+from .leaderboard_history import LeaderboardHistory
+
+
+# Пересчет записи таблицы лидеров команды одним запросом в рамках одного соревнования: тем же запросом
+# увеличивается версия таблицы лидеров и отправляется уведомление о ее изменении.
+# Результаты заданий разворачиваются в массив в порядке добавления заданий в соревнование.
+# Штрафное время считается только по сданным заданиям: время от начала соревнования до сдачи задания
+# (с точностью до секунды) плюс штраф за каждую подсказку и каждую неверную попытку по этому заданию.
+REFRESH_TEAM_RECORD_SQL = f'''
+WITH tasks AS (
+    SELECT taskdescription_id, id AS task_order
+    FROM {Competition.tasks.through._meta.db_table}
+    WHERE competition_id = %(competition_id)s
+), results AS (
+    SELECT
+        exercise.team_id,
+        COUNT(exercise.completed_at) AS completed_exercises_count,
+        SUM(
+            CASE WHEN exercise.completed_at IS NOT NULL THEN
+                exercise.wrong_attempts * %(wrong_attempt_penalty)s +
+                COALESCE(cardinality(exercise.used_hints), 0) * %(hint_penalty)s +
+                date_trunc('second', exercise.completed_at - competition.start_time)
+            ELSE interval '0' END
+        ) AS penalty_time,
+        array_agg(exercise.completed_at ORDER BY tasks.task_order) AS completed_at_results
+    FROM {Exercise._meta.db_table} exercise
+    JOIN tasks ON tasks.taskdescription_id = exercise.task_description_id
+    JOIN {Competition._meta.db_table} competition ON competition.id = exercise.competition_id
+    WHERE exercise.competition_id = %(competition_id)s AND exercise.team_id = %(team_id)s
+    GROUP BY exercise.team_id
+), record AS (
+    UPDATE {LeaderboardRecord._meta.db_table} record
+    SET
+        completed_exercises_count = results.completed_exercises_count,
+        penalty_time = results.penalty_time,
+        completed_at_results = results.completed_at_results
+    FROM results
+    WHERE record.competition_id = %(competition_id)s AND record.team_id = results.team_id
+    RETURNING record.team_id, record.team_name, record.completed_exercises_count, record.penalty_time,
+        record.completed_at_results
+), leaderboard_version AS (
+    UPDATE {LeaderboardVersion._meta.db_table}
+    SET version = version + 1
+    WHERE competition_id = %(competition_id)s
+    RETURNING version
+), notification AS (
+    -- Уведомление доставляется слушателям только после коммита транзакции
+    SELECT pg_notify(%(channel)s, %(competition_id)s::text)
+)
+SELECT leaderboard_version.version, record.*
+FROM leaderboard_version CROSS JOIN notification LEFT JOIN record ON TRUE
+'''
 
 
 class Leaderboard:
+    # Номера столбцов колоночной записи (см. _serialize_columnar_record)
+    COLUMNAR_POSITION = 0
+    COLUMNAR_TEAM_ID = 1
+    COLUMNAR_COMPLETED_COUNT = -2
 
     @staticmethod
     def _prepare_column_headers(competition: Competition) -> List[dict]:
@@ -34,7 +97,7 @@ class Leaderboard:
                 'is_visible': True,
             },
         ]
-        tasks = competition.tasks.all()
+        tasks = CompetitionCache.get_ordered_tasks(competition)
         for number, task in enumerate(tasks, start=1):
             headers.append({
                 'col_name': task.name if task.name else str(task.id),
@@ -58,8 +121,20 @@ class Leaderboard:
         ])
         return headers
 
-    @staticmethod
-    def _prepare_highlights(records: List[dict]) -> List[dict]:
+    @classmethod
+    def _read_record(cls, record: Union[dict, list]) -> tuple:
+        """
+        :param record: запись в обычном или колоночном формате
+        :return: место команды, идентификатор команды, количество сданных заданий
+        """
+        if isinstance(record, list):
+            return (
+                record[cls.COLUMNAR_POSITION], record[cls.COLUMNAR_TEAM_ID], record[cls.COLUMNAR_COMPLETED_COUNT]
+            )
+        return record['position'], record['team_id'], record.get('completed_exercise_count', 0)
+
+    @classmethod
+    def _prepare_highlights(cls, records: List[Union[dict, list]]) -> List[dict]:
         """
         Для примера, реализация "подсветки" команд, которые не решили ни одного задания.
         :param records:
@@ -67,66 +142,182 @@ class Leaderboard:
         """
         highlights = []
         for record in records:
-            if record.get('completed_exercise_count', 0) == 0:
+            position, _, completed_count = cls._read_record(record)
+            if completed_count == 0:
                 highlights.append({
                     'location': {
                         'type': 'cell',
-                        'position': record['position'],
+                        'position': position,
                         'column': 'team_name'
                     },
                     'highlight': 'zero_points'
                 })
         return highlights
 
+    @staticmethod
+    def _serialize_record(position: int, team_id, team_name: str, completed_exercises_count: int,
+                          penalty_time: timedelta, completed_at_results: List[Optional[datetime]]) -> dict:
+        serialized_record = {
+            'position': position,
+            'team_id': str(team_id),
+            'team_name': team_name,
+        }
+
+        for task_number, completed_at in enumerate(completed_at_results, start=1):
+            serialized_record[f'exercise_{task_number}'] = completed_at
+
+        serialized_record.update({
+            'completed_exercise_count': completed_exercises_count,
+            'total_penalty_time': str(penalty_time)
+        })
+        return serialized_record
+
+    @staticmethod
+    def _serialize_columnar_record(position: int, team_id, team_name: str, completed_exercises_count: int,
+                                   penalty_time: timedelta, completed_at_results: List[Optional[datetime]]) -> list:
+        """
+        Запись в колоночном формате: значения в порядке столбцов _prepare_column_headers,
+        штрафное время - целым количеством секунд.
+        """
+        return [
+            position, str(team_id), team_name, *completed_at_results, completed_exercises_count,
+            int(penalty_time.total_seconds())
+        ]
+
+    @classmethod
+    def _get_serializer(cls, columnar: bool):
+        return cls._serialize_columnar_record if columnar else cls._serialize_record
+
     @classmethod
-    def _get_records(cls, competition: Competition) -> List[dict]:
+    def _get_records(cls, competition: Competition, columnar: bool = False) -> List[Union[dict, list]]:
         """
-        Агрегирует таблицу лидеров относительно команд, участвующих в соревновании competition.
+        Читает таблицу лидеров относительно команд, участвующих в соревновании competition.
 
-        Сортирует по количеству выполненных заданий, штрафному времени и наименованию команды
-        (в случае совпадения количества заданий и штрафного времени).
+        Место команды вычисляется в базе данных по количеству выполненных заданий и штрафному времени,
+        команды с одинаковыми результатами делят место. Внутри одного места команды сортируются по наименованию.
 
         Возвращает результат в сериализованном виде.
         :param competition:
+        :param columnar: записи в колоночном формате
         :return:
         """
-        serialized_records = []
-        leaderboard_records = competition.teams.annotate(
-            completed_exercises_count=Count('exercise__completed_at'),
-            penalty_time=Sum(
-                F('exercise__wrong_attempts') * Rule.wrong_attempt_penalty + F('exercise__used_hints__len') *
-                Rule.hint_penalty, output_field=models.DurationField()
-            ),
-            completed_at_results=ArrayAgg('exercise__completed_at'),
-            team_id=F('id'),
-            team_name=F('name')
-        ).order_by('-completed_exercises_count', 'penalty_time', 'name').defer('id', 'name', 'login', 'password')
-
-        for number, record in enumerate(leaderboard_records, start=1):
-            serialized_record = {
-                'position': number,
-                'team_id': str(record.team_id),
-                'team_name': record.team_name,
-            }
-
-            for task_number, completed_at in enumerate(record.completed_at_results, start=1):
-                serialized_record[f'exercise_{task_number}'] = completed_at
-
-            serialized_record.update({
-                'completed_exercise_count': record.completed_exercises_count,
-                'total_penalty_time': str(record.penalty_time)
-            })
-            serialized_records.append(serialized_record)
+        leaderboard_records = LeaderboardRecord.objects.filter(competition=competition).annotate(
+            position=Window(
+                expression=Rank(),
+                order_by=[F('completed_exercises_count').desc(), F('penalty_time').asc()]
+            )
+        ).order_by('position', 'team_name')
+
+        serialize = cls._get_serializer(columnar)
+        return [
+            serialize(
+                record.position, record.team_id, record.team_name, record.completed_exercises_count,
+                record.penalty_time, record.completed_at_results
+            ) for record in leaderboard_records
+        ]
 
+    @classmethod
+    def _rank_records(cls, records: Iterable[tuple], columnar: bool = False) -> List[Union[dict, list]]:
+        """
+        То же упорядочивание и вычисление мест, что и в _get_records, но для записей из истории таблицы лидеров.
+        :param records: записи в порядке полей LeaderboardHistory.record_fields
+        :param columnar: записи в колоночном формате
+        :return:
+        """
+        serialize = cls._get_serializer(columnar)
+        serialized_records = []
+        position, previous_result = 0, None
+        ordered_records = sorted(records, key=lambda record: (-record[2], record[3], record[1]))
+        for number, (team_id, team_name, completed_count, penalty_time, completed_at_results) in enumerate(
+                ordered_records, start=1):
+            if (completed_count, penalty_time) != previous_result:
+                position, previous_result = number, (completed_count, penalty_time)
+            serialized_records.append(serialize(
+                position, team_id, team_name, completed_count, penalty_time, completed_at_results
+            ))
         return serialized_records
 
+    @staticmethod
+    def refresh_team_record(competition: Competition, team_id: str):
+        """
+        Пересчитывает запись таблицы лидеров команды team_id по ее исполнениям заданий в соревновании competition.
+        Должна вызываться в той же транзакции, что и сохранение исполнения задания, и после ExerciseSync.next_version.
+
+        next_version блокирует запись команды до конца транзакции, поэтому параллельные изменения разных заданий
+        одной команды пересчитываются по очереди: пересчет начинается уже после коммита предыдущего изменения
+        и видит его. Изменение записи сохраняется в историю таблицы лидеров под новой версией.
+        :param competition:
+        :param team_id:
+        :return:
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(REFRESH_TEAM_RECORD_SQL, {
+                'competition_id': competition.id,
+                'team_id': team_id,
+                'wrong_attempt_penalty': Rule.wrong_attempt_penalty,
+                'hint_penalty': Rule.hint_penalty,
+                'channel': LEADERBOARD_NOTIFY_CHANNEL,
+            })
+            rows = cursor.fetchall()
+        if not rows:
+            # Таблицы лидеров нет только у не инициализированного соревнования
+            return
+        changed_records = [row[1:] for row in rows if row[1] is not None]
+        LeaderboardHistory.capture_change(competition, rows[0][0], changed_records)
+
     @classmethod
-    def get_table(cls) -> dict:
+    def rename_team(cls, team: Team):
+        """
+        Название команды продублировано в записях таблицы лидеров для сортировки. Переименование меняет таблицу
+        лидеров каждого соревнования команды так же, как попытка: увеличивает версию (а значит и ETag),
+        сохраняется в историю и рассылается слушателям.
+        :param team:
+        :return:
+        """
+        with transaction.atomic():
+            # Блокировка записей та же, что и у ExerciseSync.next_version при изменении исполнения задания
+            records = list(
+                LeaderboardRecord.objects.select_for_update(of=('self',)).select_related('competition').filter(
+                    team=team.id
+                ).exclude(team_name=team.name)
+            )
+            if not records:
+                return
+            LeaderboardRecord.objects.filter(pk__in=[record.pk for record in records]).update(team_name=team.name)
+            for record in records:
+                cls.refresh_team_record(competition=record.competition, team_id=str(team.id))
+
+    @staticmethod
+    def get_version(competition_id: Optional[str]) -> Optional[LeaderboardVersion]:
+        """
+        Получаем текущую версию таблицы лидеров, соревнование берется из CompetitionCache.
+        :param competition_id:
+        :return: None, если соревнование не найдено или еще не инициализировано
+        """
+        leaderboard_version = LeaderboardVersion.objects.filter(competition=competition_id).first()
+        if leaderboard_version:
+            leaderboard_version.competition = CompetitionCache.get_competition(competition_id)
+        return leaderboard_version
 
-        competition_id = ApplicationContext.competition_id.get()
-        competition = Competition.objects.get(pk=competition_id)
-        column_headers = cls._prepare_column_headers(competition)
-        serialized_records = cls._get_records(competition)
+    @staticmethod
+    async def aget_version(competition_id: Optional[str]) -> Optional[LeaderboardVersion]:
+        """
+        То же, что и get_version, но с асинхронным ORM.
+        """
+        leaderboard_version = await LeaderboardVersion.objects.filter(competition=competition_id).afirst()
+        if leaderboard_version:
+            leaderboard_version.competition = await CompetitionCache.aget_competition(competition_id)
+        return leaderboard_version
+
+    @classmethod
+    def _build_table(cls, competition: Competition, serialized_records: List[Union[dict, list]],
+                     columnar: bool = False) -> dict:
+        column_headers = CompetitionCache.get_column_headers(competition, cls._prepare_column_headers)
+        if columnar:
+            column_headers = [
+                {**header, 'value_type': 'seconds'} if header['property_name'] == 'total_penalty_time' else header
+                for header in column_headers
+            ]
         highlights = cls._prepare_highlights(serialized_records)
 
         return {
@@ -138,3 +329,93 @@ class Leaderboard:
             'records': serialized_records,
             'highlights': highlights,
         }
+
+    @classmethod
+    def get_table(cls, leaderboard_version: LeaderboardVersion, columnar: bool = False) -> dict:
+        """
+        Возвращает таблицу лидеров для версии leaderboard_version.
+        Таблица строится один раз на версию и формат, пока версия не изменилась - отдаем ее из кэша.
+        :param leaderboard_version:
+        :param columnar: таблица в колоночном формате: каждая запись - массив значений в порядке
+            meta.column_headers, штрафное время передается целым количеством секунд
+        :return:
+        """
+        competition = leaderboard_version.competition
+        key = cls._get_table_key(leaderboard_version, columnar)
+        table = cache.get(key)
+        if table is None:
+            table = cls._build_table(competition, cls._get_records(competition, columnar), columnar)
+            cache.set(key, table, timeout=Rule.competition_duration.total_seconds())
+        return table
+
+    @classmethod
+    async def aget_table(cls, leaderboard_version: LeaderboardVersion, columnar: bool = False) -> dict:
+        """
+        То же, что и get_table. Таблица строится один раз на версию, поэтому построение не переписано
+        на асинхронный ORM, а выполняется в потоке.
+        """
+        table = cache.get(cls._get_table_key(leaderboard_version, columnar))
+        if table is None:
+            table = await sync_to_async(cls.get_table)(leaderboard_version, columnar)
+        return table
+
+    @staticmethod
+    def _get_table_key(leaderboard_version: LeaderboardVersion, columnar: bool = False) -> str:
+        key = f'leaderboard:{leaderboard_version.competition.id}:{leaderboard_version.version}'
+        return f'{key}:columnar' if columnar else key
+
+    @classmethod
+    def get_table_at(cls, competition: Competition, at: datetime, columnar: bool = False) -> dict:
+        """
+        Возвращает таблицу лидеров в том виде, в котором она была на момент at.
+        :param competition:
+        :param at:
+        :param columnar: таблица в колоночном формате, см. get_table
+        :return:
+        """
+        records = LeaderboardHistory.get_records_at(competition, at)
+        if records is None:
+            raise NotFound(f'Таблица лидеров на {at.isoformat()} не найдена')
+        return cls._build_table(competition, cls._rank_records(records, columnar), columnar)
+
+    @classmethod
+    def _find_team_index(cls, records: List[Union[dict, list]], team_id: str) -> int:
+        team_id = str(team_id)
+        for index, record in enumerate(records):
+            if cls._read_record(record)[1] == team_id:
+                return index
+        raise NotFound(f'Команда {team_id} не найдена в таблице лидеров')
+
+    @classmethod
+    def get_window(cls, table: dict, team_id: str, limit: int = None, offset: int = 0, after: str = None,
+                   around: int = None) -> dict:
+        """
+        Вырезает из таблицы лидеров часть строк, заголовки столбцов при этом не меняются.
+        В meta.row_count остается общее количество строк, а в meta.offset - номер первой из отданных строк.
+        :param table: таблица лидеров целиком, в обычном или колоночном формате
+        :param team_id: команда, которая делает запрос
+        :param limit: максимальное количество строк
+        :param offset: номер строки, с которой начинается выборка
+        :param after: команда, после строки которой начинается выборка
+        :param around: количество строк выше и ниже строки команды team_id
+        :return:
+        """
+        records = table['records']
+        if around is not None:
+            index = cls._find_team_index(records, team_id)
+            start, end = max(index - around, 0), index + around + 1
+        else:
+            start = cls._find_team_index(records, after) + 1 if after else offset
+            end = start + limit if limit else len(records)
+
+        window_records = records[start:end]
+        return {
+            'meta': {**table['meta'], 'offset': start},
+            'records': window_records,
+            'highlights': cls._prepare_highlights(window_records),
+        }
+
+
+@receiver(post_save, sender=Team)
+def _rename_team(sender, instance: Team, **kwargs):
+    Leaderboard.rename_team(instance)
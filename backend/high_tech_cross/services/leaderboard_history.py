@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from ..config import LEADERBOARD_KEYFRAME_INTERVAL
+from ..models import Competition, LeaderboardRecord, LeaderboardSnapshot
+
+
+class LeaderboardHistory:
+    """
+    История таблицы лидеров.
+    При каждом изменении таблицы лидеров сохраняются только изменившиеся записи, а каждая
+    LEADERBOARD_KEYFRAME_INTERVAL версия - опорным снимком со всеми записями.
+    """
+    record_fields = ('team_id', 'team_name', 'completed_exercises_count', 'penalty_time', 'completed_at_results')
+
+    @staticmethod
+    def encode_record(team_id, team_name: str, completed_exercises_count: int, penalty_time: timedelta,
+                      completed_at_results: List[Optional[datetime]]) -> list:
+        return [
+            str(team_id),
+            team_name,
+            completed_exercises_count,
+            int(penalty_time.total_seconds()),
+            [completed_at.isoformat() if completed_at else None for completed_at in completed_at_results],
+        ]
+
+    @staticmethod
+    def decode_record(record: list) -> tuple:
+        team_id, team_name, completed_exercises_count, penalty_seconds, completed_at_results = record
+        return (
+            team_id,
+            team_name,
+            completed_exercises_count,
+            timedelta(seconds=penalty_seconds),
+            [datetime.fromisoformat(completed_at) if completed_at else None for completed_at in completed_at_results],
+        )
+
+    @classmethod
+    def capture_keyframe(cls, competition: Competition, version: int):
+        records = LeaderboardRecord.objects.filter(competition=competition).values_list(*cls.record_fields)
+        LeaderboardSnapshot.objects.create(
+            competition=competition,
+            version=version,
+            is_keyframe=True,
+            records=[cls.encode_record(*record) for record in records]
+        )
+
+    @classmethod
+    def capture_change(cls, competition: Competition, version: int, records: List[tuple]):
+        """
+        Сохраняет изменение таблицы лидеров. Вызывается в транзакции изменения после увеличения версии,
+        блокировка версии гарантирует, что опорный снимок увидит все предыдущие версии.
+        :param competition:
+        :param version: новая версия таблицы лидеров
+        :param records: изменившиеся записи в порядке полей record_fields
+        :return:
+        """
+        if version % LEADERBOARD_KEYFRAME_INTERVAL == 0:
+            cls.capture_keyframe(competition, version)
+            return
+        LeaderboardSnapshot.objects.create(
+            competition=competition,
+            version=version,
+            records=[cls.encode_record(*record) for record in records]
+        )
+
+    @classmethod
+    def get_records_at(cls, competition: Competition, at: datetime) -> Optional[List[tuple]]:
+        """
+        Восстанавливает записи таблицы лидеров на момент at.
+        :param competition:
+        :param at:
+        :return: записи в порядке полей record_fields или None, если на этот момент таблицы лидеров еще не было
+        """
+        keyframe = LeaderboardSnapshot.objects.filter(
+            competition=competition, is_keyframe=True, created_at__lte=at
+        ).order_by('-version').first()
+        if not keyframe:
+            return None
+
+        records = {record[0]: record for record in keyframe.records}
+        changes = LeaderboardSnapshot.objects.filter(
+            competition=competition, is_keyframe=False, version__gt=keyframe.version, created_at__lte=at
+        ).order_by('version').values_list('records', flat=True)
+        for change in changes:
+            for record in change:
+                records[record[0]] = record
+        return [cls.decode_record(record) for record in records.values()]
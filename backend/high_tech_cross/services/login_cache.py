@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ..config import LOGIN_CACHE_TIMEOUT, LOGIN_WARMUP_BEFORE_START
+from ..models import Rule, Team
+from .competition_schedule import CompetitionSchedule
+
+logger = logging.getLogger(__name__)
+
+
+class LoginEntry(NamedTuple):
+    team_id: str
+    password: str
+
+
+class LoginCache:
+    """
+    Логины и хеши паролей команд в памяти процесса, чтобы в начале соревнования, когда все команды авторизуются
+    почти одновременно, авторизация стоила только проверки пароля и подписи токена.
+
+    Прогрев загружает одним запросом все команды соревнований, которые идут сейчас или начнутся в ближайшие
+    LOGIN_WARMUP_BEFORE_START секунд, и заодно строит CompetitionSchedule.
+    В процессах сервера прогрев раз в LOGIN_CACHE_TIMEOUT секунд выполняет фоновый поток (см. start,
+    backend/wsgi.py, backend/asgi.py), поэтому команды попадают в кэш заранее, а авторизация прогрева не ждет.
+    Если приложение загружено до fork, дочерний процесс запускает свой поток при первой авторизации.
+    Без фонового потока (команды управления, тесты) кэш прогревается при первой авторизации после устаревания.
+    Команды, которых нет в кэше, ищутся в базе данных по одной и тоже попадают в кэш.
+
+    Изменения команд в текущем процессе видны сразу (см. forget), а в остальных процессах - после следующего
+    прогрева: удаленная команда или старый пароль там действуют еще до LOGIN_CACHE_TIMEOUT секунд.
+    """
+    _entries: Dict[str, LoginEntry] = {}
+    # Логин команды по ее идентификатору, чтобы убирать команду из кэша, не перебирая его
+    _logins: Dict[str, str] = {}
+    _expires_at = 0.0
+    _lock = threading.Lock()
+    _warm_lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stop: Optional[threading.Event] = None
+    _pid = None
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # Блокировки могли быть захвачены потоками родителя
+        cls._lock = threading.Lock()
+        cls._warm_lock = threading.Lock()
+
+    @classmethod
+    def warm(cls, now: datetime = None) -> int:
+        """
+        :param now:
+        :return: количество загруженных команд
+        """
+        now = now or timezone.now()
+        teams = Team.objects.filter(
+            competition__initialized=True,
+            competition__start_time__gt=now - Rule.competition_duration,
+            competition__start_time__lte=now + timedelta(seconds=LOGIN_WARMUP_BEFORE_START),
+        ).distinct().values_list('login', 'id', 'password')
+        entries = {login: LoginEntry(str(team_id), password) for login, team_id, password in teams}
+        logins = {entry.team_id: login for login, entry in entries.items()}
+        with cls._lock:
+            cls._entries = entries
+            cls._logins = logins
+            cls._expires_at = time.monotonic() + LOGIN_CACHE_TIMEOUT
+        CompetitionSchedule.warm()
+        return len(entries)
+
+    @classmethod
+    def get_team(cls, login: str) -> Optional[LoginEntry]:
+        """
+        :param login:
+        :return: None, если команда не найдена
+        """
+        if cls._pid is not None and cls._pid != os.getpid():
+            # Прогрев был запущен в родительском процессе до fork - запускаем свой поток
+            cls.start()
+        if cls._pid is None and cls._expires_at < time.monotonic():
+            # Прогревает только один поток, остальные дожидаются его и берут команды из кэша
+            with cls._warm_lock:
+                if cls._expires_at < time.monotonic():
+                    cls.warm()
+        entry = cls._entries.get(login)
+        if entry is None:
+            team = Team.objects.get_by_login(login=login)
+            if not team:
+                return None
+            entry = LoginEntry(str(team.id), team.password)
+            with cls._lock:
+                cls._entries[login] = entry
+                cls._logins[entry.team_id] = login
+        return entry
+
+    @classmethod
+    def forget(cls, team: Team):
+        """
+        Убирает команду из кэша и по идентификатору (логин мог измениться), и по логину (логин мог освободиться).
+        :param team:
+        :return:
+        """
+        with cls._lock:
+            login = cls._logins.pop(str(team.id), None)
+            if login is not None:
+                cls._entries.pop(login, None)
+            entry = cls._entries.pop(team.login, None)
+            if entry is not None:
+                cls._logins.pop(entry.team_id, None)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries = {}
+            cls._logins = {}
+            cls._expires_at = 0.0
+
+    @classmethod
+    def _run(cls, stop: threading.Event):
+        while True:
+            try:
+                with cls._warm_lock:
+                    cls.warm()
+            except DatabaseError:
+                logger.exception('Не удалось прогреть кэш логинов команд')
+            finally:
+                # Соединение потока не должно оставаться открытым между прогревами
+                connection.close()
+            if stop.wait(LOGIN_CACHE_TIMEOUT):
+                break
+
+    @classmethod
+    def start(cls):
+        """
+        Запускает фоновый прогрев кэша в текущем процессе. Повторный вызов ничего не делает.
+        :return:
+        """
+        if cls._pid == os.getpid():
+            return
+        cls._pid = os.getpid()
+        cls._stop = threading.Event()
+        cls._thread = threading.Thread(target=cls._run, args=(cls._stop,), name='login-cache-warmer', daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        """
+        Останавливает фоновый прогрев, после чего кэш снова прогревается при авторизации.
+        :return:
+        """
+        if cls._thread and cls._pid == os.getpid():
+            cls._stop.set()
+            cls._thread.join()
+        cls._thread = cls._stop = cls._pid = None
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def _forget_team(sender, instance: Team, **kwargs):
+    LoginCache.forget(instance)
+
+
+os.register_at_fork(after_in_child=LoginCache._after_fork_in_child)
@@ -0,0 +1,83 @@
+import csv
+import json
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, List, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from ..config import TEAM_IMPORT_BATCH_SIZE, TEAM_IMPORT_HASH_CHUNK_SIZE
+from ..models import Competition, Team
+from ..serializers import TeamImportValidation
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    # Функция уровня модуля, чтобы ее можно было передать в пул процессов
+    return [make_password(password) for password in passwords]
+
+
+class TeamImport:
+    """
+    Stateless служба массового создания команд из CSV или JSON файла (login, name, password).
+    Пароли хешируются в пуле процессов (хеширование - единственная дорогая часть создания команды),
+    команды вставляются пачками через bulk_create. Импорт идемпотентен по логину: команды с уже существующими
+    логинами не изменяются, поэтому повторный импорт того же файла ничего не создает.
+    """
+
+    @staticmethod
+    def read(file: IO[str], file_format: str) -> List[dict]:
+        """
+        :param file:
+        :param file_format: csv (с заголовком login,name,password) или json (список объектов)
+        :return: проверенные команды
+        """
+        rows = list(csv.DictReader(file)) if file_format == 'csv' else json.load(file)
+        validation = TeamImportValidation(data=rows, many=True)
+        validation.is_valid(raise_exception=True)
+        logins = Counter(row['login'] for row in validation.validated_data)
+        duplicates = sorted(login for login, count in logins.items() if count > 1)
+        if duplicates:
+            raise ValidationError(f'Логины повторяются в файле: {", ".join(duplicates)}')
+        return validation.validated_data
+
+    @staticmethod
+    def hash_passwords(passwords: List[str], workers: int) -> List[str]:
+        """
+        :param passwords:
+        :param workers: количество процессов, 1 - хешировать в текущем процессе
+        :return: хеши паролей в том же порядке
+        """
+        if workers <= 1 or len(passwords) <= TEAM_IMPORT_HASH_CHUNK_SIZE:
+            return _hash_passwords(passwords)
+        chunks = [
+            passwords[start:start + TEAM_IMPORT_HASH_CHUNK_SIZE]
+            for start in range(0, len(passwords), TEAM_IMPORT_HASH_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return [password for chunk in executor.map(_hash_passwords, chunks) for password in chunk]
+
+    @staticmethod
+    def import_teams(rows: List[dict], workers: int = 1, competition: Competition = None) -> Tuple[int, int]:
+        """
+        :param rows: команды (см. read)
+        :param workers: см. hash_passwords
+        :param competition: соревнование, в которое добавляются все команды файла, в том числе уже существующие
+        :return: количество созданных команд и количество пропущенных (логин уже существует)
+        """
+        existing = set(Team.objects.filter(login__in=[row['login'] for row in rows]).values_list('login', flat=True))
+        new_rows = [row for row in rows if row['login'] not in existing]
+        passwords = TeamImport.hash_passwords([row['password'] for row in new_rows], workers)
+        teams = [
+            Team(login=row['login'], name=row['name'], password=password)
+            for row, password in zip(new_rows, passwords)
+        ]
+        with transaction.atomic():
+            # ignore_conflicts на случай одновременного создания команды с тем же логином
+            Team.objects.bulk_create(teams, batch_size=TEAM_IMPORT_BATCH_SIZE, ignore_conflicts=True)
+            if competition:
+                team_ids = Team.objects.filter(login__in=[row['login'] for row in rows]).values_list('id', flat=True)
+                competition.teams.add(*team_ids)
+        return len(teams), len(rows) - len(teams)
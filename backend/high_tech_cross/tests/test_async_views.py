@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from http import HTTPStatus
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Team, Competition, TaskDescription
+from ..services import CompetitionInit, LoginCache
+from ..views.abstract_async_api_view import AbstractAsyncAPIView
+from ..views.leaderboard import LeaderboardView
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    AsyncClient обслуживается асинхронным обработчиком запросов, как под ASGI, поэтому запросы к api
+    попадают в асинхронные обработчики (см. async_urls). Ответы должны совпадать с ответами синхронных обработчиков.
+    """
+    team_ids = ['90354b47-a0e4-46ec-b61f-e6efb494e36d', '0e1ac2c4-bd2f-4b2a-9a6c-0e0b3b4c4d61']
+    team_password = '12345'
+
+    @classmethod
+    def setUpTestData(cls):
+        for number, team_id in enumerate(cls.team_ids):
+            Team.objects.create(
+                id=team_id, login=f'team_{number}', name=f'Команда {number}', password=cls.team_password
+            )
+        TaskDescription.objects.create(
+            id='28d9a800-02a7-4a7c-89ad-d11c1befc104',
+            name='Тестовое задание 1',
+            coordinates=['66.666666', '33.333333'],
+            description='Описание тестового задания 1',
+            answer='Ответ 1',
+            hints=['Подсказка 1.0']
+        )
+
+    def setUp(self):
+        self.competition = Competition.objects.create(
+            name='Тестовое соревнование',
+            start_time=timezone.now() - timedelta(hours=1)
+        )
+        self.competition.teams.add(*self.team_ids)
+        self.competition.tasks.add('28d9a800-02a7-4a7c-89ad-d11c1befc104')
+        CompetitionInit.initialize_competition(self.competition)
+        self.tokens = [self.get_token(f'team_{number}') for number in range(len(self.team_ids))]
+
+    def tearDown(self):
+        # Откат транзакции теста сигналов не отправляет
+        LoginCache.clear()
+
+    def get_token(self, login: str) -> str:
+        response = self.client.post(
+            path='/api/authorize',
+            data={'login': login, 'password': self.team_password},
+            content_type='application/json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        return f'Bearer {json.loads(response.content)["auth_token"]}'
+
+    async def test_same_responses(self):
+        paths = ['/api/competition', '/api/exercise_manager/all_exercises', '/api/leaderboard']
+        for path in paths:
+            sync_response = await sync_to_async(self.client.get)(path=path, HTTP_Authorization=self.tokens[0])
+            response = await self.async_client.get(path=path, AUTHORIZATION=self.tokens[0])
+            assert response.status_code == sync_response.status_code == HTTPStatus.OK
+            assert issubclass(response.resolver_match.func.view_class, AbstractAsyncAPIView)
+            assert not issubclass(sync_response.resolver_match.func.view_class, AbstractAsyncAPIView)
+            assert response['Content-Type'] == sync_response['Content-Type']
+            assert response.get('ETag') == sync_response.get('ETag')
+            if path != '/api/competition':
+                # time_left и countdown зависят от момента запроса
+                assert json.loads(response.content) == json.loads(sync_response.content)
+
+        response = await self.async_client.get(path='/api/exercise_manager/all_exercises', AUTHORIZATION=self.tokens[0])
+        exercise_id = json.loads(response.content)[0]['id']
+        response = await self.async_client.get(
+            path=f'/api/exercise_manager/exercise/{exercise_id}', AUTHORIZATION=self.tokens[0]
+        )
+        assert response.status_code == HTTPStatus.OK
+        etag = response['ETag']
+        response = await self.async_client.get(
+            path=f'/api/exercise_manager/exercise/{exercise_id}', AUTHORIZATION=self.tokens[0], IF_NONE_MATCH=etag
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        response = await self.async_client.get(
+            path='/api/exercise_manager/exercise/unknown', AUTHORIZATION=self.tokens[0]
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert json.loads(response.content)['detail'] == 'Задание unknown не найдено'
+
+        response = await self.async_client.get(
+            path='/api/leaderboard', AUTHORIZATION=self.tokens[0],
+            ACCEPT='application/vnd.high-tech-cross.columnar+json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'] == 'application/vnd.high-tech-cross.columnar+json'
+        assert response['ETag'].endswith('-columnar"')
+
+    async def test_errors(self):
+        response = await self.async_client.get(path='/api/competition')
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert json.loads(response.content)['detail'] == 'Token not found'
+        response = await self.async_client.get(path='/api/leaderboard?limit=0', AUTHORIZATION=self.tokens[0])
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'limit' in json.loads(response.content)
+
+        self.competition.start_time = timezone.now() + timedelta(hours=1)
+        await sync_to_async(self.competition.save)()
+        response = await self.async_client.get(path='/api/leaderboard', AUTHORIZATION=self.tokens[0])
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert json.loads(response.content)['detail'] == LeaderboardView.not_started_message
+        response = await self.async_client.get(path='/api/exercise_manager/all_exercises', AUTHORIZATION=self.tokens[0])
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+    async def test_context_per_task(self):
+        # Одновременные запросы разных команд не видят контекст друг друга
+        requests = [
+            self.async_client.get(path='/api/exercise_manager/all_exercises', AUTHORIZATION=self.tokens[number % 2])
+            for number in range(20)
+        ]
+        responses = await asyncio.gather(*requests)
+        ids_by_team = [set(), set()]
+        for number, response in enumerate(responses):
+            assert response.status_code == HTTPStatus.OK
+            ids_by_team[number % 2].update(exercise['id'] for exercise in json.loads(response.content))
+        assert len(ids_by_team[0]) == len(ids_by_team[1]) == 1
+        assert not ids_by_team[0] & ids_by_team[1]
@@ -1,12 +1,20 @@
+import csv
 import json
+import os
 import uuid
 import pytz
 
 from http import HTTPStatus
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
-from ..models import Team, Competition
+from ..config import ENVELOPE_VALID_BEFORE_START
+from ..models import Team, Competition, Rule
+from ..services import Authorization, CompetitionInit, LoginCache
 
 
 class AuthorizationTestCase(TestCase):
@@ -112,3 +120,122 @@ class AuthorizationTestCase(TestCase):
         assert response.status_code == HTTPStatus.NOT_FOUND
         data = json.loads(response.content)
         assert data['message'] == 'Неправильный логин или пароль.'
+
+    def test_login_cache(self):
+        LoginCache.clear()
+        competition = Competition.objects.create(
+            name='Скоро начнется', start_time=timezone.now() + timedelta(minutes=5)
+        )
+        competition.teams.add(self.team_id)
+        CompetitionInit.initialize_competition(competition)
+
+        # Команда и ее соревнование уже в памяти, остается проверить пароль и подписать токен
+        with self.assertNumQueries(0):
+            response = self.authorize({'login': self.team_login, 'password': self.team_password})
+        assert response.status_code == HTTPStatus.OK
+        assert json.loads(response.content)['competition_id'] == str(competition.id)
+
+        # Изменение пароля сразу видно при авторизации
+        team = Team.objects.get(pk=self.team_id)
+        team.password = 'new password'
+        team.save()
+        assert self.authorize({'login': self.team_login, 'password': self.team_password}).status_code == \
+            HTTPStatus.NOT_FOUND
+        assert self.authorize({'login': self.team_login, 'password': 'new password'}).status_code == HTTPStatus.OK
+        # Откат транзакции теста сигналов не отправляет
+        LoginCache.clear()
+        competition.delete()
+
+    def test_login_cache_background_warm(self):
+        LoginCache.clear()
+        # Фоновый прогрев запущен в этом процессе: авторизация не прогревает кэш, а ищет команду по логину
+        with patch.object(LoginCache, '_pid', os.getpid()), patch.object(LoginCache, 'warm') as warm:
+            with self.assertNumQueries(1):
+                team = LoginCache.get_team(self.team_login)
+            assert team.team_id == self.team_id
+            assert self.authorize({'login': self.team_login, 'password': self.team_password}).status_code == \
+                HTTPStatus.OK
+            warm.assert_not_called()
+
+        # Прогрев запущен в родительском процессе до fork: дочерний процесс запускает свой
+        with patch.object(LoginCache, '_pid', -1), patch.object(LoginCache, 'start') as start, \
+                patch.object(LoginCache, 'warm'):
+            LoginCache.get_team(self.team_login)
+            start.assert_called_once()
+        LoginCache.clear()
+
+    def test_login_cache_forget(self):
+        LoginCache.clear()
+        LoginCache.get_team(self.team_login)
+        assert self.team_login in LoginCache._entries
+
+        # Логин изменился: команда убирается из кэша по идентификатору
+        team = Team.objects.get(pk=self.team_id)
+        team.login = 'renamed_team'
+        team.save()
+        assert self.team_login not in LoginCache._entries
+        assert self.team_id not in LoginCache._logins
+        assert LoginCache.get_team(self.team_login) is None
+        assert LoginCache.get_team('renamed_team').team_id == self.team_id
+        LoginCache.clear()
+
+
+    def exchange_envelope(self, envelope_token: str):
+        return self.client.post(
+            path='/api/authorize/envelope',
+            data={'envelope_token': envelope_token},
+            content_type='application/json'
+        )
+
+    def test_envelope_token(self):
+        competition = Competition.objects.get(pk=self.competition_id)
+        competition.start_time = timezone.now() + timedelta(minutes=5)
+        competition.save()
+        output = StringIO()
+        call_command('issue_envelopes', self.competition_id, stdout=output)
+        rows = list(csv.DictReader(StringIO(output.getvalue())))
+        assert [row['login'] for row in rows] == [self.team_login]
+        envelope_token = rows[0]['envelope_token']
+
+        # Токен конверта нельзя использовать вместо обычного токена
+        response = self.client.get(path='/api/competition', HTTP_Authorization=f'Bearer {envelope_token}')
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        self.exchange_envelope(envelope_token)
+        with self.assertNumQueries(0):
+            response = self.exchange_envelope(envelope_token)
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.content)
+        assert data['team_id'] == self.team_id
+        assert data['competition_id'] == self.competition_id
+        response = self.client.get(path='/api/competition', HTTP_Authorization=f'Bearer {data["auth_token"]}')
+        assert response.status_code == HTTPStatus.OK
+
+        # Команду убрали из соревнования - конверт больше не действует
+        Competition.objects.get(pk=self.competition_id).teams.remove(self.team_id)
+        response = self.exchange_envelope(envelope_token)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert json.loads(response.content)['message'] == 'Недействительный токен конверта.'
+        assert self.exchange_envelope('not a token').status_code == HTTPStatus.NOT_FOUND
+
+    def test_envelope_token_lifetime(self):
+        competition = Competition.objects.get(pk=self.competition_id)
+        # Слишком рано: до начала соревнования больше ENVELOPE_VALID_BEFORE_START
+        competition.start_time = timezone.now() + timedelta(seconds=ENVELOPE_VALID_BEFORE_START, hours=1)
+        competition.save()
+        envelope_token = Authorization.issue_envelope_token(self.team_id, competition)
+        assert self.exchange_envelope(envelope_token).status_code == HTTPStatus.NOT_FOUND
+
+        # Соревнование идет
+        competition.start_time = timezone.now() - timedelta(minutes=5)
+        competition.save()
+        envelope_token = Authorization.issue_envelope_token(self.team_id, competition)
+        assert self.exchange_envelope(envelope_token).status_code == HTTPStatus.OK
+
+        # Соревнование закончилось: токен, выпущенный до переноса, еще не истек, но обмен запрещен
+        competition.start_time = timezone.now() - Rule.competition_duration - timedelta(minutes=1)
+        competition.save()
+        assert self.exchange_envelope(envelope_token).status_code == HTTPStatus.NOT_FOUND
+        # Токен по текущему расписанию уже истек
+        envelope_token = Authorization.issue_envelope_token(self.team_id, competition)
+        assert self.exchange_envelope(envelope_token).status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,26 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from ..bloom_filter import BloomFilter
+
+
+class TestBloomFilter(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [str(uuid.uuid4()) for _ in range(1000)]
+        for item in items:
+            bloom_filter.add(item)
+        assert all(item in bloom_filter for item in items)
+        assert bloom_filter.count == 1000
+
+    def test_false_positive_rate(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom_filter.add(str(uuid.uuid4()))
+        false_positives = sum(str(uuid.uuid4()) in bloom_filter for _ in range(10000))
+        assert false_positives / 10000 < 0.02
+        assert abs(bloom_filter.false_positive_rate - 0.01) < 0.005
+        # Около 1.2 байта на элемент вместо 16 байт одного UUID
+        assert bloom_filter.memory_bytes < 1300
@@ -7,7 +7,7 @@ from django.test import TestCase
 from django.utils import timezone
 
 from ..models import Team, Competition
-from ..services import CompetitionInit
+from ..services import CompetitionInit, CompetitionSchedule
 
 
 class TestCompetition(TestCase):
@@ -182,3 +182,57 @@ class TestCompetition(TestCase):
 
         for competition in competitions:
             competition.delete()
+
+    def test_competition_cache(self):
+        competition = Competition.objects.create(
+            name='Соревнование в процессе',
+            start_time=timezone.now() - timedelta(hours=1)
+        )
+        competition.teams.add(self.team_id)
+        CompetitionInit.initialize_competition(competition)
+        token = self.get_token()
+        response = self.client.get(path='/api/competition', HTTP_Authorization=token)
+        assert json.loads(response.content)['status'] == 'В процессе'
+
+        with self.assertNumQueries(0):
+            response = self.client.get(path='/api/competition', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.OK
+
+        competition.name = 'Переименованное соревнование'
+        competition.save()
+        response = self.client.get(path='/api/competition', HTTP_Authorization=token)
+        assert json.loads(response.content)['name'] == 'Переименованное соревнование'
+
+        competition.delete()
+        response = self.client.get(path='/api/competition', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_competition_schedule(self):
+        now = timezone.now()
+        competitions = [
+            Competition.objects.create(name=f'Соревнование {hours}', start_time=now + timedelta(hours=hours))
+            for hours in (-10, 10, 20, 12)
+        ]
+        for competition in competitions:
+            competition.teams.add(self.team_id)
+        assert CompetitionInit.initialize_competition(competitions[0]) == []
+        assert CompetitionInit.initialize_competition(competitions[1]) == [competitions[3]]
+
+        # Ближайшее из будущих соревнований, а не самое позднее
+        assert CompetitionSchedule.get_nearest_competition_id(self.team_id, now) == str(competitions[1].id)
+        with self.assertNumQueries(0):
+            nearest_id = CompetitionSchedule.get_nearest_competition_id(self.team_id, now + timedelta(hours=11))
+        assert nearest_id == str(competitions[1].id)
+        # Закончившееся соревнование остается, только если будущих нет
+        assert CompetitionSchedule.get_nearest_competition_id(self.team_id, now - timedelta(hours=6)) == \
+            str(competitions[0].id)
+        assert CompetitionSchedule.get_nearest_competition_id(self.team_id, now + timedelta(hours=30)) == \
+            str(competitions[1].id)
+
+        # Индекс перестраивается при изменении соревнования
+        competitions[2].start_time = now + timedelta(hours=1)
+        competitions[2].save()
+        assert CompetitionSchedule.get_nearest_competition_id(self.team_id, now) == str(competitions[2].id)
+        for competition in competitions:
+            competition.delete()
+
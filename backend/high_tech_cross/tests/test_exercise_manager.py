@@ -1,16 +1,25 @@
 import json
+import os
 import uuid
 
 from http import HTTPStatus
 from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
-from ..models import Team, Competition, TaskDescription, Rule
-from ..services import CompetitionInit
+from ..models import AttemptLog, Team, Competition, TaskDescription, Exercise, LeaderboardRecord, ResponseCache, Rule
+from ..services import (
+    AttemptLogWriter, CompetitionCache, CompetitionInit, ExerciseAttempt, ExerciseHint, ExerciseSync, IdempotencyStore
+)
+from .. import throttling
+from ..throttling import ExerciseRateThrottle, TeamRateThrottle
+from .token_buckets import TemporaryTokenBucketsMixin
 
 
-class TestExerciseManager(TestCase):
+class TestExerciseManager(TemporaryTokenBucketsMixin, TestCase):
     team_id = '90354b47-a0e4-46ec-b61f-e6efb494e36d'
     team_login = 'test_team'
     team_password = '12345'
@@ -429,3 +438,472 @@ class TestExerciseManager(TestCase):
         data = json.loads(response.content)
         assert data['detail'] == 'Соревнование не найдено'
         competition.delete()
+
+    def test_get_exercises_query_count(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        token = self.get_token()
+        exercises = self.get_all_exercises()
+        assert len(exercises) == 2
+        # Версия для ETag и выборка исполнений заданий вместе с описаниями, соревнование берется из кэша
+        with self.assertNumQueries(2):
+            response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.OK
+        assert json.loads(response.content) == exercises
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                path=f'/api/exercise_manager/exercise/{exercises[0]["id"]}', HTTP_Authorization=token
+            )
+        assert json.loads(response.content) == exercises[0]
+        competition.delete()
+
+    def solve_batch(self, answers: list):
+        token = self.get_token()
+        return self.client.post(
+            path='/api/exercise_manager/solve_batch',
+            HTTP_Authorization=token,
+            data={'answers': answers},
+            content_type='application/json'
+        )
+
+    def test_solve_batch(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        unknown_exercise_id = str(uuid.uuid4())
+        answers = [
+            {'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': 'Неверный ответ'},
+            {'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+            {'request_id': str(uuid.uuid4()), 'exercise_id': unknown_exercise_id, 'answer': 'Ответ 1'},
+            {'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+            {'request_id': str(uuid.uuid4()), 'exercise_id': exercises[1]['id'], 'answer': 'Неверный ответ'},
+        ]
+        response = self.solve_batch(answers)
+        assert response.status_code == HTTPStatus.OK
+        results = json.loads(response.content)['results']
+        assert [result['request_id'] for result in results] == [answer['request_id'] for answer in answers]
+        assert [result.get('success') for result in results] == [False, True, None, None, False]
+        assert results[0]['exercise']['wrong_attempts'] == 1
+        assert results[0]['exercise']['status'] == 'Попытка сдачи'
+        assert results[1]['exercise']['status'] == 'Сдано'
+        assert results[2]['detail'] == f'Задание {unknown_exercise_id} не найдено'
+        assert results[3]['detail'] == f'Задание {exercises[0]["id"]} уже сдано'
+
+        exercises = self.get_all_exercises()
+        assert exercises[0]['status'] == 'Сдано'
+        assert exercises[0]['wrong_attempts'] == 1
+        assert exercises[1]['wrong_attempts'] == 1
+        record = LeaderboardRecord.objects.get(competition=competition, team=self.team_id)
+        assert record.completed_exercises_count == 1
+
+        # Повторная отправка того же пакета (например, после обрыва соединения) ничего не меняет,
+        # в том числе версию исполнений заданий
+        version = ExerciseSync.get_version(competition, self.team_id)
+        results = json.loads(self.solve_batch(answers[:2] + answers[4:]).content)['results']
+        assert [result['success'] for result in results] == [False, True, False]
+        results = json.loads(self.solve_batch(answers[2:4]).content)['results']
+        assert [result['detail'] for result in results] == [
+            f'Задание {unknown_exercise_id} не найдено', f'Задание {exercises[0]["id"]} уже сдано'
+        ]
+        assert ExerciseSync.get_version(competition, self.team_id) == version
+        assert self.get_all_exercises()[1]['wrong_attempts'] == 1
+
+        response = self.solve_batch([])
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        competition.delete()
+
+    def get_changes(self, since: int):
+        token = self.get_token()
+        return self.client.get(path=f'/api/exercise_manager/changes?since={since}', HTTP_Authorization=token)
+
+    def test_exercise_changes(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        response = self.get_changes(since=0)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert response.content == b''
+
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=self.get_token())
+        assert response['X-Exercises-Version'] == '0'
+        assert self.get_changes(since=int(response['X-Exercises-Version'])).status_code == HTTPStatus.NO_CONTENT
+
+        exercises = self.get_all_exercises()
+        self.get_hint(exercises[1]['id'], 0)
+        response = self.get_changes(since=0)
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.content)
+        version = data['version']
+        assert version == ExerciseSync.get_token(1, competition.status)
+        assert [exercise['id'] for exercise in data['exercises']] == [exercises[1]['id']]
+        assert data['exercises'][0]['used_hints_count'] == 1
+
+        assert self.get_changes(since=version).status_code == HTTPStatus.NO_CONTENT
+
+        self.solve(str(uuid.uuid4()), exercises[0]['id'], 'Ответ 1')
+        data = json.loads(self.get_changes(since=version).content)
+        assert data['version'] > version
+        assert [exercise['id'] for exercise in data['exercises']] == [exercises[0]['id']]
+        assert data['exercises'][0]['status'] == 'Сдано'
+        version = data['version']
+
+        # Окончание соревнования меняет все задания, хотя их исполнения не менялись: подсказки становятся недоступны
+        competition.start_time = timezone.now() - Rule.competition_duration - timedelta(minutes=1)
+        competition.save()
+        data = json.loads(self.get_changes(since=version).content)
+        assert data['version'] != version
+        assert len(data['exercises']) == 2
+        assert all(exercise['is_hint_available'] is False for exercise in data['exercises'])
+        assert self.get_changes(since=data['version']).status_code == HTTPStatus.NO_CONTENT
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=self.get_token())
+        assert response['X-Exercises-Version'] == str(data['version'])
+
+        # Версия из будущего - отдаем все задания
+        self.init_full_competition(timezone.now() - timedelta(minutes=30))
+        data = json.loads(self.get_changes(since=version + 100).content)
+        assert data['version'] == 0
+        assert len(data['exercises']) == 2
+        competition.delete()
+
+    def test_solve_attempt_in_database(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercise = Exercise.objects.get(competition=competition, task_description=self.task_description_ids[0])
+        request_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        for request_id in request_ids:
+            success, snapshot = ExerciseAttempt.solve(
+                competition=competition, team_id=self.team_id, exercise_id=str(exercise.id), request_id=request_id,
+                answer='Неверный ответ', version=1, now=timezone.now()
+            )
+            assert not success
+            IdempotencyStore.save(competition, self.team_id, request_id, {'success': success})
+        # Оба телефона прочитали исполнение задания до попыток, но ни одна попытка не потерялась
+        assert snapshot.wrong_attempts == 2
+        assert snapshot.task_description.name == 'Тестовое задание 1'
+        exercise.refresh_from_db()
+        assert exercise.wrong_attempts == 2
+        assert ResponseCache.objects.filter(competition=competition, request_id__in=request_ids).count() == 2
+
+        attempt = ExerciseAttempt.solve(
+            competition=competition, team_id=self.team_id, exercise_id=str(exercise.id), request_id=request_ids[0],
+            answer='Ответ 1', version=2, now=timezone.now()
+        )
+        assert attempt is None
+        success, snapshot = ExerciseAttempt.solve(
+            competition=competition, team_id=self.team_id, exercise_id=str(exercise.id), request_id=str(uuid.uuid4()),
+            answer='Ответ 1', version=2, now=timezone.now()
+        )
+        assert success
+        assert snapshot.completed_at is not None
+        assert snapshot.wrong_attempts == 2
+        competition.delete()
+
+    def test_pick_hint_in_database(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercise = Exercise.objects.get(competition=competition, task_description=self.task_description_ids[0])
+        for number in [2, 0]:
+            snapshot = ExerciseHint.pick(
+                competition=competition, team_id=self.team_id, exercise_id=str(exercise.id), number=number,
+                version=1, now=timezone.now()
+            )
+            assert snapshot.task_description.hints[number] == f'Подсказка 1.{number}'
+        # Обе подсказки сохранились, хотя исполнение задания ни разу не читалось заново
+        assert snapshot.used_hints == [2, 0]
+        exercise.refresh_from_db()
+        assert exercise.used_hints == [2, 0]
+
+        for number in [0, 3]:
+            assert ExerciseHint.pick(
+                competition=competition, team_id=self.team_id, exercise_id=str(exercise.id), number=number,
+                version=2, now=timezone.now()
+            ) is None
+
+        response = self.get_hint(exercise_id=str(exercise.id), hint_number=-1)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        competition.delete()
+
+    def test_response_cache(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        request_id = str(uuid.uuid4())
+        data = self.solve(request_id=request_id, exercise_id=exercises[0]['id'], answer='Неправильно')
+        record = ResponseCache.objects.get(competition=competition, team=self.team_id, request_id=request_id)
+        assert record.response == data
+        assert record.expires_at == competition.end_time
+
+        # Повтор запроса отдает сохраненный ответ, даже если задание с тех пор изменилось
+        self.solve(request_id=str(uuid.uuid4()), exercise_id=exercises[0]['id'], answer='Ответ 1')
+        assert self.solve(request_id=request_id, exercise_id=exercises[0]['id'], answer='Неправильно') == data
+
+        # Тот же request_id другой команды или в другом соревновании - это другой запрос
+        other_competition = self.init_full_competition(timezone.now() - timedelta(minutes=30))
+        exercises = self.get_all_exercises()
+        data = self.solve(request_id=request_id, exercise_id=exercises[0]['id'], answer='Ответ 1')
+        assert data['success'] is True
+
+        ResponseCache.objects.filter(competition=competition).update(expires_at=timezone.now())
+        IdempotencyStore.clear()
+        out = StringIO()
+        call_command('purge_response_cache', batch_size=1, stdout=out)
+        assert 'Удалено записей: 2' in out.getvalue()
+        assert not ResponseCache.objects.filter(competition=competition).exists()
+        assert ResponseCache.objects.filter(competition=other_competition).count() == 1
+        competition.delete()
+        other_competition.delete()
+
+    def test_response_filter(self):
+        IdempotencyStore.clear()
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        IdempotencyStore.get_many(competition, self.team_id, [str(uuid.uuid4())])
+        # Новые request_id отсекаются фильтром без запроса к базе данных
+        with self.assertNumQueries(0):
+            assert IdempotencyStore.get_many(competition, self.team_id, [str(uuid.uuid4()) for _ in range(10)]) == {}
+        stats = IdempotencyStore.get_filter_stats()
+        assert stats['checks'] == 11
+        assert stats['skipped'] + stats['false_positives'] == 11
+
+        # Ответ, сохраненный другим процессом, фильтр этого процесса не видит, но повторная проверка его найдет
+        request_id = str(uuid.uuid4())
+        content = {'success': False, 'exercise': exercises[1]}
+        ResponseCache.objects.create(
+            competition=competition, team_id=self.team_id, request_id=request_id, response=content,
+            expires_at=competition.end_time
+        )
+        answers = [{'request_id': request_id, 'exercise_id': exercises[1]['id'], 'answer': 'Ответ 2'}]
+        results = json.loads(self.solve_batch(answers).content)['results']
+        assert results == [{'request_id': request_id, **content}]
+        assert self.get_all_exercises()[1]['status'] != 'Сдано'
+        assert self.solve(request_id=request_id, exercise_id=exercises[1]['id'], answer='Ответ 2') == content
+
+        # То же для уже сданного задания: отказ "уже сдано" не должен подменить сохраненный ответ
+        self.solve(request_id=str(uuid.uuid4()), exercise_id=exercises[0]['id'], answer='Ответ 1')
+        request_id = str(uuid.uuid4())
+        content = {'success': True, 'exercise': self.get_all_exercises()[0]}
+        ResponseCache.objects.create(
+            competition=competition, team_id=self.team_id, request_id=request_id, response=content,
+            expires_at=competition.end_time
+        )
+        answers = [
+            {'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+            {'request_id': request_id, 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+        ]
+        results = json.loads(self.solve_batch(answers).content)['results']
+        assert results[0]['detail'] == f'Задание {exercises[0]["id"]} уже сдано'
+        assert results[1] == {'request_id': request_id, **content}
+        competition.delete()
+
+    def test_response_filter_overflow(self):
+        IdempotencyStore.clear()
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        ResponseCache.objects.bulk_create([
+            ResponseCache(
+                competition=competition, team_id=self.team_id, request_id=uuid.uuid4(), response={},
+                expires_at=competition.end_time
+            ) for _ in range(5)
+        ])
+        # Действующих ответов больше емкости из настроек: фильтр строится с запасом и не переполнен сразу
+        with patch('high_tech_cross.services.idempotency.RESPONSE_FILTER_CAPACITY', 2):
+            IdempotencyStore.get_many(competition, self.team_id, [str(uuid.uuid4())])
+            stats = IdempotencyStore.get_filter_stats()
+            assert stats['count'] == 5
+            assert stats['capacity'] >= 10
+            # Фильтр не перестраивается при каждой проверке
+            bloom_filter = IdempotencyStore._filter
+            assert IdempotencyStore.get_many(competition, self.team_id, [str(uuid.uuid4()) for _ in range(3)]) == {}
+            assert IdempotencyStore._filter is bloom_filter
+        IdempotencyStore.clear()
+        competition.delete()
+
+    def test_throttling(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        token = self.get_token()
+
+        def solve(exercise_id):
+            return self.client.post(
+                path='/api/exercise_manager/solve',
+                HTTP_Authorization=token,
+                data={'request_id': str(uuid.uuid4()), 'exercise_id': exercise_id, 'answer': 'Неправильно'},
+                content_type='application/json'
+            )
+
+        capacity, _ = ExerciseRateThrottle.parse_rate(ExerciseRateThrottle.rate)
+        for _ in range(capacity):
+            assert solve(exercises[0]['id']).status_code == HTTPStatus.OK
+        # Отказ происходит до обращения к базе данных
+        with self.assertNumQueries(0):
+            response = solve(exercises[0]['id'])
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert int(response['Retry-After']) > 0
+        assert json.loads(response.content)['detail'].startswith('Слишком много запросов.')
+        assert json.loads(self.get_one_exercise(exercises[0]['id']).content)['wrong_attempts'] == capacity
+
+        # Ограничение на задание не мешает решать другие задания
+        assert solve(exercises[1]['id']).status_code == HTTPStatus.OK
+
+        # Отклоненные ограничением на задание попытки не тратят маркеры команды
+        team_capacity, _ = TeamRateThrottle.parse_rate(TeamRateThrottle.rate)
+        for _ in range(5):
+            assert solve(exercises[0]['id']).status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert throttling.token_buckets.consume(
+            f'{TeamRateThrottle.scope}:{self.team_id}', team_capacity, 1 / 3600, team_capacity - capacity - 1
+        ) == 0
+        competition.delete()
+
+    def test_token_buckets(self):
+        buckets = throttling.token_buckets
+        slow_rate = 1 / 3600
+        assert buckets.consume_all([('a', 1, slow_rate, 1), ('b', 5, slow_rate, 1)]) == 0
+        # В корзине a маркеров нет: из корзины b маркеры не забираются
+        assert buckets.consume_all([('a', 1, slow_rate, 1), ('b', 5, slow_rate, 1)]) > 0
+        assert buckets.consume('b', 5, slow_rate, 4) == 0
+        assert buckets.consume('b', 5, slow_rate, 1) > 0
+
+    def test_attempt_log(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        AttemptLogWriter.flush()
+        request_ids = [str(uuid.uuid4()) for _ in range(3)]
+        self.get_hint(exercise_id=exercises[0]['id'], hint_number=1)
+        self.solve(request_id=request_ids[0], exercise_id=exercises[0]['id'], answer='Неправильно')
+        self.solve(request_id=request_ids[0], exercise_id=exercises[0]['id'], answer='Неправильно')
+        self.solve_batch([
+            {'request_id': request_ids[1], 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+            {'request_id': request_ids[2], 'exercise_id': exercises[1]['id'], 'answer': 'Ответ 1'},
+        ])
+        # Обработчики запросов только кладут события в очередь
+        assert not AttemptLog.objects.filter(competition=competition).exists()
+
+        assert AttemptLogWriter.flush() == 4
+        log = list(AttemptLog.objects.filter(competition=competition).order_by('created_at'))
+        assert [(event.kind, event.hint_number) for event in log[:1]] == [('hint', 1)]
+        assert [(str(event.request_id), event.answer, event.success) for event in log[1:]] == [
+            (request_ids[0], 'Неправильно', False),
+            (request_ids[1], 'Ответ 1', True),
+            (request_ids[2], 'Ответ 1', False),
+        ]
+        assert all(str(event.team_id) == self.team_id for event in log)
+        competition.delete()
+
+    def test_attempt_log_writer_after_fork(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        AttemptLogWriter.flush()
+        # Как после fork процесса, в котором запись уже была запущена: события родителя не наследуются,
+        # а поток запускается при первом событии
+        AttemptLogWriter._after_fork_in_child()
+        AttemptLogWriter._pid = -1
+        try:
+            with patch('high_tech_cross.services.attempt_log_writer.ATTEMPT_LOG_FLUSH_INTERVAL', 60):
+                self.get_hint(exercise_id=exercises[0]['id'], hint_number=0)
+                assert AttemptLogWriter._pid == os.getpid()
+                assert AttemptLogWriter._thread.is_alive()
+                AttemptLogWriter.drain()
+            assert not AttemptLogWriter._thread.is_alive()
+            assert AttemptLog.objects.filter(competition=competition, kind='hint').count() == 1
+        finally:
+            AttemptLogWriter._pid = None
+        competition.delete()
+
+    def test_exercises_etag(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        token = self.get_token()
+        exercises = self.get_all_exercises()
+        paths = ['/api/exercise_manager/all_exercises', f'/api/exercise_manager/exercise/{exercises[0]["id"]}']
+        etags = []
+        for path in paths:
+            response = self.client.get(path=path, HTTP_Authorization=token)
+            etags.append(response['ETag'])
+            # Без изменений - 304 после одного запроса версии
+            with self.assertNumQueries(1):
+                response = self.client.get(path=path, HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etags[-1])
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+            assert response['ETag'] == etags[-1]
+
+        # Действие команды меняет ETag
+        self.get_hint(exercise_id=exercises[1]['id'], hint_number=0)
+        for path, etag in zip(paths, etags):
+            response = self.client.get(path=path, HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.OK
+            assert response['ETag'] != etag
+
+        # Окончание соревнования тоже меняет ETag: подсказки становятся недоступны
+        etag = self.client.get(path=paths[0], HTTP_Authorization=token)['ETag']
+        competition.start_time = timezone.now() - Rule.competition_duration - timedelta(minutes=1)
+        competition.save()
+        response = self.client.get(path=paths[0], HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK
+        assert all(exercise['is_hint_available'] is False for exercise in json.loads(response.content))
+        competition.delete()
+
+    def test_competition_window_in_token(self):
+        competition = self.init_full_competition(timezone.now() - Rule.competition_duration - timedelta(hours=1))
+        token = self.get_token()
+        data = {'request_id': str(uuid.uuid4()), 'exercise_id': str(uuid.uuid4()), 'answer': 'Ответ 1'}
+        # Первый запрос кэширует соревнование, после этого отказ по расписанию из токена не обращается к базе
+        self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                path='/api/exercise_manager/solve', HTTP_Authorization=token, data=data,
+                content_type='application/json'
+            )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert json.loads(response.content)['detail'] == 'Соревнование уже закончилось'
+
+        # После изменения расписания старый токен проверяется полностью
+        competition.start_time = timezone.now() + timedelta(hours=1)
+        competition.save()
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert json.loads(response.content)['detail'] == 'Соревнование еще не начато, во избежание спойлеров вы не ' \
+                                                         'можете ни смотреть, ни работать с заданиями'
+        competition.start_time = timezone.now() - timedelta(minutes=1)
+        competition.save()
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.OK
+
+        # Расписание изменили в другом процессе (без сброса кэша этого процесса): после устаревания записи кэша
+        # токен проверяется полностью
+        token = self.get_token()
+        Competition.objects.filter(pk=competition.id).update(start_time=timezone.now() + timedelta(hours=1))
+        assert self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token).status_code == \
+            HTTPStatus.OK
+        CompetitionCache._entries[str(competition.id)]['expires_at'] = 0
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        Competition.objects.filter(pk=competition.id).update(start_time=timezone.now() - timedelta(minutes=1))
+        CompetitionCache._entries[str(competition.id)]['expires_at'] = 0
+        response = self.client.get(path='/api/exercise_manager/all_exercises', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.OK
+        competition.delete()
+
+    def test_solve_queries(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        token = self.get_token()
+        # Версия исполнений заданий, попытка, пересчет записи таблицы лидеров вместе с версией таблицы лидеров
+        # и уведомлением, изменение в историю таблицы лидеров, сохранение ответа. В тесте транзакция попытки -
+        # это еще SAVEPOINT и RELEASE SAVEPOINT
+        for answer in ['Неправильно', 'Ответ 1']:
+            with self.assertNumQueries(7):
+                response = self.client.post(
+                    path='/api/exercise_manager/solve',
+                    HTTP_Authorization=token,
+                    data={'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': answer},
+                    content_type='application/json'
+                )
+            assert response.status_code == HTTPStatus.OK
+        competition.delete()
+
+    def test_solve_rejected_reason(self):
+        competition = self.init_full_competition(timezone.now() - timedelta(hours=1))
+        exercises = self.get_all_exercises()
+        token = self.get_token()
+
+        # Соревнование закончилось, а кэш процесса об этом еще не знает: причину отказа берем из базы данных
+        Competition.objects.filter(pk=competition.id).update(start_time=timezone.now() - Rule.competition_duration)
+        response = self.client.post(
+            path='/api/exercise_manager/solve',
+            HTTP_Authorization=token,
+            data={'request_id': str(uuid.uuid4()), 'exercise_id': exercises[0]['id'], 'answer': 'Ответ 1'},
+            content_type='application/json'
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert json.loads(response.content)['detail'] == 'Соревнование уже закончилось'
+        competition.delete()
@@ -1,13 +1,16 @@
 import json
+import time
 import uuid
 import jwt
 
 from http import HTTPStatus
 from datetime import timedelta
+from unittest import mock
 from django.test import TestCase
 from django.utils import timezone
 
 from ..config import JWT_SECRET_KEY
+from ..middleware import VerifiedTokenCache
 
 
 class TestJWT(TestCase):
@@ -80,3 +83,40 @@ class TestJWT(TestCase):
         assert response.status_code == HTTPStatus.FORBIDDEN
         data = json.loads(response.content)
         assert data['detail'] == 'Token expired'
+
+    @staticmethod
+    def make_token(exp: timedelta) -> str:
+        current_time = timezone.now()
+        payload = {
+            'exp': current_time + exp,
+            'iat': current_time,
+            'team_id': str(uuid.uuid4()),
+            'competition_id': str(uuid.uuid4())
+        }
+        return f'Bearer {jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256").decode()}'
+
+    def test_verified_token_cache(self):
+        VerifiedTokenCache.clear()
+        token = self.make_token(timedelta(hours=5))
+        with mock.patch('high_tech_cross.middleware.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                assert self.get(token).status_code == HTTPStatus.NOT_FOUND
+        # Подпись проверяется только у первого запроса
+        assert decode.call_count == 1
+        stats = VerifiedTokenCache.get_stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (2, 1, 1)
+
+        # Истекший токен из кэша не отдается, а проверяется заново
+        with mock.patch('high_tech_cross.middleware.time.time', return_value=time.time() + 6 * 3600), \
+                mock.patch('high_tech_cross.middleware.jwt.decode', wraps=jwt.decode) as decode:
+            self.get(token)
+        assert decode.call_count == 1
+        assert VerifiedTokenCache.get_stats()['expirations'] == 1
+
+        with mock.patch('high_tech_cross.middleware.JWT_CACHE_SIZE', 2):
+            for _ in range(3):
+                self.get(self.make_token(timedelta(hours=5)))
+        stats = VerifiedTokenCache.get_stats()
+        assert (stats['evictions'], stats['size']) == (2, 2)
+        VerifiedTokenCache.clear()
+
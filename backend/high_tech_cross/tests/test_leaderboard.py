@@ -3,14 +3,19 @@ import uuid
 
 from http import HTTPStatus
 from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 from django.test import TestCase
 from django.utils import timezone
+from django.utils.dateparse import parse_duration
 
-from ..models import Team, Competition, TaskDescription
-from ..services import CompetitionInit
+from ..models import Team, Competition, TaskDescription, LeaderboardRecord, LeaderboardSnapshot, Exercise, Rule
+from ..renderers import ColumnarJSONRenderer
+from ..services import CompetitionInit, Leaderboard
+from .token_buckets import TemporaryTokenBucketsMixin
 
 
-class TestLeaderboard(TestCase):
+class TestLeaderboard(TemporaryTokenBucketsMixin, TestCase):
     teams = [
         {
             'id': str(uuid.uuid4()),
@@ -293,18 +298,23 @@ class TestLeaderboard(TestCase):
     def test_leaderboard_highlights(self):
         competition = self.setup_competition()
 
+        # Команды с одинаковыми результатами делят место
         assertion_highlights = [
             {'location': {'type': 'cell', 'position': 1, 'column': 'team_name'}, 'highlight': 'zero_points'},
-            {'location': {'type': 'cell', 'position': 2, 'column': 'team_name'}, 'highlight': 'zero_points'},
-            {'location': {'type': 'cell', 'position': 3, 'column': 'team_name'}, 'highlight': 'zero_points'},
+            {'location': {'type': 'cell', 'position': 1, 'column': 'team_name'}, 'highlight': 'zero_points'},
+            {'location': {'type': 'cell', 'position': 1, 'column': 'team_name'}, 'highlight': 'zero_points'},
         ]
         leaderboard = self.get_leaderboard()
         highlights = leaderboard['highlights']
+        assert len(highlights) == 3
         for number, highlight in enumerate(highlights):
             for key, value in highlight.items():
                 assert value == assertion_highlights[number][key]
 
-        assertion_highlights.pop(0)
+        assertion_highlights = [
+            {'location': {'type': 'cell', 'position': 2, 'column': 'team_name'}, 'highlight': 'zero_points'},
+            {'location': {'type': 'cell', 'position': 2, 'column': 'team_name'}, 'highlight': 'zero_points'},
+        ]
         self.solve(self.teams[0], self.tasks_descriptions[0], success=True)
         leaderboard = self.get_leaderboard()
         highlights = leaderboard['highlights']
@@ -326,29 +336,23 @@ class TestLeaderboard(TestCase):
         assert record['position'] == 1
         assert record['total_penalty_time'] == '0:00:00'
 
+        # Подсказки и неверные попытки по несданному заданию штрафного времени не добавляют
         self.pick_hint(self.teams[0], self.tasks_descriptions[0], 0)
-        leaderboard = self.get_leaderboard()
-        record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[0]['id'])
-        assert record['position'] == 3
-        assert record['total_penalty_time'] == '0:15:00'
-
         self.pick_hint(self.teams[0], self.tasks_descriptions[0], 1)
-        leaderboard = self.get_leaderboard()
-        record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[0]['id'])
-        assert record['position'] == 3
-        assert record['total_penalty_time'] == '0:30:00'
-
+        self.solve(self.teams[0], self.tasks_descriptions[0], success=False)
         self.solve(self.teams[0], self.tasks_descriptions[0], success=False)
         leaderboard = self.get_leaderboard()
         record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[0]['id'])
-        assert record['position'] == 3
-        assert record['total_penalty_time'] == '1:00:00'
+        assert record['position'] == 1
+        assert record['total_penalty_time'] == '0:00:00'
 
-        self.solve(self.teams[0], self.tasks_descriptions[0], success=False)
+        # После сдачи задания: час от начала соревнования, две подсказки и две неверные попытки
+        self.solve(self.teams[0], self.tasks_descriptions[0], success=True)
+        self.solve_exercise_directly(competition, self.teams[0], self.tasks_descriptions[0], timedelta(hours=1))
         leaderboard = self.get_leaderboard()
         record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[0]['id'])
-        assert record['position'] == 3
-        assert record['total_penalty_time'] == '1:30:00'
+        assert record['position'] == 1
+        assert record['total_penalty_time'] == '2:30:00'
 
         competition.delete()
 
@@ -359,30 +363,50 @@ class TestLeaderboard(TestCase):
             assert leaderboard['records'][i]['team_id'] == self.teams[i]['id']
             assert leaderboard['records'][i]['team_name'] == self.teams[i]['name']
 
-        self.solve(self.teams[2], self.tasks_descriptions[0], True)
-        leaderboard = self.get_leaderboard()
-        assert leaderboard['records'][0]['team_name'] == '3 Третья команда'
-        assert leaderboard['records'][1]['team_name'] == '1 Тестовая команда'
-        assert leaderboard['records'][2]['team_name'] == '2 Вторая команда'
+        def results() -> list:
+            return [
+                (record['team_name'], record['position'], record['total_penalty_time'])
+                for record in self.get_leaderboard()['records']
+            ]
+
+        self.solve_exercise_directly(competition, self.teams[2], self.tasks_descriptions[0], timedelta(minutes=10))
+        assert results() == [
+            ('3 Третья команда', 1, '0:10:00'),
+            ('1 Тестовая команда', 2, '0:00:00'),
+            ('2 Вторая команда', 2, '0:00:00'),
+        ]
 
-        self.solve(self.teams[1], self.tasks_descriptions[0], True)
-        leaderboard = self.get_leaderboard()
-        assert leaderboard['records'][0]['team_name'] == '2 Вторая команда'
-        assert leaderboard['records'][1]['team_name'] == '3 Третья команда'
-        assert leaderboard['records'][2]['team_name'] == '1 Тестовая команда'
+        # При равном штрафном времени команды делят место и упорядочены по названию
+        self.solve_exercise_directly(competition, self.teams[1], self.tasks_descriptions[0], timedelta(minutes=10))
+        assert results() == [
+            ('2 Вторая команда', 1, '0:10:00'),
+            ('3 Третья команда', 1, '0:10:00'),
+            ('1 Тестовая команда', 3, '0:00:00'),
+        ]
 
+        # Неверная попытка по несданному заданию штрафного времени не добавляет
         self.solve(self.teams[1], self.tasks_descriptions[1], False)
-        leaderboard = self.get_leaderboard()
-        assert leaderboard['records'][0]['team_name'] == '3 Третья команда'
-        assert leaderboard['records'][1]['team_name'] == '2 Вторая команда'
-        assert leaderboard['records'][2]['team_name'] == '1 Тестовая команда'
+        assert results() == [
+            ('2 Вторая команда', 1, '0:10:00'),
+            ('3 Третья команда', 1, '0:10:00'),
+            ('1 Тестовая команда', 3, '0:00:00'),
+        ]
 
-        self.solve(self.teams[0], self.tasks_descriptions[0], True)
-        self.solve(self.teams[0], self.tasks_descriptions[1], True)
-        leaderboard = self.get_leaderboard()
-        assert leaderboard['records'][0]['team_name'] == '1 Тестовая команда'
-        assert leaderboard['records'][1]['team_name'] == '3 Третья команда'
-        assert leaderboard['records'][2]['team_name'] == '2 Вторая команда'
+        # Сданное задание: 20 минут от начала соревнования и 30 минут за неверную попытку
+        self.solve_exercise_directly(competition, self.teams[1], self.tasks_descriptions[1], timedelta(minutes=20))
+        assert results() == [
+            ('2 Вторая команда', 1, '1:00:00'),
+            ('3 Третья команда', 2, '0:10:00'),
+            ('1 Тестовая команда', 3, '0:00:00'),
+        ]
+
+        self.solve_exercise_directly(competition, self.teams[0], self.tasks_descriptions[0], timedelta(minutes=5))
+        self.solve_exercise_directly(competition, self.teams[0], self.tasks_descriptions[1], timedelta(minutes=15))
+        assert results() == [
+            ('1 Тестовая команда', 1, '0:20:00'),
+            ('2 Вторая команда', 2, '1:00:00'),
+            ('3 Третья команда', 3, '0:10:00'),
+        ]
 
         competition.delete()
 
@@ -390,7 +414,7 @@ class TestLeaderboard(TestCase):
         competition = self.setup_competition()
 
         assertion_leaderboard_record = {
-            'position': 2,
+            'position': 1,
             'team_id': self.teams[1]['id'],
             'team_name': '2 Вторая команда',
             'exercise_1': None,
@@ -403,10 +427,11 @@ class TestLeaderboard(TestCase):
         for key, value in record.items():
             assert value == assertion_leaderboard_record[key]
 
-        assertion_leaderboard_record['position'] = 1
         assertion_leaderboard_record.pop('exercise_1')
+        assertion_leaderboard_record['total_penalty_time'] = '1:00:00'
         assertion_leaderboard_record['completed_exercise_count'] = 1
         self.solve(self.teams[1], self.tasks_descriptions[0], True)
+        self.solve_exercise_directly(competition, self.teams[1], self.tasks_descriptions[0], timedelta(hours=1))
         leaderboard = self.get_leaderboard()
         record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[1]['id'])
         for key, value in assertion_leaderboard_record.items():
@@ -414,8 +439,12 @@ class TestLeaderboard(TestCase):
         assert record['exercise_1'] is not None
 
         assertion_leaderboard_record.pop('exercise_2')
+        assertion_leaderboard_record['total_penalty_time'] = '2:30:00'
         assertion_leaderboard_record['completed_exercise_count'] = 2
         self.solve(self.teams[1], self.tasks_descriptions[1], True)
+        self.solve_exercise_directly(
+            competition, self.teams[1], self.tasks_descriptions[1], timedelta(hours=1, minutes=30)
+        )
         leaderboard = self.get_leaderboard()
         record = next(record for record in leaderboard['records'] if record['team_id'] == self.teams[1]['id'])
         for key, value in assertion_leaderboard_record.items():
@@ -424,3 +453,250 @@ class TestLeaderboard(TestCase):
         assert record['exercise_2'] is not None
 
         competition.delete()
+
+    def test_leaderboard_record_projection(self):
+        competition = self.setup_competition()
+        records = LeaderboardRecord.objects.filter(competition=competition)
+        assert records.count() == 3
+        for record in records:
+            assert record.completed_exercises_count == 0
+            assert record.completed_at_results == [None, None]
+
+        self.pick_hint(self.teams[1], self.tasks_descriptions[0], 0)
+        self.solve(self.teams[1], self.tasks_descriptions[1], True)
+        record = records.get(team=self.teams[1]['id'])
+        assert record.completed_exercises_count == 1
+        assert record.penalty_time > timedelta(minutes=15)
+        assert record.completed_at_results[0] is None
+        assert record.completed_at_results[1] is not None
+
+        leaderboard = self.get_leaderboard()
+        assert leaderboard['records'][0]['team_id'] == self.teams[1]['id']
+        competition.delete()
+
+    def test_leaderboard_etag(self):
+        competition = self.setup_competition()
+        token = self.get_token(login=self.teams[0]['login'], password=self.teams[0]['password'])
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token)
+        assert response.status_code == HTTPStatus.OK
+        etag = response['ETag']
+        assert etag
+
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert response['ETag'] == etag
+
+        self.solve(self.teams[1], self.tasks_descriptions[0], True)
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK
+        assert response['ETag'] != etag
+        data = json.loads(response.content)
+        assert data['records'][0]['team_id'] == self.teams[1]['id']
+        competition.delete()
+
+    def test_leaderboard_team_rename(self):
+        competition = self.setup_competition()
+        token = self.get_token(login=self.teams[0]['login'], password=self.teams[0]['password'])
+        etag = self.client.get(path='/api/leaderboard', HTTP_Authorization=token)['ETag']
+
+        # Сохранение команды без изменения названия таблицу лидеров не меняет
+        team = Team.objects.get(pk=self.teams[2]['id'])
+        team.save()
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        team.name = '0 Переименованная команда'
+        team.save()
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK
+        assert response['ETag'] != etag
+        records = json.loads(response.content)['records']
+        assert [record['team_name'] for record in records] == [
+            '0 Переименованная команда', '1 Тестовая команда', '2 Вторая команда'
+        ]
+        snapshot = LeaderboardSnapshot.objects.filter(competition=competition).order_by('-version').first()
+        assert [record[1] for record in snapshot.records] == ['0 Переименованная команда']
+        competition.delete()
+
+    def test_leaderboard_elapsed_penalty(self):
+        competition = self.setup_competition()
+        self.pick_hint(self.teams[0], self.tasks_descriptions[0], 0)
+        self.solve(self.teams[0], self.tasks_descriptions[0], success=False)
+        self.solve(self.teams[0], self.tasks_descriptions[0], success=True)
+        self.pick_hint(self.teams[0], self.tasks_descriptions[1], 0)
+
+        exercise = Exercise.objects.get(
+            competition=competition, team=self.teams[0]['id'], task_description=self.tasks_descriptions[0]['id']
+        )
+        elapsed = exercise.completed_at - competition.start_time
+        elapsed -= timedelta(microseconds=elapsed.microseconds)
+        # Подсказка по несданному второму заданию не учитывается
+        penalty_time = elapsed + Rule.wrong_attempt_penalty + Rule.hint_penalty
+
+        leaderboard = self.get_leaderboard()
+        record = leaderboard['records'][0]
+        assert record['team_id'] == self.teams[0]['id']
+        assert record['position'] == 1
+        assert record['total_penalty_time'] == str(penalty_time)
+        assert [other['position'] for other in leaderboard['records'][1:]] == [2, 2]
+        competition.delete()
+
+    def test_leaderboard_competition_scope(self):
+        competition = self.setup_competition(start_time=timezone.now() - timedelta(hours=10))
+        self.solve_exercise_directly(competition, self.teams[0], self.tasks_descriptions[0])
+        current_competition = self.setup_competition()
+
+        leaderboard = self.get_leaderboard()
+        assert leaderboard['meta']['row_count'] == 3
+        for record in leaderboard['records']:
+            assert record['position'] == 1
+            assert record['completed_exercise_count'] == 0
+            assert record['total_penalty_time'] == '0:00:00'
+        competition.delete()
+        current_competition.delete()
+
+    @staticmethod
+    def solve_exercise_directly(competition: Competition, team: dict, task: dict,
+                                elapsed: timedelta = timedelta(hours=1)):
+        """
+        Сдача задания в заданный момент соревнования: время сдачи через api зависит от момента запуска теста
+        """
+        exercise = Exercise.objects.get(competition=competition, team=team['id'], task_description=task['id'])
+        exercise.completed_at = competition.start_time + elapsed
+        exercise.save()
+        Leaderboard.refresh_team_record(competition=competition, team_id=team['id'])
+
+    def get_leaderboard_window(self, team: dict, query: str):
+        token = self.get_token(login=team['login'], password=team['password'])
+        return self.client.get(path=f'/api/leaderboard?{query}', HTTP_Authorization=token)
+
+    def test_leaderboard_window(self):
+        competition = self.setup_competition()
+        team_ids = [team['id'] for team in self.teams]
+
+        response = self.get_leaderboard_window(self.teams[0], 'limit=2')
+        assert response.status_code == HTTPStatus.OK
+        data = json.loads(response.content)
+        assert data['meta']['row_count'] == 3
+        assert data['meta']['offset'] == 0
+        assert data['meta']['col_count'] == 7
+        assert len(data['meta']['column_headers']) == 7
+        assert [record['team_id'] for record in data['records']] == team_ids[:2]
+        assert len(data['highlights']) == 2
+
+        data = json.loads(self.get_leaderboard_window(self.teams[0], 'offset=1&limit=1').content)
+        assert data['meta']['offset'] == 1
+        assert [record['team_id'] for record in data['records']] == team_ids[1:2]
+
+        data = json.loads(self.get_leaderboard_window(self.teams[0], f'after={team_ids[0]}').content)
+        assert data['meta']['offset'] == 1
+        assert [record['team_id'] for record in data['records']] == team_ids[1:]
+
+        data = json.loads(self.get_leaderboard_window(self.teams[2], 'around=1').content)
+        assert data['meta']['row_count'] == 3
+        assert data['meta']['offset'] == 1
+        assert [record['team_id'] for record in data['records']] == team_ids[1:]
+
+        data = json.loads(self.get_leaderboard_window(self.teams[1], 'around=0&limit=5').content)
+        assert [record['team_id'] for record in data['records']] == team_ids[1:2]
+
+        response = self.get_leaderboard_window(self.teams[0], 'limit=0')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+        unknown_team_id = str(uuid.uuid4())
+        response = self.get_leaderboard_window(self.teams[0], f'after={unknown_team_id}')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        data = json.loads(response.content)
+        assert data['detail'] == f'Команда {unknown_team_id} не найдена в таблице лидеров'
+        competition.delete()
+
+    def test_leaderboard_history(self):
+        competition = self.setup_competition()
+        before_solve = timezone.now()
+        with mock.patch('high_tech_cross.services.leaderboard_history.LEADERBOARD_KEYFRAME_INTERVAL', 2):
+            self.solve(self.teams[1], self.tasks_descriptions[0], success=True)
+            after_first_solve = timezone.now()
+            self.solve(self.teams[2], self.tasks_descriptions[0], success=True)
+            self.solve(self.teams[2], self.tasks_descriptions[1], success=True)
+        assert LeaderboardSnapshot.objects.filter(competition=competition, is_keyframe=True).count() == 2
+
+        current = self.get_leaderboard()
+        query = urlencode({'at': timezone.now().isoformat()})
+        data = json.loads(self.get_leaderboard_window(self.teams[0], query).content)
+        assert data == {**current, 'meta': {**current['meta'], 'offset': 0}}
+
+        query = urlencode({'at': after_first_solve.isoformat()})
+        data = json.loads(self.get_leaderboard_window(self.teams[0], query).content)
+        assert [(record['position'], record['team_id']) for record in data['records']] == [
+            (1, self.teams[1]['id']), (2, self.teams[0]['id']), (2, self.teams[2]['id'])
+        ]
+        assert [record['completed_exercise_count'] for record in data['records']] == [1, 0, 0]
+
+        query = urlencode({'at': before_solve.isoformat()})
+        data = json.loads(self.get_leaderboard_window(self.teams[0], query).content)
+        assert [record['position'] for record in data['records']] == [1, 1, 1]
+        assert [record['team_id'] for record in data['records']] == [team['id'] for team in self.teams]
+
+        at = competition.start_time - timedelta(days=1)
+        response = self.get_leaderboard_window(self.teams[0], urlencode({'at': at.isoformat()}))
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        competition.delete()
+
+    def test_leaderboard_columnar(self):
+        competition = self.setup_competition()
+        self.solve(self.teams[1], self.tasks_descriptions[0], success=True)
+        token = self.get_token(login=self.teams[0]['login'], password=self.teams[0]['password'])
+        leaderboard = self.get_leaderboard()
+
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token,
+                                   HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith(ColumnarJSONRenderer.media_type)
+        assert 'Accept' in response['Vary']
+        data = json.loads(response.content)
+        column_headers = data['meta']['column_headers']
+        assert [header['property_name'] for header in column_headers] == [
+            header['property_name'] for header in leaderboard['meta']['column_headers']
+        ]
+        assert column_headers[-1]['value_type'] == 'seconds'
+        assert data['highlights'] == leaderboard['highlights']
+        assert len(data['records']) == len(leaderboard['records'])
+        for values, record in zip(data['records'], leaderboard['records']):
+            assert len(values) == data['meta']['col_count']
+            assert values == [
+                record['position'], record['team_id'], record['team_name'], record['exercise_1'],
+                record['exercise_2'], record['completed_exercise_count'],
+                int(parse_duration(record['total_penalty_time']).total_seconds())
+            ]
+
+        # Часть строк вырезается из колоночной таблицы так же, как из обычной
+        response = self.client.get(path='/api/leaderboard?around=0', HTTP_Authorization=token,
+                                   HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+        data = json.loads(response.content)
+        assert [values[1] for values in data['records']] == [self.teams[0]['id']]
+        assert data['meta']['offset'] == 1
+        assert data['highlights'] == [
+            {'location': {'type': 'cell', 'position': 2, 'column': 'team_name'}, 'highlight': 'zero_points'}
+        ]
+
+        # Колоночная таблица строится один раз на версию
+        with mock.patch.object(Leaderboard, '_get_records', wraps=Leaderboard._get_records) as get_records:
+            for _ in range(2):
+                response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token,
+                                           HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+                assert response.status_code == HTTPStatus.OK
+            assert get_records.call_count == 0
+            self.solve(self.teams[2], self.tasks_descriptions[0], success=True)
+            for _ in range(2):
+                response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token,
+                                           HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+                assert response.status_code == HTTPStatus.OK
+            assert get_records.call_count == 1
+
+        etag = response['ETag']
+        response = self.client.get(path='/api/leaderboard', HTTP_Authorization=token)
+        assert response['ETag'] != etag
+        response = self.client.get(path='/api/leaderboard?format=columnar', HTTP_Authorization=token,
+                                   HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        competition.delete()
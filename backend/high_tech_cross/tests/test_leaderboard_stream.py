@@ -0,0 +1,161 @@
+import json
+import uuid
+
+from http import HTTPStatus
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase
+from django.utils import timezone
+
+from ..leaderboard_stream import LeaderboardStreamApplication, LeaderboardStreamHub, diff_records
+from ..models import Team, Competition, TaskDescription, LeaderboardRecord, LeaderboardVersion
+from ..services import Authorization, CompetitionInit
+
+
+async def not_found_application(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': HTTPStatus.NOT_FOUND, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+class TestLeaderboardStream(TestCase):
+    teams = [
+        {
+            'id': str(uuid.uuid4()),
+            'login': 'stream_team',
+            'name': '1 Первая команда',
+            'password': '12345'
+        },
+        {
+            'id': str(uuid.uuid4()),
+            'login': 'second_stream_team',
+            'name': '2 Вторая команда',
+            'password': 'qwerty'
+        },
+    ]
+    task_description_id = str(uuid.uuid4())
+
+    @classmethod
+    def setUpTestData(cls):
+        for team in cls.teams:
+            Team.objects.create(**team)
+        TaskDescription.objects.create(
+            id=cls.task_description_id,
+            name='Тестовое задание 1',
+            coordinates=['66.666666', '33.333333'],
+            description='Описание тестового задания 1',
+            answer='Ответ 1',
+            hints=['Подсказка 1.0', 'Подсказка 1.1', 'Подсказка 1.2']
+        )
+
+    @staticmethod
+    def setup_competition(teams: list, task_description_id: str):
+        competition = Competition.objects.create(
+            name='Тестовое соревнование',
+            start_time=timezone.now() - timedelta(hours=1)
+        )
+        for team in teams:
+            competition.teams.add(team['id'])
+        competition.tasks.add(task_description_id)
+        CompetitionInit.initialize_competition(competition)
+        return competition
+
+    @staticmethod
+    def complete_exercise(competition: Competition, team_id: str):
+        LeaderboardRecord.objects.filter(competition=competition, team=team_id).update(
+            completed_exercises_count=1, completed_at_results=[timezone.now()]
+        )
+        version = LeaderboardVersion.objects.get(competition=competition)
+        version.version += 1
+        version.save()
+
+    def get_token(self) -> str:
+        data = Authorization.authorize(login=self.teams[0]['login'], password=self.teams[0]['password'])
+        return f"Bearer {data['auth_token']}"
+
+    @staticmethod
+    def connect(application, token: str = None) -> ApplicationCommunicator:
+        headers = [(b'authorization', token.encode())] if token else []
+        return ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': LeaderboardStreamApplication.path,
+            'headers': headers,
+        })
+
+    @staticmethod
+    def parse_event(message: dict):
+        lines = message['body'].decode().strip().split('\n')
+        return lines[0][len('event: '):], json.loads(lines[1][len('data: '):])
+
+    def test_diff_records(self):
+        old_records = [
+            {'position': 1, 'team_id': 'a', 'completed_exercise_count': 0},
+            {'position': 2, 'team_id': 'b', 'completed_exercise_count': 0},
+            {'position': 3, 'team_id': 'c', 'completed_exercise_count': 0},
+        ]
+        new_records = [
+            {'position': 1, 'team_id': 'b', 'completed_exercise_count': 1},
+            {'position': 2, 'team_id': 'a', 'completed_exercise_count': 0},
+        ]
+        diff = diff_records(old_records, new_records)
+        assert diff['records'] == new_records
+        assert diff['removed'] == ['c']
+        assert diff_records(new_records, new_records) == {'records': [], 'removed': []}
+
+    async def test_stream_not_api_path(self):
+        application = LeaderboardStreamApplication(not_found_application)
+        communicator = ApplicationCommunicator(application, {'type': 'http', 'method': 'GET', 'path': '/admin/'})
+        await communicator.send_input({'type': 'http.request'})
+        message = await communicator.receive_output()
+        assert message['status'] == HTTPStatus.NOT_FOUND
+
+    async def test_stream_no_token(self):
+        communicator = self.connect(LeaderboardStreamApplication(not_found_application))
+        await communicator.send_input({'type': 'http.request'})
+        message = await communicator.receive_output()
+        assert message['status'] == HTTPStatus.FORBIDDEN
+        message = await communicator.receive_output()
+        assert json.loads(message['body'])['detail'] == 'Token not found'
+
+    async def test_stream_competition_not_found(self):
+        token = await sync_to_async(self.get_token)()
+        communicator = self.connect(LeaderboardStreamApplication(not_found_application), token)
+        await communicator.send_input({'type': 'http.request'})
+        message = await communicator.receive_output()
+        assert message['status'] == HTTPStatus.NOT_FOUND
+
+    async def test_stream_diff(self):
+        competition = await sync_to_async(self.setup_competition)(self.teams, self.task_description_id)
+        competition_id = str(competition.id)
+        token = await sync_to_async(self.get_token)()
+        hub = LeaderboardStreamHub()
+        application = LeaderboardStreamApplication(not_found_application, hub=hub)
+
+        communicators = [self.connect(application, token) for _ in range(2)]
+        for communicator in communicators:
+            await communicator.send_input({'type': 'http.request'})
+            message = await communicator.receive_output()
+            assert message['status'] == HTTPStatus.OK
+            event, data = self.parse_event(await communicator.receive_output())
+            assert event == 'snapshot'
+            assert data['meta']['row_count'] == 2
+            assert [record['team_id'] for record in data['records']] == [team['id'] for team in self.teams]
+
+        await sync_to_async(self.complete_exercise)(competition, self.teams[1]['id'])
+        await hub.publish(competition_id)
+
+        for communicator in communicators:
+            event, data = self.parse_event(await communicator.receive_output())
+            assert event == 'diff'
+            assert data['row_count'] == 2
+            assert data['removed'] == []
+            assert [(record['position'], record['team_id']) for record in data['records']] == [
+                (1, self.teams[1]['id']), (2, self.teams[0]['id'])
+            ]
+
+        for communicator in communicators:
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+        assert hub._connection is None
@@ -0,0 +1,82 @@
+import csv
+import json
+import os
+import tempfile
+
+from io import StringIO
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..config import TEAM_IMPORT_HASH_CHUNK_SIZE
+from ..models import Competition, Team
+
+
+class TeamImportTestCase(TestCase):
+
+    def write_file(self, suffix: str, rows: list) -> str:
+        file = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, newline='', encoding='utf-8')
+        with file:
+            if suffix == '.json':
+                json.dump(rows, file)
+            else:
+                writer = csv.DictWriter(file, fieldnames=['login', 'name', 'password'])
+                writer.writeheader()
+                writer.writerows(rows)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_save_hashes_changed_password(self):
+        team = Team.objects.create(login='team', name='Команда', password='12345')
+        hashed_password = team.password
+        assert check_password('12345', hashed_password)
+
+        # Сохранение без смены пароля (например, в админке) не хеширует хеш
+        team = Team.objects.get(pk=team.id)
+        team.name = 'Новое название'
+        team.save()
+        assert Team.objects.get(pk=team.id).password == hashed_password
+        team = Team.objects.only('name').get(pk=team.id)
+        team.save()
+        assert Team.objects.get(pk=team.id).password == hashed_password
+
+        team.password = 'new password'
+        team.save()
+        assert check_password('new password', Team.objects.get(pk=team.id).password)
+
+    def test_import_teams(self):
+        Team.objects.create(login='team_0', name='Старая команда', password='old password')
+        rows = [
+            {'login': f'team_{number}', 'name': f'Команда {number}', 'password': f'password {number}'}
+            for number in range(TEAM_IMPORT_HASH_CHUNK_SIZE + 10)
+        ]
+        competition = Competition.objects.create(name='Соревнование')
+        path = self.write_file('.csv', rows)
+        output = StringIO()
+        call_command('import_teams', path, workers=2, competition=str(competition.id), stdout=output)
+        assert f'Создано команд: {len(rows) - 1}, пропущено (логин уже существует): 1' in output.getvalue()
+        assert competition.teams.count() == len(rows)
+        # Существующая команда не изменилась, пароли новых команд захешированы в пуле процессов
+        assert Team.objects.get(login='team_0').name == 'Старая команда'
+        assert check_password('password 7', Team.objects.get(login='team_7').password)
+        assert check_password(f'password {len(rows) - 1}', Team.objects.get(login=f'team_{len(rows) - 1}').password)
+
+        # Повторный импорт ничего не создает
+        output = StringIO()
+        call_command('import_teams', self.write_file('.json', rows), workers=1, stdout=output)
+        assert f'Создано команд: 0, пропущено (логин уже существует): {len(rows)}' in output.getvalue()
+        assert Team.objects.count() == len(rows)
+        competition.delete()
+
+    def test_import_invalid_file(self):
+        rows = [
+            {'login': 'team', 'name': 'Команда', 'password': '1'},
+            {'login': 'team', 'name': 'Другая команда', 'password': '2'},
+        ]
+        with self.assertRaisesMessage(CommandError, 'Логины повторяются в файле: team'):
+            call_command('import_teams', self.write_file('.csv', rows), stdout=StringIO())
+        rows = [{'login': 'x' * 31, 'name': 'Команда', 'password': '1'}]
+        with self.assertRaises(CommandError):
+            call_command('import_teams', self.write_file('.json', rows), stdout=StringIO())
+        assert not Team.objects.exists()
@@ -0,0 +1,24 @@
+import tempfile
+
+from unittest.mock import patch
+
+from .. import throttling
+from ..config import THROTTLE_SLOTS
+from ..throttling import TokenBuckets
+
+
+class TemporaryTokenBucketsMixin:
+    """
+    Корзины маркеров во временном файле на время каждого теста:
+    общий файл хоста используют запущенный сервер и другие прогоны тестов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        state_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(state_file.close)
+        buckets = TokenBuckets(path=state_file.name, slots=THROTTLE_SLOTS)
+        self.addCleanup(buckets.close)
+        patcher = patch.object(throttling, 'token_buckets', buckets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
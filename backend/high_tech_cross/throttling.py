@@ -0,0 +1,225 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from abc import ABCMeta, abstractmethod
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .application_context import ApplicationContext
+from .config import THROTTLE_EXERCISE_RATE, THROTTLE_SLOTS, THROTTLE_STATE_PATH, THROTTLE_TEAM_RATE
+
+
+class TokenBuckets:
+    """
+    Корзины маркеров в файле, отображенном в память. Файл общий для всех процессов одного хоста,
+    доступ к нему упорядочивается блокировкой flock (между процессами) и threading.Lock (между потоками).
+
+    Корзины лежат в таблице с открытой адресацией фиксированного размера: в ячейке хранятся хеш ключа,
+    количество маркеров и время последнего обращения. Если среди probes ячеек, начиная с хеша ключа,
+    нет ни ячейки ключа, ни пустой, занимается ячейка, к которой дольше всего не обращались.
+    """
+    slot = struct.Struct('<Qdd')
+    probes = 8
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._fd = None
+        self._memory = None
+        self._pid = None
+
+    def _open(self):
+        # После fork блокировка flock на унаследованном дескрипторе была бы общей с родителем, открываем файл заново
+        if self._pid == os.getpid():
+            return
+        size = self.slots * self.slot.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._fd, self._memory, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+
+    def _find(self, key_hash: int) -> Tuple[int, Optional[Tuple[float, float]]]:
+        """
+        :param key_hash:
+        :return: смещение ячейки ключа и ее маркеры и время или None, если ячейка новая
+        """
+        start = key_hash % self.slots
+        free_offset, free_updated_at = None, None
+        for probe in range(self.probes):
+            offset = (start + probe) % self.slots * self.slot.size
+            slot_hash, tokens, updated_at = self.slot.unpack_from(self._memory, offset)
+            if slot_hash == key_hash:
+                return offset, (tokens, updated_at)
+            if not slot_hash:
+                return offset, None
+            if free_offset is None or updated_at < free_updated_at:
+                free_offset, free_updated_at = offset, updated_at
+        return free_offset, None
+
+    def consume(self, key: str, capacity: int, rate: float, cost: int = 1) -> float:
+        """
+        Забирает cost маркеров из корзины ключа key. Новая корзина полная, пополняется со скоростью rate.
+        :param key:
+        :param capacity: емкость корзины
+        :param rate: маркеров в секунду
+        :param cost: больше емкости корзины забрать нельзя, такой запрос просто опустошает полную корзину
+        :return: 0, если маркеров хватило, иначе через сколько секунд их хватит
+        """
+        return self.consume_all([(key, capacity, rate, cost)])
+
+    def consume_all(self, buckets: Iterable[Tuple[str, int, float, int]]) -> float:
+        """
+        То же, что и consume, но для нескольких корзин сразу: маркеры забираются, только если их хватает
+        во всех корзинах, иначе не забираются ни из одной.
+        :param buckets: ключ, емкость, маркеров в секунду и сколько маркеров забрать для каждой корзины
+        :return: 0, если маркеров хватило, иначе через сколько секунд их хватит во всех корзинах
+        """
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                wait = 0.0
+                refilled = []
+                for key, capacity, rate, cost in buckets:
+                    cost = min(cost, capacity)
+                    key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+                    offset, bucket = self._find(key_hash)
+                    tokens = capacity
+                    if bucket:
+                        tokens = min(capacity, bucket[0] + max(now - bucket[1], 0) * rate)
+                    if tokens < cost:
+                        wait = max(wait, (cost - tokens) / rate)
+                    # Ячейка занимается сразу, чтобы следующая корзина не заняла ее же
+                    self.slot.pack_into(self._memory, offset, key_hash, tokens, now)
+                    refilled.append((offset, key_hash, tokens - cost))
+                if not wait:
+                    for offset, key_hash, tokens in refilled:
+                        self.slot.pack_into(self._memory, offset, key_hash, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._memory[:] = bytes(len(self._memory))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._memory.close()
+                os.close(self._fd)
+            self._fd, self._memory, self._pid = None, None, None
+
+
+token_buckets = TokenBuckets(path=THROTTLE_STATE_PATH, slots=THROTTLE_SLOTS)
+
+
+class AttemptsThrottled(Throttled):
+    default_detail = 'Слишком много запросов.'
+    extra_detail_singular = extra_detail_plural = 'Повторите через {wait} сек.'
+
+
+class AbstractTeamThrottle(BaseThrottle, metaclass=ABCMeta):
+    """
+    Ограничение частоты запросов команды по алгоритму корзины маркеров.
+    Использует только ApplicationContext и тело запроса, поэтому отказ происходит до обращения к базе данных.
+    rate задается как в DRF: 'количество/период', количество - это и емкость корзины.
+    Несколько ограничений одного обработчика проверяются вместе через consume_all.
+    """
+    scope: str = None
+    rate: str = None
+
+    def __init__(self):
+        self.wait_time = None
+
+    @staticmethod
+    def parse_rate(rate: str) -> Tuple[int, float]:
+        """
+        :param rate: например, '10/min'
+        :return: емкость корзины и маркеров в секунду
+        """
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), int(num) / duration
+
+    @abstractmethod
+    def get_costs(self, request, team_id: str) -> Dict[str, int]:
+        """
+        :param request:
+        :param team_id:
+        :return: сколько маркеров забрать из корзины каждого ключа
+        """
+        pass
+
+    def get_buckets(self, request, team_id: str) -> List[Tuple[str, int, float, int]]:
+        """
+        :param request:
+        :param team_id:
+        :return: корзины ограничения в формате TokenBuckets.consume_all
+        """
+        capacity, rate = self.parse_rate(self.rate)
+        return [(f'{self.scope}:{key}', capacity, rate, cost) for key, cost in self.get_costs(request, team_id).items()]
+
+    def allow_request(self, request, view) -> bool:
+        self.wait_time = self.consume_all(request, [self])
+        return not self.wait_time
+
+    @staticmethod
+    def consume_all(request, throttles: Iterable['AbstractTeamThrottle']) -> float:
+        """
+        Проверяет корзины всех ограничений разом: запрос, которому не хватило маркеров хотя бы одного ограничения,
+        не тратит маркеры остальных.
+        :param request:
+        :param throttles:
+        :return: 0, если запрос разрешен, иначе через сколько секунд его можно повторить
+        """
+        team_id = ApplicationContext.team_id.get()
+        if not team_id:
+            return 0.0
+        return token_buckets.consume_all(
+            [bucket for throttle in throttles for bucket in throttle.get_buckets(request, team_id)]
+        )
+
+    def wait(self) -> Optional[float]:
+        return self.wait_time
+
+
+class TeamRateThrottle(AbstractTeamThrottle):
+    """
+    Общее ограничение на все попытки и подсказки команды.
+    """
+    scope = 'team'
+    rate = THROTTLE_TEAM_RATE
+
+    def get_costs(self, request, team_id: str) -> Dict[str, int]:
+        return {team_id: 1}
+
+
+class ExerciseRateThrottle(AbstractTeamThrottle):
+    """
+    Ограничение на попытки и подсказки одного задания команды, не дает подбирать ответ перебором.
+    В пакетной проверке каждый ответ забирает маркер из корзины своего задания.
+    """
+    scope = 'exercise'
+    rate = THROTTLE_EXERCISE_RATE
+
+    def get_costs(self, request, team_id: str) -> Dict[str, int]:
+        data = request.data if isinstance(request.data, dict) else {}
+        answers = data.get('answers') if isinstance(data.get('answers'), list) else [data]
+        exercise_ids = Counter(str(answer.get('exercise_id')) for answer in answers if isinstance(answer, dict))
+        return {f'{team_id}:{exercise_id}': cost for exercise_id, cost in exercise_ids.items()}
@@ -1,13 +1,16 @@
 from django.urls import path
-from .views import AuthorizationView, CompetitionView, ExerciseView, ExerciseHintView, ExerciseSolveView, \
-    LeaderboardView
+from .views import AuthorizationView, CompetitionView, EnvelopeAuthorizationView, ExerciseView, ExerciseChangesView, \
+    ExerciseHintView, ExerciseSolveView, ExerciseSolveBatchView, LeaderboardView
 
 urlpatterns = [
     path('authorize', AuthorizationView.as_view()),
+    path('authorize/envelope', EnvelopeAuthorizationView.as_view()),
     path('competition', CompetitionView.as_view()),
     path('exercise_manager/all_exercises', ExerciseView.as_view()),
     path('exercise_manager/exercise/<str:exercise_id>', ExerciseView.as_view()),
+    path('exercise_manager/changes', ExerciseChangesView.as_view()),
     path('exercise_manager/pick_hint', ExerciseHintView.as_view()),
     path('exercise_manager/solve', ExerciseSolveView.as_view()),
+    path('exercise_manager/solve_batch', ExerciseSolveBatchView.as_view()),
     path('leaderboard', LeaderboardView.as_view()),
 ]
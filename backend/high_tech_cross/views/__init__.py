@@ -1,4 +1,5 @@
-from .authorize import AuthorizationView
-from .competition import CompetitionView
-from .exercise import ExerciseView, ExerciseHintView, ExerciseSolveView
-from .leaderboard import LeaderboardView
+from .authorize import AuthorizationView, EnvelopeAuthorizationView
+from .competition import AsyncCompetitionView, CompetitionView
+from .exercise import AsyncExerciseView, ExerciseView, ExerciseChangesView, ExerciseHintView, ExerciseSolveView, \
+    ExerciseSolveBatchView
+from .leaderboard import AsyncLeaderboardView, LeaderboardView
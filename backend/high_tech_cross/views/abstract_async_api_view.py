@@ -0,0 +1,49 @@
+from abc import ABCMeta
+from http import HTTPStatus
+from typing import List, Type
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http.response import HttpResponse
+from django.views import View
+
+from rest_framework.exceptions import APIException
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.request import Request
+
+
+class AbstractAsyncAPIView(View, metaclass=ABCMeta):
+    """
+    Абстрактный асинхронный api view для обработчиков чтения под ASGI (см. async_urls).
+    DRF не поддерживает асинхронные обработчики, поэтому от DRF здесь остались только согласование формата ответа,
+    рендеринг и формат ошибок: ответы не отличаются от ответов синхронных обработчиков.
+    """
+    http_method_names = ['get']
+    renderer_classes: List[Type[BaseRenderer]] = [JSONRenderer]
+
+    async def dispatch(self, request: ASGIRequest, *args, **kwargs) -> HttpResponse:
+        try:
+            self.renderer = self.select_renderer(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as error:
+            return self.render({'detail': error.detail} if isinstance(error.detail, str) else error.detail,
+                               status=error.status_code)
+
+    def select_renderer(self, request: ASGIRequest) -> BaseRenderer:
+        renderer, self.accepted_media_type = DefaultContentNegotiation().select_renderer(
+            Request(request), [renderer_class() for renderer_class in self.renderer_classes]
+        )
+        return renderer
+
+    def render(self, data, status: int = HTTPStatus.OK) -> HttpResponse:
+        """
+        :param data:
+        :param status:
+        :return: ответ в формате, выбранном по заголовку Accept (JSON, если формат выбрать не удалось)
+        """
+        renderer = getattr(self, 'renderer', None) or JSONRenderer()
+        return HttpResponse(
+            renderer.render(data, getattr(self, 'accepted_media_type', None)),
+            status=status,
+            content_type=renderer.media_type
+        )
@@ -4,7 +4,7 @@ from rest_framework.response import Response
 
 from .abstract_api_view import AbstractAPIView
 
-from ..serializers import TeamSerializer
+from ..serializers import EnvelopeValidation, TeamSerializer
 from ..services import Authorization
 
 
@@ -18,3 +18,18 @@ class AuthorizationView(AbstractAPIView):
             return Response({'message': 'Неправильный логин или пароль.'}, status=HTTPStatus.NOT_FOUND)
 
         return Response(result)
+
+
+class EnvelopeAuthorizationView(AbstractAPIView):
+    """
+    Авторизация по токену из конверта, без логина и пароля (см. Authorization.exchange_envelope_token).
+    """
+    http_method_names = ['post']
+    validator = EnvelopeValidation
+
+    def _post(self, envelope_token: str):
+        result = Authorization.exchange_envelope_token(envelope_token)
+        if not result:
+            return Response({'message': 'Недействительный токен конверта.'}, status=HTTPStatus.NOT_FOUND)
+
+        return Response(result)
@@ -1,12 +1,15 @@
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
+from django.core.handlers.asgi import ASGIRequest
 from django.core.handlers.wsgi import WSGIRequest
 from django.http.response import HttpResponse
 
 from .abstract_api_view import AbstractAPIView
+from .abstract_async_api_view import AbstractAsyncAPIView
 
 from ..application_context import ApplicationContext
-from ..models import Competition
+from ..services import CompetitionCache
 from ..serializers import CompetitionSerializer
 
 
@@ -15,6 +18,20 @@ class CompetitionView(AbstractAPIView):
     serializer = CompetitionSerializer
 
     def get(self, request: WSGIRequest) -> HttpResponse:
-        competition_id = ApplicationContext.competition_id.get()
-        competition = self.get_object_or_404(Competition, 'Соревнование не найдено', pk=competition_id)
+        competition = CompetitionCache.get_competition(ApplicationContext.competition_id.get())
+        if not competition:
+            raise NotFound('Соревнование не найдено')
         return Response(self.serializer(competition).data)
+
+
+class AsyncCompetitionView(AbstractAsyncAPIView):
+    """
+    Асинхронный вариант CompetitionView.
+    """
+    serializer = CompetitionSerializer
+
+    async def get(self, request: ASGIRequest) -> HttpResponse:
+        competition = await CompetitionCache.aget_competition(ApplicationContext.competition_id.get())
+        if not competition:
+            raise NotFound('Соревнование не найдено')
+        return self.render(self.serializer(competition).data)
@@ -1,146 +1,458 @@
+import uuid
+
 from abc import ABCMeta
+from http import HTTPStatus
+from typing import List
 
-from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
 from django.core.handlers.wsgi import WSGIRequest
 from django.http.response import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.response import Response
 
 from .abstract_api_view import AbstractAPIView
+from .abstract_async_api_view import AbstractAsyncAPIView
 
-from ..models import Exercise, ResponseCache
+from ..models import Exercise
 from ..models.competition import CompetitionStatus
 from ..models.exercise import ExerciseStatus
 from ..serializers import ExerciseSerializer
+from ..services import AttemptLogWriter, CompetitionCache, ExerciseAttempt, ExerciseHint, ExerciseSync, \
+    IdempotencyStore, Leaderboard
 from ..application_context import ApplicationContext
+from ..throttling import AbstractTeamThrottle, AttemptsThrottled, ExerciseRateThrottle, TeamRateThrottle
 from ..models import Competition
-from ..serializers.exercise_serializer import ExerciseHintValidation, ExerciseSolveValidation
+from ..serializers.exercise_serializer import ExerciseHintValidation, ExerciseSolveValidation, \
+    ExerciseSolveBatchValidation, ExerciseChangesValidation
+
+
+# Метка синхронизации полного списка заданий, с которой клиент запрашивает изменения (см. ExerciseChangesView)
+EXERCISES_VERSION_HEADER = 'X-Exercises-Version'
 
 
 class AbstractExerciseView(AbstractAPIView, metaclass=ABCMeta):
+    """
+    Описания заданий загружаются тем же запросом, что и исполнения заданий, а соревнование у всех исполнений
+    одно и берется из CompetitionCache. Так количество запросов не зависит от количества заданий.
+    """
     serializer = ExerciseSerializer
+    queryset = Exercise.objects.select_related('task_description')
+    not_started_message = 'Соревнование еще не начато, во избежание спойлеров вы не можете ни смотреть, ' \
+                          'ни работать с заданиями'
+
+    @staticmethod
+    def get_competition() -> Competition:
+        competition = CompetitionCache.get_competition(ApplicationContext.competition_id.get())
+        if not competition:
+            raise NotFound('Соревнование не найдено')
+        return competition
 
     def validate_competition_state(self):
         """
         Проверяем состояние соревнования, чтобы определить, можем мы выполнять действие, или нет.
         :return: возвращаем competition, чтобы было проще делать дополнительные проверки в дочерних классах.
         """
-        competition_id = ApplicationContext.competition_id.get()
-        competition = self.get_object_or_404(
-            Competition, not_found_message='Соревнование не найдено', pk=competition_id
+        competition = self.get_competition()
+        self.check_status(competition.status)
+        return competition
+
+    def check_status(self, status: str):
+        if status == CompetitionStatus.NOT_STARTED:
+            raise PermissionDenied(self.not_started_message)
+
+    def check_permissions(self, request):
+        """
+        Если статус соревнования известен по расписанию из токена, отказываем до обращения к базе данных
+        (и до ограничения частоты запросов). Иначе статус проверит validate_competition_state.
+        """
+        super().check_permissions(request)
+        status = CompetitionCache.get_window_status(
+            ApplicationContext.competition_id.get(), ApplicationContext.competition_window.get()
+        )
+        if status:
+            self.check_status(status)
+
+    def get_exercise(self, competition: Competition, exercise_id: str) -> Exercise:
+        exercise = self.get_object_or_404(
+            self.queryset,
+            not_found_message=f'Задание {exercise_id} не найдено',
+            competition=competition.id,
+            team=ApplicationContext.team_id.get(),
+            id=exercise_id
         )
-        if competition.status == CompetitionStatus.NOT_STARTED:
-            message = 'Соревнование еще не начато, во избежание спойлеров вы не можете ни смотреть, ' \
-                      'ни работать с заданиями'
-            raise PermissionDenied(message)
+        exercise.competition = competition
+        return exercise
 
 
 class ExerciseView(AbstractExerciseView):
+    """
+    Задания отдаются с ETag по версии исполнений заданий команды (см. ExerciseSync) и статусу соревнования:
+    ответ меняется, только когда команда что-то сделала или соревнование закончилось.
+    В заголовке X-Exercises-Version отдаем метку синхронизации, с которой клиент дальше запрашивает изменения.
+    Если с прошлого запроса клиента ничего не изменилось, отвечаем 304 после одного запроса версии,
+    не загружая и не сериализуя задания. Описания заданий начатого соревнования считаются неизменными.
+    """
     http_method_names = ['get']
     serializer = ExerciseSerializer
+    status_tags = {
+        CompetitionStatus.IN_PROGRESS: 'in-progress',
+        CompetitionStatus.COMPLETED: 'completed',
+    }
 
     def get(self, request: WSGIRequest, exercise_id: str = None) -> HttpResponse:
-        self.validate_competition_state()
+        competition = self.validate_competition_state()
         team_id = ApplicationContext.team_id.get()
-        competition_id = ApplicationContext.competition_id.get()
+        version = ExerciseSync.get_version(competition=competition, team_id=team_id)
+        etag = quote_etag(f'{competition.id}-{team_id}-{version}-{self.status_tags[competition.status]}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data=self.get_data(competition, team_id, exercise_id))
+        response['ETag'] = etag
+        response[EXERCISES_VERSION_HEADER] = str(ExerciseSync.get_token(version, competition.status))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_data(self, competition: Competition, team_id: str, exercise_id: str = None):
         if exercise_id:
-            exercise = self.get_object_or_404(
-                Exercise,
-                not_found_message=f'Задание {exercise_id} не найдено',
-                competition=competition_id,
-                team=team_id,
-                id=exercise_id
-            )
-            return Response(data=self.serializer(exercise).data)
+            exercise = self.get_exercise(competition=competition, exercise_id=exercise_id)
+            return self.serializer(exercise).data
         exercises = self.get_list_or_404(
-            Exercise,
+            self.queryset,
             not_found_message='Заданий не найдено',
-            competition=competition_id,
+            competition=competition.id,
             team=team_id
         )
-        return Response(data=self.serializer(exercises, many=True).data)
+        for exercise in exercises:
+            exercise.competition = competition
+        return self.serializer(exercises, many=True).data
+
+
+class AsyncExerciseView(AbstractAsyncAPIView):
+    """
+    Асинхронный вариант ExerciseView: те же проверки, ETag и ответы, но запросы выполняются асинхронным ORM.
+    """
+    serializer = ExerciseSerializer
+    queryset = ExerciseView.queryset
+    not_started_message = AbstractExerciseView.not_started_message
+    status_tags = ExerciseView.status_tags
+    # Проверка статуса не обращается к базе данных, берем ее у синхронного обработчика
+    check_status = AbstractExerciseView.check_status
+
+    async def get(self, request: ASGIRequest, exercise_id: str = None) -> HttpResponse:
+        competition_id = ApplicationContext.competition_id.get()
+        status = CompetitionCache.get_window_status(competition_id, ApplicationContext.competition_window.get())
+        if status:
+            self.check_status(status)
+        competition = await CompetitionCache.aget_competition(competition_id)
+        if not competition:
+            raise NotFound('Соревнование не найдено')
+        self.check_status(competition.status)
+
+        team_id = ApplicationContext.team_id.get()
+        version = await ExerciseSync.aget_version(competition=competition, team_id=team_id)
+        etag = quote_etag(f'{competition.id}-{team_id}-{version}-{self.status_tags[competition.status]}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.render(await self.get_data(competition, team_id, exercise_id))
+        response['ETag'] = etag
+        response[EXERCISES_VERSION_HEADER] = str(ExerciseSync.get_token(version, competition.status))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    async def get_data(self, competition: Competition, team_id: str, exercise_id: str = None):
+        queryset = self.queryset.filter(competition=competition.id, team=team_id)
+        if exercise_id:
+            try:
+                exercise = await queryset.filter(id=exercise_id).afirst()
+            except ValidationError:
+                exercise = None
+            if not exercise:
+                raise NotFound(f'Задание {exercise_id} не найдено')
+            exercise.competition = competition
+            return self.serializer(exercise).data
+        exercises = [exercise async for exercise in queryset]
+        if not exercises:
+            raise NotFound('Заданий не найдено')
+        for exercise in exercises:
+            exercise.competition = competition
+        return self.serializer(exercises, many=True).data
+
+
+class ExerciseChangesView(AbstractExerciseView):
+    """
+    Исполнения заданий команды, изменившиеся после метки since, и новая метка, с которой нужно прийти в следующий раз
+    (см. ExerciseSync.get_token). Если с метки since ничего не изменилось, отвечаем 204 без тела.
+    Если с тех пор изменился статус соревнования или метка из будущего, отдаем все задания.
+    """
+    http_method_names = ['get']
+
+    def get(self, request: WSGIRequest) -> HttpResponse:
+        params = ExerciseChangesValidation(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data['since']
+
+        competition = self.validate_competition_state()
+        team_id = ApplicationContext.team_id.get()
+        # Версию читаем раньше заданий: изменение, закоммиченное между запросами, клиент получит повторно,
+        # но не пропустит
+        version = ExerciseSync.get_version(competition=competition, team_id=team_id)
+        token = ExerciseSync.get_token(version, competition.status)
+        if since == token:
+            return Response(status=HTTPStatus.NO_CONTENT)
+        since = ExerciseSync.get_since_version(since, version, competition.status)
+
+        exercises = list(self.queryset.filter(competition=competition.id, team=team_id, version__gt=since))
+        for exercise in exercises:
+            exercise.competition = competition
+        return Response(data={'version': token, 'exercises': self.serializer(exercises, many=True).data})
 
 
 class AbstractExercisePostView(AbstractExerciseView, metaclass=ABCMeta):
+    """
+    Частота попыток и подсказок ограничивается до обработки запроса (см. throttling).
+    """
     http_method_names = ['post']
+    throttle_classes = [TeamRateThrottle, ExerciseRateThrottle]
 
-    def validate_competition_state(self):
+    def check_throttles(self, request):
+        # Ограничения проверяются вместе, чтобы отказ одного из них не тратил маркеры другого
+        wait = AbstractTeamThrottle.consume_all(request, self.get_throttles())
+        if wait:
+            self.throttled(request, wait)
+
+    def throttled(self, request, wait):
+        raise AttemptsThrottled(wait)
+
+    def check_status(self, status: str):
         """
         Переопределение поведения проверки состояния соревнования.
         В данном случае необходимо дополнительно проверять, не закончилось ли соревнование.
+        :param status:
         :return:
         """
-        competition_id = ApplicationContext.competition_id.get()
-        competition = self.get_object_or_404(
-            Competition, not_found_message='Соревнование не найдено', pk=competition_id
-        )
-        status = competition.status
-        if status == CompetitionStatus.NOT_STARTED:
-            message = 'Соревнование еще не начато, во избежание спойлеров вы не можете ни смотреть, ' \
-                      'ни работать с заданиями'
-            raise PermissionDenied(message)
-        elif status != CompetitionStatus.IN_PROGRESS:
+        super().check_status(status)
+        if status != CompetitionStatus.IN_PROGRESS:
             raise PermissionDenied('Соревнование уже закончилось')
 
-
-class ExerciseHintView(AbstractExercisePostView):
-    validator = ExerciseHintValidation
-
-    def _post(self, exercise_id: str, number: int) -> HttpResponse:
-        self.validate_competition_state()
-        team_id = ApplicationContext.team_id.get()
-        competition_id = ApplicationContext.competition_id.get()
+    def get_rejected_exercise(self, competition: Competition, exercise_id: str) -> Exercise:
+        """
+        Если условный запрос не изменил исполнение задания, перечитываем его, чтобы назвать причину отказа.
+        Соревнование читается вместе с заданием из базы данных: расписание в кэше процесса могло устареть.
+        :param competition:
+        :param exercise_id:
+        :return: исполнение задания, если задание не сдано, а соревнование идет
+        """
         exercise = self.get_object_or_404(
-            Exercise,
+            self.queryset.select_related('competition'),
             not_found_message=f'Задание {exercise_id} не найдено',
-            competition=competition_id,
-            team=team_id,
+            competition=competition.id,
+            team=ApplicationContext.team_id.get(),
             id=exercise_id
         )
         if exercise.status == ExerciseStatus.DONE:
             raise PermissionDenied(f'Задание {exercise_id} уже сдано')
+        self.check_status(exercise.competition.status)
+        return exercise
+
+
+class ExerciseHintView(AbstractExercisePostView):
+    """
+    Подсказка добавляется одним условным запросом (см. ExerciseHint).
+    Если подсказка не добавлена, выясняем причину обычными проверками: уже выданную подсказку просто отдаем еще раз.
+    """
+    validator = ExerciseHintValidation
+
+    def _post(self, exercise_id: str, number: int) -> HttpResponse:
+        competition = self.get_competition()
+        team_id = ApplicationContext.team_id.get()
+        with transaction.atomic():
+            version = ExerciseSync.next_version(competition=competition, team_id=team_id)
+            exercise = ExerciseHint.pick(
+                competition=competition,
+                team_id=team_id,
+                exercise_id=exercise_id,
+                number=number,
+                version=version,
+                now=timezone.now()
+            )
+            if exercise:
+                Leaderboard.refresh_team_record(competition=competition, team_id=team_id)
+            else:
+                transaction.set_rollback(True)
+
+        if exercise:
+            AttemptLogWriter.record_hint(competition.id, team_id, exercise_id, number)
+            hint = exercise.task_description.hints[number]
+            return Response(data={'hint': hint, 'exercise': self.serializer(exercise).data})
+        return self.rejected_hint_response(exercise_id=exercise_id, number=number)
+
+    def rejected_hint_response(self, exercise_id: str, number: int) -> HttpResponse:
+        competition = self.validate_competition_state()
+        exercise = self.get_rejected_exercise(competition=competition, exercise_id=exercise_id)
         if not exercise.is_hint_number_valid(hint_number=number):
             raise NotFound(f'Подсказка {number} не найдена')
-        with transaction.atomic():
-            hint = exercise.pick_hint(hint_number=number)
-            exercise.save()
-        return Response(data={'hint': hint, 'exercise': self.serializer(exercise).data})
+        if number in exercise.used_hints:
+            hint = exercise.task_description.hints[number]
+            return Response(data={'hint': hint, 'exercise': self.serializer(exercise).data})
+        raise PermissionDenied('Подсказка не выдана, повторите запрос')
 
 
 class ExerciseSolveView(AbstractExercisePostView):
     """
     Проверяем ответ на задание. Кэшируем результат на случай обрыва соединения.
     Я не хотел, чтобы response_cache попадал куда-либо дальше, поэтому для целостности транзакция вызывается здесь.
+
+    Попытка выполняется одним условным запросом (см. ExerciseAttempt), все проверки - внутри него.
+    Только если попытка не засчитана, выясняем причину обычными проверками, чтобы вернуть правильный ответ.
     """
 
     validator = ExerciseSolveValidation
 
-    def _post(self, request_id: str, exercise_id: str, answer: str) -> HttpResponse:
-        self.validate_competition_state()
+    def _post(self, request_id: uuid.UUID, exercise_id: str, answer: str) -> HttpResponse:
+        request_id = str(request_id)
+        competition = self.get_competition()
         team_id = ApplicationContext.team_id.get()
-        competition_id = ApplicationContext.competition_id.get()
-        exercise = self.get_object_or_404(
-            Exercise,
-            not_found_message=f'Задание {exercise_id} не найдено',
-            competition=competition_id,
-            team=team_id,
-            id=exercise_id
-        )
-        response_cache = ResponseCache.objects.filter(request_id=request_id).first()
-        if response_cache:
-            content = {
-                'success': response_cache.success,
-                'exercise': self.serializer(exercise).data
-            }
+        content = None
+        try:
+            with transaction.atomic():
+                version = ExerciseSync.next_version(competition=competition, team_id=team_id)
+                attempt = ExerciseAttempt.solve(
+                    competition=competition,
+                    team_id=team_id,
+                    exercise_id=exercise_id,
+                    request_id=request_id,
+                    answer=answer,
+                    version=version,
+                    now=timezone.now()
+                )
+                if attempt:
+                    success, exercise = attempt
+                    content = {'success': success, 'exercise': self.serializer(exercise).data}
+                    Leaderboard.refresh_team_record(competition=competition, team_id=team_id)
+                    IdempotencyStore.save(competition, team_id, request_id, content)
+                else:
+                    transaction.set_rollback(True)
+        except IntegrityError:
+            # Тот же request_id параллельно обработал другой запрос - вернем его результат ниже
+            content = None
+
+        if content:
+            AttemptLogWriter.record_attempt(
+                competition.id, team_id, exercise_id, request_id, answer, content['success']
+            )
             return Response(data=content)
+        return self.rejected_attempt_response(request_id=request_id, exercise_id=exercise_id)
 
-        if exercise.status == ExerciseStatus.DONE:
-            raise PermissionDenied(f'Задание {exercise_id} уже сдано')
+    def rejected_attempt_response(self, request_id: str, exercise_id: str) -> HttpResponse:
+        competition = self.validate_competition_state()
+        # Ответ мог сохранить другой процесс, о котором фильтр этого процесса не знает
+        content = IdempotencyStore.get(competition, ApplicationContext.team_id.get(), request_id, use_filter=False)
+        if content:
+            return Response(data=content)
+
+        self.get_rejected_exercise(competition=competition, exercise_id=exercise_id)
+        # Все условия попытки сейчас выполнены: ей помешал параллельный запрос, который уже завершился
+        raise PermissionDenied('Попытка не засчитана, повторите запрос')
 
+
+class ExerciseSolveBatchView(AbstractExercisePostView):
+    """
+    Пакетная проверка ответов, которые клиент накопил, пока был без связи.
+    Ответы проверяются по порядку так же, как в ExerciseSolveView, но состояние соревнования проверяется один раз,
+    исполнения заданий и закэшированные результаты загружаются одним запросом каждые, а все изменения сохраняются
+    в одной транзакции. Ошибка в одном из ответов не мешает проверке остальных.
+    """
+
+    validator = ExerciseSolveBatchValidation
+
+    def _post(self, answers: List[dict]) -> HttpResponse:
+        competition = self.validate_competition_state()
+        team_id = ApplicationContext.team_id.get()
+        answers = [{**answer, 'request_id': str(answer['request_id'])} for answer in answers]
+        try:
+            results = self.solve_answers(competition, team_id, answers, use_filter=True)
+        except IntegrityError:
+            # Фильтр пропустил request_id, ответ на который сохранил другой процесс - сверяемся с таблицей
+            results = self.solve_answers(competition, team_id, answers, use_filter=False)
+        return Response(data={'results': results})
+
+    def solve_answers(self, competition: Competition, team_id: str, answers: List[dict],
+                      use_filter: bool) -> List[dict]:
+        """
+        Проверяет ответы в одной транзакции.
+        :param competition:
+        :param team_id:
+        :param answers:
+        :param use_filter: см. IdempotencyStore.get_many
+        :return: результаты проверки в порядке ответов
+        """
+        results = []
         with transaction.atomic():
-            success = exercise.attempt(answer=answer)
-            exercise.save()
-            ResponseCache.objects.create(request_id=request_id, success=success)
+            version = ExerciseSync.next_version(competition=competition, team_id=team_id)
+            exercises = self.queryset.select_for_update(of=('self',)).filter(
+                competition=competition.id,
+                team=team_id,
+                id__in={answer['exercise_id'] for answer in answers}
+            )
+            exercises = {str(exercise.id): exercise for exercise in exercises}
+            contents = IdempotencyStore.get_many(
+                competition, team_id, {answer['request_id'] for answer in answers}, use_filter=use_filter
+            )
+
+            changed_exercises = {}
+            new_contents = {}
+            # Фильтр не знает об ответах, сохраненных другими процессами. Новая попытка с таким request_id
+            # упадет на сохранении с IntegrityError, а отказ ничего не сохраняет - перед отказом сверяемся с таблицей
+            checked_without_filter = not use_filter
+            for answer in answers:
+                request_id, exercise_id = answer['request_id'], answer['exercise_id']
+                content = contents.get(request_id)
+                exercise = exercises.get(exercise_id)
+                if not content and not checked_without_filter and \
+                        (not exercise or exercise.status == ExerciseStatus.DONE):
+                    unknown_request_ids = {answer['request_id'] for answer in answers} - contents.keys()
+                    contents.update(IdempotencyStore.get_many(
+                        competition, team_id, unknown_request_ids, use_filter=False
+                    ))
+                    checked_without_filter = True
+                    content = contents.get(request_id)
+                if content:
+                    results.append({'request_id': request_id, **content})
+                    continue
+                if not exercise:
+                    results.append({'request_id': request_id, 'detail': f'Задание {exercise_id} не найдено'})
+                    continue
+                if exercise.status == ExerciseStatus.DONE:
+                    results.append({'request_id': request_id, 'detail': f'Задание {exercise_id} уже сдано'})
+                    continue
+
+                exercise.competition = competition
+                success = exercise.attempt(answer=answer['answer'])
+                exercise.version = version
+                changed_exercises[exercise_id] = exercise
+                content = {'success': success, 'exercise': self.serializer(exercise).data}
+                contents[request_id] = new_contents[request_id] = content
+                results.append({'request_id': request_id, **content})
+
+            if changed_exercises:
+                Exercise.objects.bulk_update(changed_exercises.values(), ['wrong_attempts', 'completed_at', 'version'])
+                Leaderboard.refresh_team_record(competition=competition, team_id=team_id)
+                IdempotencyStore.save_many(competition, team_id, new_contents)
+            else:
+                # Ни одно задание не изменилось: версия исполнений заданий тоже не должна меняться
+                transaction.set_rollback(True)
 
-        return Response(data={'success': success, 'exercise': ExerciseSerializer(exercise).data})
+        for answer in answers:
+            if answer['request_id'] in new_contents:
+                AttemptLogWriter.record_attempt(
+                    competition.id, team_id, answer['exercise_id'], answer['request_id'], answer['answer'],
+                    new_contents[answer['request_id']]['success']
+                )
+                new_contents.pop(answer['request_id'])
+        return results
@@ -1,25 +1,126 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.core.handlers.wsgi import WSGIRequest
 from django.http.response import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 
 from .abstract_api_view import AbstractAPIView
+from .abstract_async_api_view import AbstractAsyncAPIView
 from ..models.competition import CompetitionStatus
-from ..services import Leaderboard
+from ..services import CompetitionCache, Leaderboard
 from ..application_context import ApplicationContext
-from ..models import Competition
+from ..renderers import ColumnarJSONRenderer
+from ..serializers import LeaderboardWindowValidation
 
 
 class LeaderboardView(AbstractAPIView):
+    """
+    Таблица лидеров отдается с ETag по версии таблицы лидеров соревнования.
+    Если с прошлого запроса клиента ничего не изменилось, отвечаем 304 без построения таблицы.
+    Параметры запроса (см. LeaderboardWindowValidation) позволяют получить только часть строк таблицы
+    или таблицу на прошедший момент времени, которая восстанавливается из истории без кэширования.
+    По заголовку Accept таблица отдается либо записями-словарями, либо в колоночном формате (см. ColumnarJSONRenderer).
+    """
     http_method_names = ['get']
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarJSONRenderer]
+    not_started_message = 'Соревнование еще не начато, во избежание спойлеров о том, сколько команд участвует ' \
+                          'и сколько заданий в соревновании, мы не можем показать вам таблицу лидеров.'
+
+    def check_permissions(self, request):
+        """
+        Не начатое по расписанию из токена соревнование отклоняем без обращения к базе данных.
+        """
+        super().check_permissions(request)
+        status = CompetitionCache.get_window_status(
+            ApplicationContext.competition_id.get(), ApplicationContext.competition_window.get()
+        )
+        if status == CompetitionStatus.NOT_STARTED:
+            raise PermissionDenied(self.not_started_message)
 
     def get(self, request: WSGIRequest) -> HttpResponse:
+        params = LeaderboardWindowValidation(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        at = params.pop('at', None)
+
         competition_id = ApplicationContext.competition_id.get()
-        competition = self.get_object_or_404(Competition, 'Соревнование не найдено', pk=competition_id)
+        leaderboard_version = Leaderboard.get_version(competition_id)
+        if not leaderboard_version:
+            # Таблицы лидеров нет только у не инициализированного (а значит и не начатого) соревнования
+            if not CompetitionCache.get_competition(competition_id):
+                raise NotFound('Соревнование не найдено')
+            raise PermissionDenied(self.not_started_message)
+
+        competition = leaderboard_version.competition
         if competition.status == CompetitionStatus.NOT_STARTED:
-            message = 'Соревнование еще не начато, во избежание спойлеров о том, сколько команд участвует ' \
-                      'и сколько заданий в соревновании, мы не можем показать вам таблицу лидеров.'
-            raise PermissionDenied(message)
+            raise PermissionDenied(self.not_started_message)
+
+        team_id = ApplicationContext.team_id.get()
+        columnar = isinstance(request.accepted_renderer, ColumnarJSONRenderer)
+        if at is not None:
+            table = Leaderboard.get_table_at(competition, at, columnar)
+            return Response(data=Leaderboard.get_window(table, team_id=team_id, **params))
+
+        etag = f'{competition.id}-{leaderboard_version.version}'
+        etag = quote_etag(f'{etag}-{ColumnarJSONRenderer.format}' if columnar else etag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            table = Leaderboard.get_table(leaderboard_version, columnar)
+            response = Response(data=Leaderboard.get_window(table, team_id=team_id, **params))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class AsyncLeaderboardView(AbstractAsyncAPIView):
+    """
+    Асинхронный вариант LeaderboardView. Версия таблицы лидеров читается асинхронным ORM, сама таблица -
+    из кэша версии (см. Leaderboard.aget_table). Таблица на прошедший момент времени восстанавливается в потоке.
+    """
+    renderer_classes = [JSONRenderer, ColumnarJSONRenderer]
+    not_started_message = LeaderboardView.not_started_message
+
+    async def get(self, request: ASGIRequest) -> HttpResponse:
+        params = LeaderboardWindowValidation(data=request.GET)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        at = params.pop('at', None)
+
+        competition_id = ApplicationContext.competition_id.get()
+        status = CompetitionCache.get_window_status(competition_id, ApplicationContext.competition_window.get())
+        if status == CompetitionStatus.NOT_STARTED:
+            raise PermissionDenied(self.not_started_message)
+        leaderboard_version = await Leaderboard.aget_version(competition_id)
+        if not leaderboard_version:
+            # Таблицы лидеров нет только у не инициализированного (а значит и не начатого) соревнования
+            if not await CompetitionCache.aget_competition(competition_id):
+                raise NotFound('Соревнование не найдено')
+            raise PermissionDenied(self.not_started_message)
+
+        competition = leaderboard_version.competition
+        if competition.status == CompetitionStatus.NOT_STARTED:
+            raise PermissionDenied(self.not_started_message)
+
+        team_id = ApplicationContext.team_id.get()
+        columnar = isinstance(self.renderer, ColumnarJSONRenderer)
+        if at is not None:
+            table = await sync_to_async(Leaderboard.get_table_at)(competition, at, columnar)
+            return self.render(Leaderboard.get_window(table, team_id=team_id, **params))
 
-        return Response(data=Leaderboard.get_table())
+        etag = f'{competition.id}-{leaderboard_version.version}'
+        etag = quote_etag(f'{etag}-{ColumnarJSONRenderer.format}' if columnar else etag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            table = await Leaderboard.aget_table(leaderboard_version, columnar)
+            response = self.render(Leaderboard.get_window(table, team_id=team_id, **params))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response